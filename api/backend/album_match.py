@@ -0,0 +1,100 @@
+# Album-level matching: pick the Spotify album once, then pair its tracks with NetEase songs locally.
+
+from typing import List, Dict, Optional, Any
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+from .normalize import normalize_text, normalize_many, clean_artist_name, clean_artist_names
+from .scoring import MATCH_THRESHOLD, DURATION_TOLERANCE_MS
+from .tracks import Track
+
+ALBUM_SEARCH_LIMIT = 5        # Album candidates considered from the single album search
+TRACK_COUNT_BONUS = 10        # Album score bonus when the track counts agree
+POSITION_BONUS = 20           # Track score bonus for the same disc and track number
+DURATION_BONUS = 10           # Track score bonus for identical durations, fading out at the tolerance
+POSITION_DURATION_MS = 2000   # Same position and this close in length is a match even if titles differ
+
+
+def album_query(album_name: str, artist: str) -> str:
+    return f'album:"{album_name}" artist:"{artist}"' if artist else f'album:"{album_name}"'
+
+
+def pick_album(items: List[Dict[str, Any]], album_name: str, artists: List[str], track_count: int) -> Optional[Dict[str, Any]]:
+    """Choose the search result that is this album, or None if no candidate is close enough."""
+    if not items:
+        return None
+
+    names = normalize_many([item.get("name", "") for item in items])
+    name_scores = process.cdist([normalize_text(album_name)], names, scorer=fuzz.ratio, dtype=np.float64)[0]
+    query_artists = clean_artist_names(artists)
+
+    best_score = 0.0
+    best_album = None
+    for item, name_score in zip(items, name_scores):
+        artist_score = 0.0
+        for candidate in item.get("artists", []):
+            cleaned = clean_artist_name(candidate.get("name", ""))
+            for artist in query_artists:
+                artist_score = max(artist_score, fuzz.ratio(artist, cleaned))
+        score = name_score * 0.7 + artist_score * 0.3
+        if item.get("total_tracks") == track_count:
+            score += TRACK_COUNT_BONUS
+        if score > best_score and name_score >= MATCH_THRESHOLD:
+            best_score = score
+            best_album = item
+    return best_album
+
+
+def _position(disc: Any, number: Any) -> Optional[tuple]:
+    try:
+        return int(disc or 1), int(number)
+    except (TypeError, ValueError):
+        return None
+
+
+def match_album_tracks(songs: List[Track], album_tracks: List[Dict[str, Any]]) -> List[Optional[str]]:
+    """Pair NetEase album songs with Spotify album tracks; returns one URI or None per song.
+
+    Every pair is scored on fuzzy title, disc/track number and duration, then
+    pairs are taken best-first so each Spotify track is used at most once.
+    A pair sharing position and length is accepted even when the titles
+    differ, which covers albums listed with translated or romanized titles.
+    """
+    result: List[Optional[str]] = [None] * len(songs)
+    if not songs or not album_tracks:
+        return result
+
+    titles = process.cdist(
+        normalize_many([song.name for song in songs]),
+        normalize_many([track.get("name", "") for track in album_tracks]),
+        scorer=fuzz.ratio,
+        dtype=np.float64,
+    )
+
+    song_positions = [_position(song.disc, song.number) for song in songs]
+    track_positions = [_position(track.get("disc_number"), track.get("track_number")) for track in album_tracks]
+    same_position = np.array([[p is not None and p == q for q in track_positions] for p in song_positions])
+
+    song_durations = np.array([song.duration_ms for song in songs], dtype=np.float64)
+    track_durations = np.array([track.get("duration_ms") or 0 for track in album_tracks], dtype=np.float64)
+    diff = np.abs(song_durations[:, None] - track_durations[None, :])
+    known = (song_durations[:, None] > 0) & (track_durations[None, :] > 0)
+
+    score = titles * 0.7 + same_position * POSITION_BONUS
+    score += np.where(known, DURATION_BONUS * np.clip(1 - diff / DURATION_TOLERANCE_MS, 0, 1), 0)
+    duration_ok = ~known | (diff < DURATION_TOLERANCE_MS)
+    acceptable = ((score > MATCH_THRESHOLD) & duration_ok) | (same_position & known & (diff <= POSITION_DURATION_MS))
+
+    used_songs = set()
+    used_tracks = set()
+    for flat in np.argsort(-np.where(acceptable, score, -np.inf), axis=None, kind="stable"):
+        i, j = divmod(int(flat), len(album_tracks))
+        if not acceptable[i, j]:
+            break
+        if i in used_songs or j in used_tracks:
+            continue
+        used_songs.add(i)
+        used_tracks.add(j)
+        result[i] = album_tracks[j].get("uri")
+    return result
@@ -0,0 +1,123 @@
+# Artist-catalog prefetch: fetch whole catalogs of a playlist's most frequent artists in bulk.
+
+import os, asyncio, logging
+from typing import List, Dict, Optional, Any, AsyncIterator, Callable
+
+from rapidfuzz import fuzz
+
+from .normalize import clean_artist_name
+from .spotify_client import SpotifyClient
+from .timings import timed
+from .track_index import TrackIndex
+from .tracks import Track
+
+logger = logging.getLogger(__name__)
+
+CATALOG_ARTIST_THRESHOLD = int(os.getenv("CATALOG_ARTIST_THRESHOLD", "5"))  # Songs by one artist before its catalog is fetched
+CATALOG_MAX_ARTISTS = int(os.getenv("CATALOG_MAX_ARTISTS", "20"))           # Catalogs fetched per transfer
+CATALOG_MAX_ALBUMS = 100      # Albums indexed per artist, newest first
+ARTIST_NAME_THRESHOLD = 90    # Similarity required to accept an artist search result
+
+
+class CatalogPrefetcher:
+    """Count artists across a playlist and index the catalogs of the frequent ones.
+
+    Once an artist reaches ``CATALOG_ARTIST_THRESHOLD`` songs, the artist is
+    resolved with one search and their albums are fetched through the bulk
+    album endpoints, 20 full albums per request. The tracks land in a
+    ``TrackIndex`` so the rest of that artist's songs match without a search.
+    """
+
+    def __init__(self, spotify: SpotifyClient, index: TrackIndex,
+                 threshold: int = CATALOG_ARTIST_THRESHOLD, max_artists: int = CATALOG_MAX_ARTISTS):
+        self.spotify = spotify
+        self.index = index
+        self.threshold = max(1, threshold)
+        self.max_artists = max_artists
+        self._counts: Dict[str, int] = {}
+        self._fetched = set()
+        self.requests = 0
+        self.albums = 0
+        self.failures = 0
+
+    async def observe(self, songs: List[Track]) -> None:
+        """Count the artists of newly seen songs and prefetch every artist that crossed the threshold."""
+        names: Dict[str, str] = {}
+        for song in songs:
+            for artist in song.artists:
+                key = clean_artist_name(artist)
+                if not key:
+                    continue
+                self._counts[key] = self._counts.get(key, 0) + 1
+                names.setdefault(key, artist)
+
+        due = [key for key in names if self._counts[key] >= self.threshold and key not in self._fetched]
+        due = sorted(due, key=lambda key: -self._counts[key])[:self.max_artists - len(self._fetched)]
+        if not due:
+            return
+        self._fetched.update(due)
+        await asyncio.gather(*(self._prefetch(names[key]) for key in due))
+
+    async def _prefetch(self, artist: str) -> None:
+        try:
+            self.requests += 1
+            items = await self.spotify.search_artists(f'artist:"{artist}"', 5)
+            artist_id = _pick_artist(items, artist)
+            if not artist_id:
+                logger.info(f"Catalog prefetch: no Spotify artist found for '{artist}'")
+                return
+
+            album_ids = await self.spotify.artist_album_ids(artist_id, CATALOG_MAX_ALBUMS)
+            self.requests += max(1, -(-len(album_ids) // 50)) + -(-len(album_ids) // 20)
+            before = len(self.index)
+            for album in await self.spotify.albums(album_ids):
+                tracks = album.get("tracks") or {}
+                items = tracks.get("items", [])
+                if tracks.get("next"):
+                    # Only the first 50 tracks come inline, long albums need their own listing
+                    self.requests += 1
+                    items = await self.spotify.album_tracks(album["id"])
+                self.index.add(items)
+                self.albums += 1
+            logger.info(f"Catalog prefetch: indexed {len(self.index) - before} tracks from "
+                        f"{len(album_ids)} albums of '{artist}'")
+        except Exception as e:
+            # Prefetch is only a shortcut, its songs still go through the normal search
+            self.failures += 1
+            logger.warning(f"Catalog prefetch failed for '{artist}': {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "artists": len(self._fetched),
+            "albums": self.albums,
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+
+
+def _pick_artist(items: List[Dict[str, Any]], artist: str) -> Optional[str]:
+    wanted = clean_artist_name(artist)
+    best_id = None
+    best_score = ARTIST_NAME_THRESHOLD - 1
+    for item in items:
+        score = fuzz.ratio(wanted, clean_artist_name(item.get("name", "")))
+        if score > best_score:
+            best_score = score
+            best_id = item.get("id")
+    return best_id
+
+
+async def prefetch_stream(batches: AsyncIterator[List[Track]], prefetcher: CatalogPrefetcher,
+                          wanted: Optional[Callable[[int, Track], bool]] = None) -> AsyncIterator[List[Track]]:
+    """Pass batches through, letting ``prefetcher`` observe each before its songs are matched.
+
+    ``wanted`` picks the songs that will actually be searched; songs answered
+    from a cache or checkpoint should not make their artist look frequent.
+    """
+    offset = 0
+    async for batch in batches:
+        songs = batch if wanted is None else [song for i, song in enumerate(batch, offset) if wanted(i, song)]
+        with timed("prepare"):
+            await prefetcher.observe(songs)
+        offset += len(batch)
+        yield batch
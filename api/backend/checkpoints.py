@@ -0,0 +1,205 @@
+# Persistent transfer checkpoints so an interrupted transfer can resume without repeating work.
+
+import os, json, asyncio, logging, sqlite3, tempfile, threading, time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Dict, Optional, Any, Tuple
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", os.path.join(tempfile.gettempdir(), "netify_checkpoints.sqlite3"))
+CHECKPOINT_TTL_SECONDS = int(os.getenv("CHECKPOINT_TTL_SECONDS", str(7 * 24 * 3600)))  # How long a transfer stays resumable
+CHECKPOINT_FLUSH_TRACKS = 100  # Track results buffered before they are written out
+
+RUNNING, FAILED, COMPLETED = "running", "failed", "completed"
+
+
+class TransferCheckpoint:
+    """Saved progress of one transfer: its Spotify playlist and every song resolved so far.
+
+    Results are keyed by playlist position and remember the NetEase song id,
+    so a position is only reused while the source playlist still holds the
+    same song there. ``added`` marks URIs that already sit in the playlist.
+    """
+
+    def __init__(self, store: "CheckpointStore", job_id: str, source_url: str, options: Dict[str, Any],
+                 sp_pl_id: Optional[str] = None, status: str = RUNNING,
+                 results: Optional[Dict[int, Tuple[Optional[str], Optional[str], Optional[str], bool]]] = None):
+        self.store = store
+        self.job_id = job_id
+        self.source_url = source_url
+        self.options = options
+        self.sp_pl_id = sp_pl_id
+        self.status = status
+        self.results = results or {}
+        self.last_matched = self._contiguous(-1)
+        self._pending: Dict[int, Tuple[Optional[str], Optional[str], Optional[str], bool]] = {}
+
+    @property
+    def completed(self) -> bool:
+        return self.status == COMPLETED
+
+    def lookup(self, position: int, song_id: Any) -> Optional[Tuple[Optional[str], Optional[str], bool]]:
+        """Return ``(uri, missing_name, added)`` saved for this position, if it still holds the same song."""
+        saved = self.results.get(position)
+        if saved is None or saved[0] != _song_key(song_id):
+            return None
+        return saved[1], saved[2], saved[3]
+
+    def set_playlist(self, sp_pl_id: str) -> None:
+        self.sp_pl_id = sp_pl_id
+        self.flush()
+
+    def record_track(self, position: int, song_id: Any, uri: Optional[str], missing: Optional[str]) -> None:
+        self.results[position] = self._pending[position] = (_song_key(song_id), uri, missing, False)
+        if len(self._pending) >= CHECKPOINT_FLUSH_TRACKS:
+            self.flush()
+
+    def record_added(self, positions: List[int]) -> None:
+        for position in positions:
+            song_key, uri, missing, _ = self.results[position]
+            self.results[position] = self._pending[position] = (song_key, uri, missing, True)
+        self.flush()
+
+    def flush(self) -> "Future[None]":
+        """Queue the buffered results for writing behind earlier flushes; does not wait for the write."""
+        pending, self._pending = self._pending, {}
+        self.last_matched = self._contiguous(self.last_matched)
+        row = (self.job_id, self.source_url, json.dumps(self.options), self.sp_pl_id, self.status, self.last_matched)
+        return self.store.save_later(row, pending)
+
+    async def complete(self) -> None:
+        self.status = COMPLETED
+        await asyncio.wrap_future(self.flush())
+
+    async def fail(self) -> None:
+        self.status = FAILED
+        await asyncio.wrap_future(self.flush())
+
+    def _contiguous(self, start: int) -> int:
+        # Index of the last song such that every earlier song is resolved too
+        position = start
+        while position + 1 in self.results:
+            position += 1
+        return position
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "sp_pl_id": self.sp_pl_id,
+            "last_matched_index": self.last_matched,
+            "tracks_resolved": len(self.results),
+            "tracks_added": sum(1 for saved in self.results.values() if saved[3]),
+            "status": self.status,
+        }
+
+
+def _song_key(song_id: Any) -> Optional[str]:
+    return None if song_id is None else str(song_id)
+
+
+class CheckpointStore:
+    """SQLite-backed checkpoints, one row per transfer plus one row per resolved song.
+
+    Worker processes share the file, so reads and writes run on one thread of
+    the store's own, off the event loop and in the order they were issued: a
+    load always sees every flush queued before it.
+    """
+
+    def __init__(self, path: str, ttl_seconds: int = CHECKPOINT_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoints")
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # Writes from several worker processes queue up instead of failing
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS transfers ("
+            " job_id TEXT PRIMARY KEY, source_url TEXT NOT NULL, options TEXT NOT NULL, sp_pl_id TEXT,"
+            " status TEXT NOT NULL, last_matched INTEGER NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS transfer_tracks ("
+            " job_id TEXT NOT NULL, position INTEGER NOT NULL, song_id TEXT, uri TEXT, missing TEXT,"
+            " added INTEGER NOT NULL, PRIMARY KEY (job_id, position)) WITHOUT ROWID"
+        )
+        self._prune()
+
+    def create(self, job_id: str, source_url: str, options: Dict[str, Any]) -> TransferCheckpoint:
+        checkpoint = TransferCheckpoint(self, job_id, source_url, options)
+        checkpoint.flush()
+        return checkpoint
+
+    async def load(self, job_id: str) -> Optional[TransferCheckpoint]:
+        return await asyncio.wrap_future(self._executor.submit(self._load, job_id))
+
+    def save_later(self, row: Tuple[Any, ...], tracks: Dict[int, Tuple[Optional[str], Optional[str], Optional[str], bool]]) -> "Future[None]":
+        return self._executor.submit(self._save, row, tracks)
+
+    def _load(self, job_id: str) -> Optional[TransferCheckpoint]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT source_url, options, sp_pl_id, status FROM transfers WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            tracks = self._conn.execute(
+                "SELECT position, song_id, uri, missing, added FROM transfer_tracks WHERE job_id = ?", (job_id,)
+            ).fetchall()
+        results = {position: (song_id, uri, missing, bool(added)) for position, song_id, uri, missing, added in tracks}
+        return TransferCheckpoint(self, job_id, row[0], json.loads(row[1]), row[2], row[3], results)
+
+    def _save(self, row: Tuple[Any, ...], tracks: Dict[int, Tuple[Optional[str], Optional[str], Optional[str], bool]]) -> None:
+        job_id, status = row[0], row[4]
+        try:
+            with self._lock:
+                self._conn.execute("BEGIN")
+                try:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO transfers (job_id, source_url, options, sp_pl_id, status, last_matched, updated_at)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        row + (time.time(),),
+                    )
+                    if status == COMPLETED:
+                        # A finished transfer is never resumed, keep only its summary row
+                        self._conn.execute("DELETE FROM transfer_tracks WHERE job_id = ?", (job_id,))
+                    elif tracks:
+                        self._conn.executemany(
+                            "INSERT OR REPLACE INTO transfer_tracks (job_id, position, song_id, uri, missing, added)"
+                            " VALUES (?, ?, ?, ?, ?, ?)",
+                            [(job_id, position, song_id, uri, missing, int(added))
+                             for position, (song_id, uri, missing, added) in tracks.items()],
+                        )
+                    self._conn.execute("COMMIT")
+                except sqlite3.Error:
+                    self._conn.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error as e:
+            # Checkpoints are best effort, a write failure must not fail the transfer itself
+            logger.error(f"Could not save checkpoint for transfer {job_id}: {e}")
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM transfer_tracks WHERE job_id IN (SELECT job_id FROM transfers WHERE updated_at < ?)", (cutoff,)
+            )
+            removed = self._conn.execute("DELETE FROM transfers WHERE updated_at < ?", (cutoff,)).rowcount
+        if removed > 0:
+            logger.info(f"Checkpoint store pruned {removed} expired transfers")
+
+
+_checkpoint_store: Optional[CheckpointStore] = None
+_checkpoint_store_failed = False
+
+
+def get_checkpoint_store() -> Optional[CheckpointStore]:
+    """Open the shared store on first use; returns None if the database cannot be opened."""
+    global _checkpoint_store, _checkpoint_store_failed
+    if _checkpoint_store is None and not _checkpoint_store_failed:
+        try:
+            _checkpoint_store = CheckpointStore(CHECKPOINT_PATH)
+        except sqlite3.Error as e:
+            logger.error(f"Transfer checkpoints disabled, could not open {CHECKPOINT_PATH}: {e}")
+            _checkpoint_store_failed = True
+    return _checkpoint_store
@@ -0,0 +1,123 @@
+# Playlist cover images: download, fit under Spotify's upload limit, and cache the encoded result.
+
+import os, io, asyncio, base64, binascii, logging
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from .spotify_client import fetch_bytes
+from .timings import timed
+
+logger = logging.getLogger(__name__)
+
+COVER_MAX_BYTES = 256 * 1024                                        # Spotify's limit on the base64 JPEG payload
+COVER_MAX_SIDE = int(os.getenv("COVER_MAX_SIDE", "640"))            # Longest side a resized cover is scaled down to
+COVER_CACHE_SIZE = int(os.getenv("COVER_CACHE_SIZE", "64"))         # Encoded covers kept, by source URL
+JPEG_QUALITIES = (90, 80, 70, 60, 50)                               # Tried in turn until the cover fits
+
+# Converting and resizing needs the optional "Pillow" package; without it only JPEGs that already fit are sent
+try:
+    from PIL import Image
+    PILLOW_AVAILABLE = True
+except ImportError:
+    PILLOW_AVAILABLE = False
+
+
+def encoded_size(raw_size: int) -> int:
+    return (raw_size + 2) // 3 * 4
+
+
+def _is_jpeg(data: bytes) -> bool:
+    return data[:3] == b"\xff\xd8\xff"
+
+
+def fit_jpeg(data: bytes, limit: int = COVER_MAX_BYTES) -> Optional[bytes]:
+    """Return JPEG bytes whose base64 form fits in ``limit``, or None if that can't be done.
+
+    A JPEG that already fits is returned untouched. Anything else is scaled
+    down to ``COVER_MAX_SIDE`` and saved at falling qualities, then at smaller
+    sizes, until it fits; without Pillow it is rejected, since Spotify only
+    accepts JPEG. CPU-bound; run it off the event loop.
+    """
+    if _is_jpeg(data) and encoded_size(len(data)) <= limit:
+        return data
+    if not PILLOW_AVAILABLE:
+        return None
+    with Image.open(io.BytesIO(data)) as img:
+        img = img.convert("RGB")
+    side = min(COVER_MAX_SIDE, max(img.size))
+    while side >= 64:
+        scaled = img.copy()
+        scaled.thumbnail((side, side))
+        for quality in JPEG_QUALITIES:
+            out = io.BytesIO()
+            scaled.save(out, "JPEG", quality=quality, optimize=True)
+            if encoded_size(out.tell()) <= limit:
+                return out.getvalue()
+        side = side * 3 // 4
+    return None
+
+
+class CoverCache:
+    """LRU of base64 cover payloads by source URL, so repeat transfers skip the download and encoding."""
+
+    def __init__(self, max_entries: int = COVER_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, url: str) -> Optional[str]:
+        encoded = self._entries.get(url)
+        if encoded is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(url)
+        return encoded
+
+    def put(self, url: str, encoded: str) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[url] = encoded
+        self._entries.move_to_end(url)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+cover_cache = CoverCache()
+
+
+async def cover_payload(cover_url: str) -> Optional[str]:
+    """The base64 JPEG to upload for a data URL or an image URL, or None if it can't be made to fit.
+
+    Download and HTTP errors propagate; the caller decides how to report them.
+    """
+    if cover_url.startswith("data:"):
+        try:
+            data = base64.b64decode(cover_url.split(",", 1)[1])
+        except (IndexError, binascii.Error, ValueError):
+            logger.warning("Cover data URL is not valid base64, skipping the cover")
+            return None
+        url = None
+    else:
+        url = cover_url
+        encoded = cover_cache.get(url)
+        if encoded is not None:
+            return encoded
+        data = await fetch_bytes(url)
+
+    with timed("cover_encode"):
+        fitted = await asyncio.to_thread(fit_jpeg, data)
+    if fitted is None:
+        logger.warning(f"Cover image of {len(data)} bytes can't be made a JPEG under {COVER_MAX_BYTES} bytes"
+                       + ("" if PILLOW_AVAILABLE else "; install Pillow to convert and resize it"))
+        return None
+    if fitted is not data:
+        logger.info(f"Cover image recompressed from {len(data)} to {len(fitted)} bytes")
+    encoded = base64.b64encode(fitted).decode()
+    if url is not None:
+        cover_cache.put(url, encoded)
+    return encoded
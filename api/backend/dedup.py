@@ -0,0 +1,65 @@
+# Collapse repeated songs in a transfer so every distinct song is matched only once.
+
+import asyncio
+from typing import List, Dict, Any, Awaitable, Callable, TypeVar
+
+from .normalize import normalize_text, clean_artist_name
+
+R = TypeVar("R")
+
+DEDUP_DURATION_BUCKET_MS = 2000  # Durations rounded to this step before comparing name keys
+
+
+def song_keys(song_id: Any, title: str, artists: List[str], duration_ms: int) -> List[str]:
+    """Keys under which two songs count as the same: the NetEase id, and the
+    normalized title with its artists and rounded duration."""
+    keys = []
+    if song_id is not None:
+        keys.append(f"id:{song_id}")
+    name = normalize_text(title)
+    if name and artists:
+        bucket = round((duration_ms or 0) / DEDUP_DURATION_BUCKET_MS)
+        keys.append(f"name:{name}|{','.join(sorted(clean_artist_name(a) for a in artists))}|{bucket}")
+    return keys
+
+
+class SongDeduper:
+    """Share one match between every position holding the same song.
+
+    The first song of a group runs the match; later copies, even those that
+    arrive while it is still in flight, wait for its result instead of
+    matching again. Each position still gets its own result, so playlist
+    order and deliberate duplicates are preserved.
+    """
+
+    def __init__(self):
+        self._groups: Dict[str, "asyncio.Future"] = {}
+        self.groups = 0
+        self.duplicates = 0
+
+    async def match(self, keys: List[str], work: Callable[[], Awaitable[R]]) -> R:
+        for key in keys:
+            shared = self._groups.get(key)
+            if shared is not None:
+                self.duplicates += 1
+                # Register this copy's other keys so its own duplicates find the group too
+                for other in keys:
+                    self._groups.setdefault(other, shared)
+                return await asyncio.shield(shared)
+
+        shared = asyncio.get_running_loop().create_future()
+        for key in keys:
+            self._groups[key] = shared
+        self.groups += 1
+        try:
+            result = await work()
+        except BaseException as exc:
+            shared.set_exception(exc)
+            # Nobody may be waiting on it; retrieve the exception so it is not reported as unhandled
+            shared.exception()
+            raise
+        shared.set_result(result)
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        return {"groups": self.groups, "searches_saved": self.duplicates}
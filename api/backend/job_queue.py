@@ -0,0 +1,325 @@
+# Shared SQLite job queue so API workers and transfer worker processes see the same jobs.
+
+import os, asyncio, json, logging, sqlite3, tempfile, threading, time, uuid
+from typing import List, Dict, Optional, Any, Tuple
+
+from .jobs import TransferJob, JobStoreFull, MAX_JOBS, JOB_TTL_SECONDS, QUEUED, RUNNING, SUCCEEDED, FAILED
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUE_ENABLED = os.getenv("JOB_QUEUE", "0").lower() in ("1", "true", "yes")  # Hand jobs to worker processes
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", os.path.join(tempfile.gettempdir(), "netify_jobs.sqlite3"))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "30"))  # A worker that stops renewing loses its jobs after this
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))     # Claims per job before it is failed as abandoned
+JOB_POLL_SECONDS = 0.5        # How often status readers and idle workers look for changes
+
+
+class JobQueue:
+    """Jobs, their latest progress and their events in one SQLite file in WAL mode.
+
+    The API inserts queued jobs; worker processes claim them under a lease,
+    write a progress snapshot and event rows as the job runs, and renew the
+    lease while they are alive. A job whose lease runs out is claimed again
+    by another worker, so a crashed worker never strands its transfers.
+    Any process can read any job's status and events.
+
+    Writes may wait on other processes for the write lock, so the coroutine
+    methods run them in a thread; status reads use a connection of their own
+    and, in WAL mode, never wait for a writer.
+    """
+
+    def __init__(self, path: str, max_jobs: int = MAX_JOBS, ttl_seconds: int = JOB_TTL_SECONDS):
+        self.max_jobs = max_jobs
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # Claims and progress writes from several processes queue up instead of failing
+        self._conn.execute("PRAGMA busy_timeout=10000")
+        self._read_lock = threading.Lock()
+        self._reader = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._reader.execute("PRAGMA busy_timeout=1000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT, status TEXT NOT NULL, state TEXT NOT NULL,"
+            " created_at REAL NOT NULL, updated_at REAL NOT NULL, finished_at REAL,"
+            " lease_owner TEXT, lease_expires REAL, attempts INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, created_at)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_events ("
+            " job_id TEXT NOT NULL, seq INTEGER NOT NULL, event TEXT NOT NULL,"
+            " PRIMARY KEY (job_id, seq)) WITHOUT ROWID"
+        )
+
+    # --- API side ---
+
+    async def enqueue(self, kind: str, payload: Dict[str, Any], job_id: Optional[str] = None) -> "QueuedJob":
+        """Queue a job; passing the id of a finished job replaces it, as a resume does."""
+        job = TransferJob(job_id or uuid.uuid4().hex)
+        await asyncio.to_thread(self._insert, job.id, kind, payload, job.to_dict())
+        return QueuedJob(self, job.id, QUEUED)
+
+    def _insert(self, job_id: str, kind: str, payload: Dict[str, Any], state: Dict[str, Any]) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._prune(now)
+                active = self._conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?) AND id != ?", (QUEUED, RUNNING, job_id)
+                ).fetchone()[0]
+                if active >= self.max_jobs:
+                    raise JobStoreFull(f"{active} transfers already queued or running")
+                self._conn.execute("DELETE FROM job_events WHERE job_id = ?", (job_id,))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO jobs (id, kind, payload, status, state, created_at, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, kind, json.dumps(payload), QUEUED, json.dumps(state), now, now),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get(self, job_id: str) -> Optional["QueuedJob"]:
+        row = self._row(job_id)
+        return QueuedJob(self, job_id, row[0]) if row else None
+
+    def _row(self, job_id: str) -> Optional[Tuple[str, str]]:
+        with self._read_lock:
+            return self._reader.execute("SELECT status, state FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+    def events_since(self, job_id: str, seq: int) -> List[Tuple[int, Dict[str, Any]]]:
+        with self._read_lock:
+            rows = self._reader.execute(
+                "SELECT seq, event FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq", (job_id, seq)
+            ).fetchall()
+        return [(s, json.loads(event)) for s, event in rows]
+
+    def counts(self) -> Dict[str, int]:
+        with self._read_lock:
+            return dict(self._reader.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def _prune(self, now: float) -> None:
+        expired = "SELECT id FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?"
+        self._conn.execute(f"DELETE FROM job_events WHERE job_id IN ({expired})", (now - self.ttl_seconds,))
+        self._conn.execute("DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (now - self.ttl_seconds,))
+
+    # --- Worker side ---
+
+    async def claim(self, owner: str) -> Optional[Tuple["StoredJob", str, Dict[str, Any]]]:
+        """Lease the oldest queued job, or one whose worker stopped renewing; None if there is none.
+
+        Returns the job to run, its kind and its payload.
+        """
+        claimed = await asyncio.to_thread(self._claim, owner)
+        if claimed is None:
+            return None
+        job_id, kind, payload, last_seq, attempts = claimed
+        job = StoredJob(self, job_id, owner, last_seq)
+        job.attempt = attempts + 1
+        return job, kind, payload
+
+    def _claim(self, owner: str) -> Optional[Tuple[str, str, Dict[str, Any], int, int]]:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                while True:
+                    row = self._conn.execute(
+                        "SELECT id, kind, payload, attempts, state FROM jobs"
+                        " WHERE status = ? OR (status = ? AND lease_expires < ?) ORDER BY created_at LIMIT 1",
+                        (QUEUED, RUNNING, now),
+                    ).fetchone()
+                    if row is None:
+                        self._conn.execute("COMMIT")
+                        return None
+                    job_id, kind, payload, attempts, state = row
+                    if attempts < JOB_MAX_ATTEMPTS:
+                        break
+                    self._abandon(job_id, json.loads(state), attempts, now)
+
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1,"
+                    " updated_at = ? WHERE id = ?",
+                    (RUNNING, owner, now + JOB_LEASE_SECONDS, now, job_id),
+                )
+                last_seq = self._conn.execute(
+                    "SELECT COALESCE(MAX(seq), 0) FROM job_events WHERE job_id = ?", (job_id,)
+                ).fetchone()[0]
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if attempts:
+            logger.warning(f"Job {job_id} reclaimed by {owner} after its lease expired (attempt {attempts + 1})")
+        return job_id, kind, json.loads(payload or "{}"), last_seq, attempts
+
+    def _abandon(self, job_id: str, state: Dict[str, Any], attempts: int, now: float) -> None:
+        error = f"Transfer abandoned after {attempts} attempts"
+        state.update(status=FAILED, phase="failed", error=error, error_status=500, finished_at=now)
+        last_seq = self._conn.execute(
+            "SELECT COALESCE(MAX(seq), 0) FROM job_events WHERE job_id = ?", (job_id,)
+        ).fetchone()[0]
+        self._conn.execute(
+            "INSERT INTO job_events (job_id, seq, event) VALUES (?, ?, ?)",
+            (job_id, last_seq + 1, json.dumps({"type": "failed", "error": error, "error_status": 500})),
+        )
+        self._conn.execute(
+            "UPDATE jobs SET status = ?, state = ?, payload = NULL, lease_owner = NULL, finished_at = ?, updated_at = ?"
+            " WHERE id = ?",
+            (FAILED, json.dumps(state), now, now, job_id),
+        )
+        logger.error(f"Job {job_id}: {error}")
+
+    def save(self, job_id: str, owner: str, status: str, state: str, finished_at: Optional[float],
+             events: List[Tuple[int, str]]) -> bool:
+        """Write a job's new events and current progress; False if ``owner`` no longer holds its lease."""
+        now = time.time()
+        finished = finished_at is not None
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                cur = self._conn.execute(
+                    # A finished job drops its payload, which holds the user's Spotify token
+                    "UPDATE jobs SET status = ?, state = ?, updated_at = ?, finished_at = ?,"
+                    " payload = CASE WHEN ? THEN NULL ELSE payload END,"
+                    " lease_owner = CASE WHEN ? THEN NULL ELSE lease_owner END"
+                    " WHERE id = ? AND lease_owner = ?",
+                    (status, state, now, finished_at, finished, finished, job_id, owner),
+                )
+                if cur.rowcount:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO job_events (job_id, seq, event) VALUES (?, ?, ?)",
+                        [(job_id, seq, event) for seq, event in events],
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return bool(cur.rowcount)
+
+    async def renew(self, owner: str, job_ids: List[str]) -> List[str]:
+        """Extend the leases of ``job_ids`` and return the ones this worker still holds."""
+        if not job_ids:
+            return []
+        return await asyncio.to_thread(self._renew, owner, job_ids)
+
+    def _renew(self, owner: str, job_ids: List[str]) -> List[str]:
+        marks = ",".join("?" * len(job_ids))
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET lease_expires = ? WHERE lease_owner = ? AND status = ? AND id IN ({marks})",
+                (time.time() + JOB_LEASE_SECONDS, owner, RUNNING, *job_ids),
+            )
+            return [row[0] for row in self._conn.execute(
+                f"SELECT id FROM jobs WHERE lease_owner = ? AND id IN ({marks})", (owner, *job_ids)
+            ).fetchall()]
+
+    async def release(self, owner: str) -> int:
+        """Hand a stopping worker's unfinished jobs back to the queue at once instead of at lease expiry."""
+        return await asyncio.to_thread(self._release, owner)
+
+    def _release(self, owner: str) -> int:
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET lease_expires = 0 WHERE lease_owner = ? AND status = ?", (owner, RUNNING)
+            )
+        return cur.rowcount
+
+
+class StoredJob(TransferJob):
+    """A TransferJob run by a worker, mirroring every event and progress change into the queue.
+
+    Events are written by one background saver per job, in a thread; those
+    emitted while a write is in flight go out together in the next one.
+    """
+
+    def __init__(self, queue: JobQueue, job_id: str, owner: str, last_seq: int = 0):
+        super().__init__(job_id)
+        self.queue = queue
+        self.owner = owner
+        self.lease_lost = False
+        # A reclaimed job continues the event sequence its subscribers have already seen
+        self._event_seq = last_seq
+        self._unsaved: List[Tuple[int, str]] = []
+        self._saver: Optional["asyncio.Task"] = None
+
+    def _emit(self, event: Dict[str, Any], flush: bool = True) -> None:
+        super()._emit(event, flush)
+        if self.lease_lost:
+            return
+        self._unsaved.append((self._event_seq, json.dumps(event)))
+        if self._saver is None or self._saver.done():
+            self._saver = asyncio.ensure_future(self._save_unsaved())
+
+    async def _save_unsaved(self) -> None:
+        while self._unsaved and not self.lease_lost:
+            events, self._unsaved = self._unsaved, []
+            # The snapshot is taken here, on the event loop, while nothing else changes the job
+            state = json.dumps(self.to_dict())
+            finished_at = self.finished_at if self.finished else None
+            try:
+                held = await asyncio.to_thread(self.queue.save, self.id, self.owner, self.status, state, finished_at, events)
+            except sqlite3.Error as e:
+                logger.warning(f"Job {self.id}: could not record progress: {e}")
+                continue
+            if not held:
+                self.lease_lost = True
+                logger.warning(f"Job {self.id}: lease lost, progress is no longer recorded")
+
+    async def saved(self) -> None:
+        """Wait until every event emitted so far has been written."""
+        while self._saver is not None and not self._saver.done():
+            await asyncio.shield(self._saver)
+
+
+class QueuedJob:
+    """Read-only view of a job in the queue, answering the same calls as an in-process TransferJob."""
+
+    def __init__(self, queue: JobQueue, job_id: str, status: str):
+        self.queue = queue
+        self.id = job_id
+        self.status = status
+
+    @property
+    def finished(self) -> bool:
+        row = self.queue._row(self.id)
+        self.status = row[0] if row else FAILED
+        return self.status in (SUCCEEDED, FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        row = self.queue._row(self.id)
+        if row is None:
+            return {"job_id": self.id, "status": FAILED, "error": "Job expired"}
+        self.status = row[0]
+        return {**json.loads(row[1]), "status": row[0]}
+
+    def events_since(self, seq: int) -> List[Tuple[int, Dict[str, Any]]]:
+        return self.queue.events_since(self.id, seq)
+
+    async def wait_for_events(self, seq: int, timeout: float) -> None:
+        """Poll for an event newer than ``seq`` for up to ``timeout`` seconds."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if await asyncio.to_thread(self.events_since, seq):
+                return
+            await asyncio.sleep(min(JOB_POLL_SECONDS, max(0.0, deadline - time.monotonic())))
+
+
+_job_queue: Optional[JobQueue] = None
+_job_queue_failed = False
+
+
+def get_job_queue() -> Optional[JobQueue]:
+    """The shared queue when ``JOB_QUEUE`` is enabled; None runs jobs in-process, as does a database that cannot be opened."""
+    global _job_queue, _job_queue_failed
+    if JOB_QUEUE_ENABLED and _job_queue is None and not _job_queue_failed:
+        try:
+            _job_queue = JobQueue(JOB_QUEUE_PATH)
+        except sqlite3.Error as e:
+            logger.error(f"Job queue disabled, could not open {JOB_QUEUE_PATH}: {e}")
+            _job_queue_failed = True
+    return _job_queue
@@ -0,0 +1,206 @@
+# Background transfer jobs and their bounded in-process state store.
+
+import os, asyncio, logging, time, uuid
+from collections import OrderedDict, deque
+from typing import List, Dict, Optional, Any, Tuple
+
+from .profiling import profile_url
+from .timings import PhaseTimer
+
+logger = logging.getLogger(__name__)
+
+MAX_JOBS = int(os.getenv("MAX_JOBS", "500"))                  # Jobs kept in memory at once
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", "3600"))   # How long finished jobs stay queryable
+MAX_JOB_EVENTS = 1000         # Events retained per job for late or reconnecting subscribers
+EVENT_BATCH_SIZE = 50         # Track results folded into one "tracks" event
+EVENT_BATCH_SECONDS = 0.5     # Longest a track result waits before its batch is flushed
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+
+class JobStoreFull(Exception):
+    """Raised when every job slot is taken by a job that has not finished yet."""
+
+
+class TransferJob:
+    """Progress and outcome of one transfer, updated in place by the worker coroutine."""
+
+    def __init__(self, job_id: str):
+        self.id = job_id
+        self.status = QUEUED
+        self.phase = "queued"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.tracks_total = 0
+        self.tracks_matched = 0
+        self.tracks_found = 0
+        self.chunks_total = 0
+        self.chunks_added = 0
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.error_status: Optional[int] = None
+        self.timings = PhaseTimer()
+        self.timings.phase(self.phase)
+        self.profile_id: Optional[str] = None
+        self.attempt = 1  # Above 1 once a queue worker has reclaimed the job from another
+        self._match_started: Optional[float] = None
+        self.events: "deque[Tuple[int, Dict[str, Any]]]" = deque(maxlen=MAX_JOB_EVENTS)
+        self._event_seq = 0
+        self._pending_tracks: List[Dict[str, Any]] = []
+        self._last_flush = time.monotonic()
+        self._wakeup = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED)
+
+    def set_phase(self, phase: str) -> None:
+        if self.status == QUEUED:
+            self.status = RUNNING
+            self.started_at = time.time()
+        if phase == "matching":
+            self._match_started = time.monotonic()
+        self.timings.phase(phase)
+        self.phase = phase
+        logger.info(f"Job {self.id}: phase {phase}")
+        self._emit({"type": "phase", "phase": phase, "progress": self.progress()})
+
+    def record_track(self, index: int, name: str, uri: Optional[str]) -> None:
+        """Count one resolved song and queue it for the next batched "tracks" event."""
+        self.tracks_matched += 1
+        if uri:
+            self.tracks_found += 1
+        self._pending_tracks.append({"index": index, "name": name, "uri": uri})
+        if len(self._pending_tracks) >= EVENT_BATCH_SIZE or time.monotonic() - self._last_flush >= EVENT_BATCH_SECONDS:
+            self._flush_tracks()
+
+    def record_chunk(self, index: int, size: int) -> None:
+        self.chunks_added += 1
+        self._emit({"type": "chunk", "chunk": index, "tracks": size, "phase": self.phase, "progress": self.progress()})
+
+    def succeed(self, result: Dict[str, Any]) -> None:
+        self.result = result
+        self.status = SUCCEEDED
+        self.phase = "done"
+        self.finished_at = time.time()
+        self.timings.finish()
+        # Per-track outcomes were already streamed, so the final event carries only the summary
+        self._emit({"type": "done", "result": {k: v for k, v in result.items() if k != "missing"},
+                    "timings": self.timings.to_dict()})
+
+    def fail(self, detail: str, status_code: int = 500) -> None:
+        self.error = detail
+        self.error_status = status_code
+        self.status = FAILED
+        self.phase = "failed"
+        self.finished_at = time.time()
+        self.timings.finish()
+        self._emit({"type": "failed", "error": detail, "error_status": status_code})
+
+    def _flush_tracks(self) -> None:
+        if self._pending_tracks:
+            tracks, self._pending_tracks = self._pending_tracks, []
+            self._emit({"type": "tracks", "tracks": tracks, "progress": self.progress()}, flush=False)
+        self._last_flush = time.monotonic()
+
+    def _emit(self, event: Dict[str, Any], flush: bool = True) -> None:
+        # Keep ordering: buffered track results always precede the event that follows them
+        if flush:
+            self._flush_tracks()
+        self._event_seq += 1
+        self.events.append((self._event_seq, event))
+        self._wakeup.set()
+        self._wakeup = asyncio.Event()
+
+    def events_since(self, seq: int) -> List[Tuple[int, Dict[str, Any]]]:
+        return [(s, e) for s, e in self.events if s > seq]
+
+    async def wait_for_events(self, seq: int, timeout: float) -> None:
+        """Return once an event newer than ``seq`` exists, or after ``timeout`` seconds."""
+        if self._event_seq > seq:
+            return
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def eta_seconds(self) -> Optional[float]:
+        """Estimate remaining time from the matching rate observed so far."""
+        if self.finished:
+            return 0.0
+        if self._match_started is None or self.tracks_matched == 0 or self.tracks_total == 0:
+            return None
+        rate = self.tracks_matched / max(time.monotonic() - self._match_started, 1e-6)
+        remaining_tracks = max(self.tracks_total - self.tracks_matched, 0)
+        return round(remaining_tracks / rate, 1)
+
+    def progress(self) -> Dict[str, Any]:
+        return {
+            "tracks_total": self.tracks_total,
+            "tracks_matched": self.tracks_matched,
+            "tracks_found": self.tracks_found,
+            "chunks_total": self.chunks_total,
+            "chunks_added": self.chunks_added,
+            "eta_seconds": self.eta_seconds(),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "phase": self.phase,
+            **self.progress(),
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+            "error_status": self.error_status,
+            "timings": self.timings.to_dict(),
+            "profile_url": profile_url(self.profile_id) if self.profile_id else None,
+        }
+
+
+class JobStore:
+    """Insertion-ordered job registry with a hard size cap.
+
+    Finished jobs expire after ``ttl_seconds``; when the store is full the
+    oldest finished jobs are dropped first, and new jobs are refused only if
+    every slot holds a job that is still running.
+    """
+
+    def __init__(self, max_jobs: int = MAX_JOBS, ttl_seconds: int = JOB_TTL_SECONDS):
+        self.max_jobs = max_jobs
+        self.ttl_seconds = ttl_seconds
+        self._jobs: "OrderedDict[str, TransferJob]" = OrderedDict()
+
+    def create(self, job_id: Optional[str] = None) -> TransferJob:
+        """Register a new job; passing the id of a finished job replaces it, as a resume does."""
+        self._prune()
+        if job_id is not None:
+            self._jobs.pop(job_id, None)
+        if len(self._jobs) >= self.max_jobs:
+            raise JobStoreFull(f"{len(self._jobs)} transfers already in progress")
+        job = TransferJob(job_id or uuid.uuid4().hex)
+        self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[TransferJob]:
+        self._prune()
+        return self._jobs.get(job_id)
+
+    def _prune(self) -> None:
+        now = time.time()
+        expired = [jid for jid, job in self._jobs.items() if job.finished and now - job.finished_at > self.ttl_seconds]
+        for jid in expired:
+            del self._jobs[jid]
+
+        if len(self._jobs) >= self.max_jobs:
+            for jid in [jid for jid, job in self._jobs.items() if job.finished]:
+                del self._jobs[jid]
+                if len(self._jobs) < self.max_jobs:
+                    break
+
+
+job_store = JobStore()
@@ -1,30 +1,58 @@
 # FastAPI backend relocated for Vercel
 # (this file mirrors previously developed backend/main.py)
 
-import os, re, asyncio, logging, base64, time, random
+import os, re, json, asyncio, logging, sqlite3
+from contextlib import asynccontextmanager
 from datetime import date
-from typing import List, Dict, Optional, Any, Tuple
+from typing import List, Dict, Optional, Any, Set, Tuple, AsyncIterator, Awaitable, Callable
 from urllib.parse import urlparse, parse_qs
 import traceback
 
-import requests
-from fastapi import FastAPI, HTTPException, Query, Body, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Query, Body, BackgroundTasks, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from rapidfuzz import fuzz, process
-import unicodedata
-import re as _re
 import httpx
 from dotenv import load_dotenv
 
-# Load environment variables from .env file if it exists
+# Load environment variables from .env file if it exists; before the sibling imports, which read settings at import time
 load_dotenv()
 
+from .album_match import ALBUM_SEARCH_LIMIT, album_query, pick_album, match_album_tracks
+from .catalog import CatalogPrefetcher, prefetch_stream
+from .checkpoints import TransferCheckpoint, get_checkpoint_store
+from .covers import cover_payload
+from .dedup import DEDUP_DURATION_BUCKET_MS, SongDeduper, song_keys
+from .job_queue import get_job_queue
+from .jobs import TransferJob, JobStoreFull, job_store
+from .match_cache import get_match_cache
+from .metrics import ACTIVE_TRANSFERS, MATCHES, TRANSFER_RATE, registry
+from .netease_client import fetch_playlist, fetch_album, iter_full_tracks, fetch_tracks_by_ids, track_id
+from .normalize import normalize_text, clean_artist_name
+from .playlist_cache import playlist_cache, playlist_version
+from .playlist_writer import OrderedChunkWriter
+from .profiling import ALLOW_PROFILING, ProfilerBusy, profile_store, profile_url
+from .query_planner import plan_searches, execute_plan, search_stats
+from .scheduler import MatchScheduler
+from .spotify_client import SpotifyClient, get_http_client, close_http_client, refresh_access_token, spotify_rate, retryable_status, SPOTIFY_ACCOUNTS_URL
+from .sync_store import get_sync_store
+from .timings import PhaseTimer, pause, server_timing_header, timed, use_timer
+from .track_index import TrackIndex
+from .tracks import Track
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Netify Backend API", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Release the pooled upstream connections on shutdown
+    await close_http_client()
+
+
+app = FastAPI(title="Netify Backend API", version="1.0.0", lifespan=lifespan)
 
 # Configure CORS - explicitly allow the frontend domain
 allowed_origins = [
@@ -44,43 +72,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-_ALBUM_ID_RE = re.compile(r"id=(\d+)")
+_ALBUM_ID_RE = re.compile(r"(?:/album/|id=)(\d+)")
+_SPOTIFY_PLAYLIST_RE = re.compile(r"playlist[/:]([A-Za-z0-9]+)")
 MAX_TRACKS_PER_REQUEST = 100  # Spotify API limit for adding tracks in one request
 MAX_PLAYLIST_SIZE = 10000     # Spotify's maximum playlist size
 MAX_RETRIES = 5               # Maximum number of retries for API requests
 MAX_NETEASE_FETCH = 10000     # Maximum tracks to fetch from NetEase in one request
-MATCH_THRESHOLD = 65          # Threshold for fuzzy matching percentage
-
-
-def normalize_text(s: str) -> str:
-    """Normalize text for better matching between NetEase and Spotify tracks."""
-    if not s:
-        return ""
-    # Regex for patterns to remove
-    _PAREN_RE = _re.compile(r"[\[\(（【].*?[\]）】\)]")
-    _FEAT_RE = _re.compile(r"\s+(ft\.|feat\.|featuring|with|和|與)\s+.*", _re.IGNORECASE)
-    # Remove version markers with expanded patterns
-    _VERSION_RE = _re.compile(r"\s+(- )?((Album|Single|Live|Acoustic|Remix|Remaster(ed)?|Version|Edit|Radio Edit|Extended|Original|Official Audio|MV|Cover|翻唱|混音|重制|现场|直播|纯音乐|纯音|伴奏)\s*).*$", _re.IGNORECASE)
-    
-    s = unicodedata.normalize("NFKD", s)
-    s = _PAREN_RE.sub("", s)
-    s = _FEAT_RE.sub("", s)
-    s = _VERSION_RE.sub("", s)
-    s = _re.sub(r"[^\w\s]", "", s)  # Remove punctuation
-    return _re.sub(r"\s+", " ", s).strip().lower()
-
-
-def clean_artist_name(name: str) -> str:
-    """Clean artist name for better matching."""
-    if not name:
-        return ""
-    name = unicodedata.normalize("NFKD", name)
-    name = _re.sub(r"[^\w\s]", "", name)  # Remove punctuation
-    return _re.sub(r"\s+", " ", name).strip().lower()
+MATCH_CONCURRENCY = int(os.getenv("MATCH_CONCURRENCY", "8"))  # Songs searched in parallel per transfer
+SSE_HEARTBEAT_SECONDS = 15    # Keep-alive comment interval on idle event streams
+PIPELINE_QUEUE_SIZE = 500     # Fetched songs buffered ahead of matching
+PIPELINE_PENDING_CHUNKS = 4   # Matched chunks buffered ahead of playlist insertion
 
 
 def get_all_artists(song: Dict) -> List[str]:
-    """Extract all artist names from a NetEase song object."""
+    """Extract all artist names from a raw NetEase song or album object."""
     artists = []
     # Try to get the artists from ar field
     if song.get("ar"):
@@ -92,75 +97,190 @@ def get_all_artists(song: Dict) -> List[str]:
     return [a for a in artists if a]  # Remove any empty strings
 
 
-def spotify_headers(token: str) -> Dict[str, str]:
-    return {"Authorization": f"Bearer {token}"}
+async def get_playlist_data(pid: str):
+    return await fetch_playlist(pid)
 
 
-def fetch_playlist(pl_id: str):
-    url = f"https://music.163.com/api/v6/playlist/detail?id={pl_id}"
-    resp = requests.get(url, headers={"User-Agent": "Mozilla/5.0", "Referer": "https://music.163.com/"})
-    resp.raise_for_status()
-    data = resp.json()
-    if data.get("code") != 200:
-        raise ValueError("playlist api error")
-    return data
+async def open_playlist(pid: str) -> Tuple[Dict, AsyncIterator[List[Track]]]:
+    """Return the playlist object and an async iterator over its full tracks, in playlist order.
 
+    Served from the shared playlist cache when the entry is fresh, or when
+    NetEase still reports the same update markers for the playlist. Otherwise
+    the tracks stream in page by page and are cached once the last one arrives.
+    """
+    entry = playlist_cache.get_fresh(pid)
+    if entry:
+        logger.info(f"Playlist {pid} served from cache ({len(entry.tracks)} tracks)")
+        return entry.playlist, _single_batch(entry.tracks)
 
-async def get_playlist_data(pid: str):
-    return await asyncio.to_thread(fetch_playlist, pid)
+    pdata = await get_playlist_data(pid)
+    pl = pdata.get("playlist") or pdata.get("result")
 
+    entry = playlist_cache.get_valid(pid, playlist_version(pl))
+    if entry:
+        logger.info(f"Playlist {pid} unchanged since last fetch, reusing {len(entry.tracks)} cached tracks")
+        return entry.playlist, _single_batch(entry.tracks)
 
-class TransferBody(BaseModel):
-    url: str
-    spotify_token: str
-    description: Optional[str] = None
-    custom_name: Optional[str] = None
-    cover_url: Optional[str] = None
+    logger.info(f"Playlist {pid} has {len(pl.get('trackIds', []))} trackIds and {len(pl.get('tracks', []))} tracks")
+    return pl, _stream_tracks(pid, pl)
 
 
-@app.get("/api/playlist-info")
-async def playlist_info(url: str = Query(...)):
-    try:
-        pid = extract_playlist_id(url)
-        pdata = await get_playlist_data(pid)
-    except Exception as exc:
-        logger.error(f"Error fetching playlist info: {exc}")
-        traceback.print_exc()
-        raise HTTPException(502, detail=str(exc))
+async def _single_batch(tracks: List[Track]) -> AsyncIterator[List[Track]]:
+    yield tracks
 
-    pl = pdata.get("playlist") or pdata.get("result")
-    
-    # Check if we have all tracks
-    track_ids_count = len(pl.get("trackIds", []))
-    tracks_count = len(pl.get("tracks", []))
-    
-    logger.info(f"Playlist {pid} has {track_ids_count} trackIds and {tracks_count} tracks")
-    
+
+async def _stream_tracks(pid: str, pl: Dict) -> AsyncIterator[List[Track]]:
     # ALWAYS fetch full tracks for consistent behavior
     logger.info(f"Fetching all tracks for playlist {pid}")
-    full_tracks = fetch_full_tracks(pid)
-    
+    full_tracks: List[Track] = []
+    try:
+        async for batch in iter_full_tracks(pid):
+            full_tracks.extend(batch)
+            yield batch
+    except Exception as e:
+        # Songs already yielded are in flight downstream, so only an empty stream can fall back
+        logger.error(f"Error fetching full tracks: {e}")
+        if full_tracks:
+            raise
+
     if full_tracks:
         logger.info(f"Fetched {len(full_tracks)} tracks for playlist {pid}")
-        pl["tracks"] = full_tracks
     else:
         # Fallback to fetching by IDs if main method fails
         logger.info(f"Falling back to fetch_tracks_by_ids for playlist {pid}")
-        track_ids = pl.get("trackIds", [])
-        full_tracks = fetch_tracks_by_ids(track_ids)
-        
+        full_tracks = await fetch_tracks_by_ids(pl.get("trackIds", []))
         if full_tracks:
-            pl["tracks"] = full_tracks
             logger.info(f"Fetched {len(full_tracks)} tracks by IDs for playlist {pid}")
+            yield full_tracks
+
+    if full_tracks:
+        pl["tracks"] = full_tracks
+        playlist_cache.put(pid, pl, full_tracks)
+    else:
+        # If we still have no tracks, use what we got from the initial playlist data
+        logger.warning("All track fetching methods failed. Using tracks from initial playlist data.")
+        if pl.get("tracks"):
+            yield pl["tracks"]
+
+
+async def load_playlist(pid: str) -> Dict:
+    """Return the playlist object with its complete ``tracks`` list."""
+    pl, batches = await open_playlist(pid)
+    async for _ in batches:
+        pass
+    return pl
+
+
+async def _first_batch(batches: AsyncIterator[List[Track]]) -> List[Track]:
+    """Return the first non-empty batch, or an empty list after closing a source that had none."""
+    async for batch in batches:
+        if batch:
+            return batch
+    await batches.aclose()
+    return []
+
+
+async def _prepend(first: List[Track], rest: AsyncIterator[List[Track]]) -> AsyncIterator[List[Track]]:
+    try:
+        yield first
+        async for batch in rest:
+            yield batch
+    finally:
+        await rest.aclose()
+
+
+async def _take(batches: AsyncIterator[List[Track]], limit: int) -> AsyncIterator[List[Track]]:
+    """Pass batches through until ``limit`` songs have been yielded, then close the source."""
+    remaining = limit
+    try:
+        async for batch in batches:
+            if len(batch) >= remaining:
+                logger.warning(f"Playlist exceeds Spotify limit of {limit} tracks, truncating")
+                yield batch[:remaining]
+                return
+            remaining -= len(batch)
+            yield batch
+    finally:
+        await batches.aclose()
+
+
+class SpotifyCredentials(BaseModel):
+    spotify_token: str
+    # Optional: let a long job renew the access token itself instead of failing when it expires
+    spotify_refresh_token: Optional[str] = None
+    spotify_token_expires_at: Optional[float] = None  # Unix time the access token expires
+
+
+def spotify_client(credentials: SpotifyCredentials) -> SpotifyClient:
+    return SpotifyClient(credentials.spotify_token, credentials.spotify_refresh_token, credentials.spotify_token_expires_at)
+
+
+class TransferBody(SpotifyCredentials):
+    url: str
+    description: Optional[str] = None
+    custom_name: Optional[str] = None
+    cover_url: Optional[str] = None
+    profile: bool = False  # Capture a cProfile of the transfer, needs ALLOW_PROFILING
+
+
+def check_profiling_allowed() -> None:
+    if not ALLOW_PROFILING:
+        raise HTTPException(403, detail="Profiling is disabled on this server")
+
+
+def check_transfer_profiling(payload: TransferBody) -> None:
+    # Profiles stay in the process that captured them, and queued jobs run in worker processes
+    if payload.profile and get_job_queue():
+        raise HTTPException(400, detail="Transfers can't be profiled while JOB_QUEUE is enabled")
+
+
+@app.get("/api/playlist-info")
+async def playlist_info(response: Response, url: str = Query(...), profile: bool = Query(False)):
+    """Playlist title, cover and a track preview, with a timing breakdown of the request.
+
+    With ``profile=true`` (and ``ALLOW_PROFILING`` set) the request is run
+    under cProfile and the response links to the captured profile.
+    """
+    if not profile:
+        return await _playlist_info(response, url)
+    check_profiling_allowed()
+    try:
+        with profile_store.capture(f"playlist-info {url}") as profile_id:
+            info = await _playlist_info(response, url)
+    except ProfilerBusy as exc:
+        raise HTTPException(409, detail=str(exc))
+    return {**info, "profile_url": profile_url(profile_id)}
+
+
+async def _playlist_info(response: Response, url: str) -> Dict[str, Any]:
+    timer = PhaseTimer()
+    with use_timer(timer):
+        timer.phase("fetch")
+        try:
+            pid = extract_playlist_id(url)
+            pl = await load_playlist(pid)
+        except Exception as exc:
+            logger.error(f"Error fetching playlist info: {exc}")
+            traceback.print_exc()
+            raise HTTPException(502, detail=str(exc))
+        timer.phase("prepare")
+        info = _playlist_summary(pid, pl)
+    timer.finish()
+    response.headers["Server-Timing"] = timer.server_timing()
+    return {**info, "timings": timer.to_dict()}
+
+
+def _playlist_summary(pid: str, pl: Dict[str, Any]) -> Dict[str, Any]:
+    track_ids_count = len(pl.get("trackIds", []))
     
     tracks = [
         {
-            "name": t.get("name", ""),
-            "artist": t.get("ar", t.get("artists", [{}]))[0].get("name", "") if t.get("ar") or t.get("artists") else "",
-            "duration_ms": t.get("dt", t.get("duration", 0))
+            "name": t.name,
+            "artist": t.artists[0],
+            "duration_ms": t.duration_ms
         }
         for t in pl.get("tracks", [])
-        if t.get("name") and (t.get("ar") or t.get("artists"))
+        if t.name and t.artists
     ]
     
     # Make sure we report the correct count to the frontend
@@ -184,25 +304,61 @@ async def playlist_info(url: str = Query(...)):
     }
 
 
-def retry_request(func, *args, **kwargs):
-    """Retry a request function with exponential backoff."""
-    retries = 0
-    while retries < MAX_RETRIES:
-        try:
-            return func(*args, **kwargs)
-        except requests.exceptions.RequestException as e:
-            retries += 1
-            if retries == MAX_RETRIES:
-                logger.error(f"Max retries reached for request: {e}")
-                raise e
-            
-            # Calculate backoff time: 2^retries + random jitter
-            backoff_time = (2 ** retries) + random.uniform(0, 1)
-            logger.info(f"Request failed, retrying in {backoff_time:.2f} seconds...")
-            time.sleep(backoff_time)
-
-
-async def search_track_on_spotify(track_name: str, artists: List[str], duration_ms: int, token: str) -> Optional[str]:
+@app.get("/api/album-info")
+async def album_info(url: str = Query(...)):
+    """Album counterpart of ``/api/playlist-info``, with the same response shape."""
+    try:
+        album_id = extract_album_id(url)
+        data = await fetch_album(album_id)
+    except Exception as exc:
+        logger.error(f"Error fetching album info: {exc}")
+        raise HTTPException(502, detail=str(exc))
+
+    album = data["album"]
+    tracks = [
+        {
+            "name": t.name,
+            "artist": t.artists[0] if t.artists else "",
+            "duration_ms": t.duration_ms
+        }
+        for t in data["songs"]
+        if t.name
+    ]
+    return {
+        "playlist_title": album.get("name", "Unknown Album"),
+        "cover_url": album.get("picUrl", ""),
+        "tracks": tracks,
+        "total_tracks_count": len(tracks),
+    }
+
+
+def match_cache_key(track_name: str, artists: List[str], duration_ms: int) -> Optional[str]:
+    """Normalized title/artist key used when a song id has not been seen before.
+
+    Normalizing drops markers such as "(Live)" or "- Remix", so the rounded
+    duration keeps other recordings of the song apart; without a duration
+    there is no fallback key.
+    """
+    if not duration_ms:
+        return None
+    bucket = round(duration_ms / DEDUP_DURATION_BUCKET_MS)
+    return f"{normalize_text(track_name)}|{','.join(sorted(clean_artist_name(a) for a in artists))}|{bucket}"
+
+
+def dedup_keys(song: Track) -> List[str]:
+    return song_keys(song.id, song.name, song.artists, song.duration_ms)
+
+
+def needs_search(song: Track) -> bool:
+    """Whether matching this song would reach Spotify, i.e. it is not answered by the match cache."""
+    if not song.name or not song.artists:
+        return False
+    cache = get_match_cache()
+    return not (cache and cache.contains(song.id, match_cache_key(song.name, song.artists, song.duration_ms)))
+
+
+async def search_track_on_spotify(track_name: str, artists: List[str], duration_ms: int, client: SpotifyClient,
+                                  song_id: Optional[Any] = None, index: Optional[TrackIndex] = None) -> Optional[str]:
     """
     Enhanced search for a track on Spotify using multiple strategies and all artist names.
     
@@ -210,457 +366,922 @@ async def search_track_on_spotify(track_name: str, artists: List[str], duration_
         track_name: The name of the track
         artists: List of all artist names associated with the track
         duration_ms: Track duration in milliseconds (for filtering)
-        token: Spotify API token
+        client: Spotify API client for the user's token
+        song_id: NetEase song id, used as the primary match cache key
+        index: Spotify tracks already fetched in this transfer, checked before searching
         
     Returns:
         Spotify URI if found, None otherwise
     """
     if not track_name or not artists:
         return None
-        
-    primary_artist = artists[0]
-    
-    # Try all strategies with the primary artist first
-    
-    # Strategy 1: Exact search with track: and artist:
-    query = f'track:"{track_name}" artist:"{primary_artist}"'
-    s_resp = retry_request(
-        requests.get, 
-        "https://api.spotify.com/v1/search", 
-        params={"q": query, "type": "track", "limit": 5}, 
-        headers=spotify_headers(token)
-    )
-    
-    items = s_resp.json().get("tracks", {}).get("items", [])
-    if items:
-        # Sort results by most similar duration and confidence
-        best_match = find_best_match_by_duration(items, duration_ms)
-        if best_match:
-            return best_match["uri"]
-    
-    # Strategy 2: Normalized search with primary artist
-    normalized_track = normalize_text(track_name)
-    normalized_artist = clean_artist_name(primary_artist)
-    
-    if normalized_track and normalized_artist:
-        query = f'track:"{normalized_track}" artist:"{normalized_artist}"'
-        s_resp = retry_request(
-            requests.get, 
-            "https://api.spotify.com/v1/search", 
-            params={"q": query, "type": "track", "limit": 5}, 
-            headers=spotify_headers(token)
-        )
-        
-        items = s_resp.json().get("tracks", {}).get("items", [])
-        if items:
-            best_match = find_best_match_by_duration(items, duration_ms)
-            if best_match:
-                return best_match["uri"]
-    
-    # Strategy 3: Track name search only (ignoring artist)
-    query = f'track:"{track_name}"'
-    s_resp = retry_request(
-        requests.get, 
-        "https://api.spotify.com/v1/search", 
-        params={"q": query, "type": "track", "limit": 20}, 
-        headers=spotify_headers(token)
-    )
-    
-    items = s_resp.json().get("tracks", {}).get("items", [])
-    if items:
-        # Find the track with most similar artist name
-        best_match = find_best_artist_match(items, artists, track_name)
-        if best_match:
-            return best_match["uri"]
-    
-    # Strategy 4: Try with each artist in the list (if multiple artists)
-    if len(artists) > 1:
-        for artist in artists[1:]:
-            query = f'track:"{track_name}" artist:"{artist}"'
-            s_resp = retry_request(
-                requests.get, 
-                "https://api.spotify.com/v1/search", 
-                params={"q": query, "type": "track", "limit": 5}, 
-                headers=spotify_headers(token)
-            )
-            
-            items = s_resp.json().get("tracks", {}).get("items", [])
-            if items:
-                best_match = find_best_match_by_duration(items, duration_ms)
-                if best_match:
-                    return best_match["uri"]
-                    
-    # Strategy 5: General query with exact track name and primary artist
-    query = f'{track_name} {primary_artist}'
-    s_resp = retry_request(
-        requests.get, 
-        "https://api.spotify.com/v1/search", 
-        params={"q": query, "type": "track", "limit": 20}, 
-        headers=spotify_headers(token)
+
+    # Check the persistent match cache before issuing any search
+    cache = get_match_cache()
+    fallback_key = match_cache_key(track_name, artists, duration_ms)
+    if cache:
+        cached, uri = await cache.get(song_id, fallback_key)
+        if cached:
+            MATCHES.inc("cache" if uri else "none")
+            return uri
+
+    uri = index.lookup(track_name, artists, duration_ms) if index is not None else None
+    if uri:
+        MATCHES.inc("index")
+    else:
+        # Search hits are counted per strategy by the planner
+        uri = await _search_strategies(track_name, artists, duration_ms, client, index)
+        if not uri:
+            MATCHES.inc("none")
+    if cache:
+        await cache.put(song_id, fallback_key, uri)
+    return uri
+
+
+async def _search_strategies(track_name: str, artists: List[str], duration_ms: int, client: SpotifyClient,
+                             index: Optional[TrackIndex] = None) -> Optional[str]:
+    """Run the planned, deduplicated search strategies best-first and return the first acceptable URI.
+
+    Every item a search returns is added to ``index``, chosen or not.
+    """
+    async def search(query: str, limit: int) -> List[Dict[str, Any]]:
+        items = await client.search_tracks(query, limit)
+        if index is not None:
+            index.add(items)
+        return items
+
+    steps = plan_searches(track_name, artists)
+    return await execute_plan(steps, search, track_name, artists, duration_ms)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Upstream latency, retries, throttling, active transfers and match sources in Prometheus text format."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/search-stats")
+async def search_strategy_stats():
+    """Expose per-strategy hit rates and the current search order."""
+    return search_stats.snapshot()
+
+
+@app.post("/api/transfer", status_code=202)
+async def transfer_playlist(payload: TransferBody, background_tasks: BackgroundTasks):
+    """Start a transfer in the background and return its job id for polling."""
+    try:
+        extract_playlist_id(payload.url)
+    except ValueError as exc:
+        raise HTTPException(400, detail=str(exc))
+    check_transfer_profiling(payload)
+
+    job = await start_job("playlist", payload, background_tasks)
+    return {"job_id": job.id, "status": job.status, "status_url": f"/api/transfer/{job.id}"}
+
+
+async def start_job(kind: str, payload: BaseModel, background_tasks: BackgroundTasks, job_id: Optional[str] = None):
+    """Queue a job for the worker processes when the shared job queue is enabled, else run it in this process."""
+    queue = get_job_queue()
+    try:
+        if queue:
+            return await queue.enqueue(kind, payload.dict(), job_id)
+        job = job_store.create(job_id)
+    except JobStoreFull as exc:
+        logger.warning(f"Rejecting {kind} job: {exc}")
+        raise HTTPException(503, detail="Too many transfers in progress, please retry shortly")
+    background_tasks.add_task(execute_job, job, kind, payload.dict())
+    return job
+
+
+def get_job(job_id: str):
+    """The job from the shared queue, which every API worker can read, or from this process."""
+    queue = get_job_queue()
+    return queue.get(job_id) if queue else job_store.get(job_id)
+
+
+async def execute_job(job: TransferJob, kind: str, payload: Dict[str, Any]) -> None:
+    """Run a job of the given kind; the entry point of in-process background tasks and queue workers alike.
+
+    A playlist transfer with a checkpoint under its job id, because it is
+    being resumed or was reclaimed from a worker that died, continues from it.
+    Album transfers keep no checkpoint, so a reclaimed one fails instead of
+    creating a second playlist. A reclaimed sync checks the Spotify playlist
+    itself before adding, so chunks the dead worker posted are not added twice.
+    """
+    if kind == "album":
+        if job.attempt > 1:
+            logger.warning(f"Album job {job.id} was interrupted, not running it again")
+            job.fail("Album transfer interrupted by a worker restart, please start it again", 503)
+            return
+        await execute_album_job(job, TransferBody(**payload))
+    elif kind == "sync":
+        await execute_sync_job(job, SyncBody(**payload))
+    else:
+        store = get_checkpoint_store()
+        checkpoint = await store.load(job.id) if store else None
+        await execute_transfer_job(job, TransferBody(**payload), checkpoint if checkpoint and not checkpoint.completed else None)
+
+
+class ResumeBody(SpotifyCredentials):
+    pass
+
+
+@app.post("/api/transfer/{job_id}/resume", status_code=202)
+async def resume_transfer(job_id: str, body: ResumeBody, background_tasks: BackgroundTasks):
+    """Continue an interrupted transfer from its checkpoint, under the same job id.
+
+    Songs already resolved are not searched again and tracks already added are
+    not added twice; a fresh token may be supplied if the old one expired.
+    """
+    store = get_checkpoint_store()
+    checkpoint = await store.load(job_id) if store else None
+    if checkpoint is None:
+        raise HTTPException(404, detail="No checkpoint saved for this transfer")
+    if checkpoint.completed:
+        raise HTTPException(409, detail="Transfer already completed")
+
+    existing = get_job(job_id)
+    if existing is not None and not existing.finished:
+        raise HTTPException(409, detail="Transfer is still running")
+
+    payload = TransferBody(url=checkpoint.source_url, **body.dict(), **checkpoint.options)
+    job = await start_job("playlist", payload, background_tasks, job_id)
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/transfer/{job.id}",
+        "checkpoint": checkpoint.summary(),
+    }
+
+
+@app.post("/api/album-transfer", status_code=202)
+async def transfer_album(payload: TransferBody, background_tasks: BackgroundTasks):
+    """Start an album transfer in the background; ``url`` is a NetEase album link."""
+    try:
+        extract_album_id(payload.url)
+    except ValueError as exc:
+        raise HTTPException(400, detail=str(exc))
+    check_transfer_profiling(payload)
+
+    job = await start_job("album", payload, background_tasks)
+    return {"job_id": job.id, "status": job.status, "status_url": f"/api/transfer/{job.id}"}
+
+
+class SyncBody(SpotifyCredentials):
+    url: str
+    spotify_playlist_id: str
+
+
+@app.post("/api/sync", status_code=202)
+async def sync_playlist(payload: SyncBody, background_tasks: BackgroundTasks):
+    """Bring an existing Spotify copy of a NetEase playlist up to date in the background.
+
+    Progress and the outcome are reported through the same job endpoints as a transfer.
+    """
+    try:
+        extract_playlist_id(payload.url)
+        extract_spotify_playlist_id(payload.spotify_playlist_id)
+    except ValueError as exc:
+        raise HTTPException(400, detail=str(exc))
+
+    job = await start_job("sync", payload, background_tasks)
+    return {"job_id": job.id, "status": job.status, "status_url": f"/api/transfer/{job.id}"}
+
+
+@app.get("/api/transfer/{job_id}")
+async def transfer_status(job_id: str, response: Response):
+    """Return progress of a transfer job, and its result once it has finished.
+
+    ``timings`` (also sent as ``Server-Timing``) breaks the job down into its
+    phases and the cumulative time spent on NetEase, Spotify, matching,
+    chunk adds and sleeps.
+    """
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(404, detail="Unknown or expired transfer job")
+    status = job.to_dict()
+    response.headers["Server-Timing"] = server_timing_header(status.get("timings") or {})
+    return status
+
+
+@app.get("/api/profiles/{profile_id}")
+async def download_profile(profile_id: str):
+    """Download a captured profile in pstats format."""
+    check_profiling_allowed()
+    stored = profile_store.get(profile_id)
+    if stored is None:
+        raise HTTPException(404, detail="Unknown or expired profile")
+    return Response(stored[1], media_type="application/octet-stream",
+                    headers={"Content-Disposition": f'attachment; filename="netify-{profile_id}.prof"'})
+
+
+@app.get("/api/transfer/{job_id}/events")
+async def transfer_events(job_id: str, request: Request):
+    """Stream job progress as Server-Sent Events.
+
+    Per-track results arrive in batches, followed by chunk and phase events
+    and a final ``done`` or ``failed`` event. Reconnecting clients resume
+    from the ``Last-Event-ID`` header.
+    """
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(404, detail="Unknown or expired transfer job")
+
+    try:
+        last_seq = int(request.headers.get("last-event-id", "0"))
+    except ValueError:
+        last_seq = 0
+
+    async def event_stream():
+        nonlocal last_seq
+        # Start with a snapshot so late subscribers see current progress immediately
+        yield f"event: snapshot\ndata: {json.dumps({**job.to_dict(), 'result': None})}\n\n"
+        while True:
+            for seq, event in job.events_since(last_seq):
+                last_seq = seq
+                yield f"id: {seq}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+            if job.finished and not job.events_since(last_seq):
+                return
+            if await request.is_disconnected():
+                return
+            await job.wait_for_events(last_seq, timeout=SSE_HEARTBEAT_SECONDS)
+            if not job.events_since(last_seq):
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    
-    items = s_resp.json().get("tracks", {}).get("items", [])
-    if not items:
-        return None
-    
-    # Use advanced fuzzy matching to find the best match
-    best_match = find_best_match(items, track_name, artists)
-    return best_match["uri"] if best_match else None
 
 
-def find_best_match_by_duration(items, target_duration):
-    """Find the best match from items based on duration similarity."""
-    best_item = None
-    best_diff = float('inf')
-    
-    for item in items:
-        if item.get("duration_ms"):
-            diff = abs(item["duration_ms"] - target_duration)
-            if diff < best_diff:
-                best_diff = diff
-                best_item = item
-    
-    # If the best match has duration difference less than 10 seconds
-    if best_item and best_diff < 10000:
-        return best_item
-    
-    # Otherwise return the first item
-    return items[0] if items else None
+class SearchFailed(Exception):
+    """A song's search errored out, so "not found" for it would be a guess."""
 
+    def __init__(self, song_name: str):
+        super().__init__(song_name)
+        self.song_name = song_name
 
-def find_best_artist_match(items, artists, track_name):
-    """Find the item with the best artist match for given artists."""
-    best_score = 0
-    best_match = None
-    
-    normalized_track = normalize_text(track_name)
-    artists_lower = [clean_artist_name(a) for a in artists]
-    
-    for item in items:
-        # Skip if track name doesn't match closely
-        item_name = item.get("name", "")
-        normalized_item_name = normalize_text(item_name)
-        name_score = fuzz.ratio(normalized_track, normalized_item_name)
-        
-        # Only consider if track name is reasonably similar
-        if name_score < 80:
-            continue
-            
-        # Get all artists from the track
-        spotify_artists = [a.get("name", "") for a in item.get("artists", [])]
-        spotify_artists_lower = [clean_artist_name(a) for a in spotify_artists]
-        
-        # Find the best matching artist pair
-        artist_score = 0
-        for a1 in artists_lower:
-            for a2 in spotify_artists_lower:
-                current_score = fuzz.ratio(a1, a2)
-                if current_score > artist_score:
-                    artist_score = current_score
-        
-        # Calculate combined score, heavily favoring track name match
-        combined_score = (name_score * 0.8) + (artist_score * 0.2)
-        
-        if combined_score > best_score and combined_score > MATCH_THRESHOLD:
-            best_score = combined_score
-            best_match = item
-    
-    return best_match
 
+async def match_song(i: int, song: Track, spotify: SpotifyClient, total: int,
+                     index: Optional[TrackIndex] = None) -> Tuple[Optional[str], Optional[str]]:
+    """Return (uri, missing_name) for one NetEase song; at most one of them is set.
 
-def find_best_match(items, track_name, artists):
-    """Find the best match using fuzzy matching on both track name and artists."""
-    best_score = 0
-    best_match = None
-    
-    normalized_track = normalize_text(track_name)
-    artists_lower = [clean_artist_name(a) for a in artists]
-    
-    for item in items:
-        item_name = item.get("name", "")
-        if not item_name:
-            continue
-            
-        normalized_item_name = normalize_text(item_name)
-        
-        # Get Spotify artists
-        spotify_artists = [a.get("name", "") for a in item.get("artists", [])]
-        spotify_artists_lower = [clean_artist_name(a) for a in spotify_artists]
-        
-        # Calculate name similarity
-        name_score = fuzz.ratio(normalized_track, normalized_item_name)
-        
-        # Find the best artist match score
-        best_artist_score = 0
-        for a1 in artists_lower:
-            for a2 in spotify_artists_lower:
-                current_score = fuzz.ratio(a1, a2)
-                if current_score > best_artist_score:
-                    best_artist_score = current_score
-        
-        # Weight name more heavily than artist for matching
-        combined_score = (name_score * 0.7) + (best_artist_score * 0.3)
-        
-        if combined_score > best_score and combined_score > MATCH_THRESHOLD:
-            best_score = combined_score
-            best_match = item
-    
-    return best_match
+    A rejected token raises its ``HTTPStatusError`` and stops the whole job,
+    so a checkpointed transfer stays resumable; any other search error raises
+    ``SearchFailed``, which callers report as missing without persisting it.
+    """
+    try:
+        song_name = song.name
+        all_artists = list(song.artists)
+        duration_ms = song.duration_ms
+
+        if not song_name or not all_artists:
+            logger.warning(f"Skipping song with missing data: name='{song_name}', artists='{all_artists}'")
+            return None, song_name or "Unknown track"
+
+        # Only log every 10th track to reduce log spam
+        if i % 10 == 0:
+            logger.info(f"Searching for track: '{song_name}' by '{', '.join(all_artists)}'")
+
+        with timed("match"):
+            uri = await search_track_on_spotify(song_name, all_artists, duration_ms, spotify, song_id=song.id, index=index)
+
+        if uri:
+            if i % 20 == 0:  # Log less frequently
+                logger.info(f"Found match {i+1}/{total}: {uri}")
+            return uri, None
+        if i % 20 == 0:  # Log less frequently
+            logger.info(f"No match found for: '{song_name}' by '{', '.join(all_artists)}'")
+        return None, song_name
 
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code in (401, 403):
+            raise
+        logger.error(f"Error searching for track {song.name or 'Unknown'}: {str(e)}")
+        raise SearchFailed(song.name or 'Unknown track')
+    except Exception as e:
+        logger.error(f"Error searching for track {song.name or 'Unknown'}: {str(e)}")
+        raise SearchFailed(song.name or 'Unknown track')
+
+
+async def run_job(job: TransferJob, work: Awaitable[Dict[str, Any]], kind: str = "playlist",
+                  profile: bool = False) -> bool:
+    """Await ``work`` and record its result or failure on the job; returns whether it succeeded.
+
+    Everything ``work`` does is charged to the job's timing breakdown, and with
+    ``profile`` it runs under cProfile unless another capture is in progress.
+    """
+    if profile and ALLOW_PROFILING:
+        try:
+            with profile_store.capture(f"{kind} transfer {job.id}") as profile_id:
+                job.profile_id = profile_id
+                return await run_job(job, work, kind)
+        except ProfilerBusy:
+            logger.warning(f"Transfer job {job.id}: profiler busy, running without a profile")
+            job.profile_id = None
 
-@app.post("/api/transfer")
-async def transfer_playlist(payload: TransferBody):
+    ACTIVE_TRANSFERS.inc(kind)
     try:
-        pid = extract_playlist_id(payload.url)
-        pdata = await get_playlist_data(pid)
+        with use_timer(job.timings):
+            job.succeed(await work)
+        if job.started_at and job.tracks_matched:
+            TRANSFER_RATE.observe(job.tracks_matched / max(job.finished_at - job.started_at, 1e-3), kind)
+        return True
+    except HTTPException as exc:
+        job.fail(exc.detail, exc.status_code)
     except Exception as exc:
-        logger.error(f"Error starting transfer: {exc}")
+        logger.error(f"Transfer job {job.id} crashed: {exc}")
         traceback.print_exc()
-        raise HTTPException(502, detail=str(exc))
+        job.fail(str(exc))
+    finally:
+        ACTIVE_TRANSFERS.dec(kind)
+    return False
 
-    root = pdata.get("playlist") or pdata.get("result")
-    
-    # Get trackIds count for accurate reporting
-    track_ids_count = len(root.get("trackIds", []))
-    logger.info(f"Playlist {pid} has {track_ids_count} trackIds according to API")
-    
-    # ALWAYS fetch all tracks directly - don't rely on previous API call
-    logger.info(f"Transfer: Fetching all tracks for playlist {pid}")
-    full_tracks = fetch_full_tracks(pid)
-    
-    if full_tracks:
-        root["tracks"] = full_tracks
-        logger.info(f"Transfer: Fetched {len(full_tracks)} tracks for playlist {pid}")
-    else:
-        # Fallback to fetching by IDs
-        logger.info(f"Transfer: No tracks fetched, falling back to fetch_tracks_by_ids for playlist {pid}")
-        track_ids = root.get("trackIds", [])
-        full_tracks = fetch_tracks_by_ids(track_ids)
-        
-        if full_tracks:
-            root["tracks"] = full_tracks
-            logger.info(f"Transfer: Fetched {len(full_tracks)} tracks by IDs for playlist {pid}")
+
+async def execute_transfer_job(job: TransferJob, payload: TransferBody,
+                               checkpoint: Optional[TransferCheckpoint] = None) -> None:
+    """Background entry point: run the transfer and record its outcome on the job.
+
+    A new transfer gets a checkpoint here; a resumed one brings the checkpoint
+    it is continuing from.
+    """
+    if checkpoint is None:
+        store = get_checkpoint_store()
+        if store:
+            options = payload.dict(include={"description", "custom_name", "cover_url"})
+            checkpoint = store.create(job.id, payload.url, options)
+    succeeded = await run_job(job, run_transfer(payload, job, checkpoint), profile=payload.profile)
+    if checkpoint:
+        if succeeded:
+            await checkpoint.complete()
         else:
-            # If we still have no tracks, use what we got from the initial playlist data
-            logger.warning("Transfer: All track fetching methods failed. Using tracks from initial playlist data.")
-            if not root.get("tracks"):
-                logger.error("Transfer: No tracks available in the playlist")
-                raise HTTPException(404, detail="No tracks found in the playlist")
-    
-    playlist_name = payload.custom_name or f"{root.get('name', 'NetEase Playlist')} (NetEase)"
-    
-    # Verify we have the expected number of tracks
-    final_track_count = len(root.get("tracks", []))
-    logger.info(f"Transfer: Final track count: {final_track_count}")
-    
-    # If we still don't have all tracks, use the trackIds count as the true count
-    if final_track_count < track_ids_count and track_ids_count > 0:
-        logger.warning(f"Transfer: Could not fetch all tracks. Expected {track_ids_count}, got {final_track_count}")
-        true_total_count = track_ids_count
-    else:
-        true_total_count = final_track_count
-        
-    logger.info(f"Transfer: Using true total count of {true_total_count} tracks")
-    
-    # Get Spotify user profile
+            await checkpoint.fail()
+
+
+async def record_sync_mapping(sp_pl_id: str, pid: str, added: Dict[str, Optional[str]],
+                              removed: List[str] = (), replace: bool = False) -> None:
+    """Save the song -> URI mapping a later incremental sync diffs against; best effort."""
+    store = get_sync_store()
+    if store is None:
+        return
     try:
-        user_resp = retry_request(
-            requests.get, 
-            "https://api.spotify.com/v1/me", 
-            headers=spotify_headers(payload.spotify_token)
-        )
+        await asyncio.to_thread(store.apply, sp_pl_id, pid, added, removed, replace)
+    except sqlite3.Error as e:
+        logger.error(f"Could not record sync mapping for playlist {sp_pl_id}: {e}")
+
+
+async def spotify_user_id(spotify: SpotifyClient) -> str:
+    """Return the token owner's Spotify user id, or raise 401."""
+    try:
+        user_resp = await spotify.me()
         if user_resp.status_code != 200:
             raise HTTPException(401, detail="Spotify token invalid")
-        user_id = user_resp.json()["id"]
+        return user_resp.json()["id"]
     except Exception as e:
         logger.error(f"Error getting Spotify user profile: {e}")
         raise HTTPException(401, detail="Failed to authenticate with Spotify")
 
-    # Create Spotify playlist
+
+async def upload_playlist_cover(spotify: SpotifyClient, sp_pl_id: str, cover_url: str) -> None:
+    """Set the playlist cover from a data URL or an image URL; failures are logged, never raised."""
+    try:
+        with timed("cover"):
+            encoded = await cover_payload(cover_url)
+            if encoded is None:
+                return
+
+            # Server errors and dropped connections are retried; a rejected image would only be rejected again
+            max_cover_retries = 3
+            for cover_retry in range(1, max_cover_retries + 1):
+                try:
+                    resp = await spotify.upload_cover(sp_pl_id, encoded)
+                    if resp.status_code < 300:
+                        logger.info("Cover image set successfully")
+                        return
+                    if resp.status_code < 500:
+                        logger.error(f"Spotify rejected the cover image: HTTP {resp.status_code}")
+                        return
+                    cover_error = f"HTTP {resp.status_code}"
+                except httpx.HTTPError as e:
+                    cover_error = str(e)
+                logger.warning(f"Error setting cover image, retry {cover_retry}/{max_cover_retries}: {cover_error}")
+                # Backoff delay
+                await pause(2 ** cover_retry)
+
+            logger.error(f"Failed to set cover image after {max_cover_retries} retries")
+
+    except Exception as e:
+        logger.error(f"Error setting cover image: {str(e)}")
+
+
+# Cover uploads still running; held here so one outliving a failed job is not garbage collected
+_cover_tasks: Set["asyncio.Task"] = set()
+
+
+def start_cover_upload(spotify: SpotifyClient, sp_pl_id: str, cover_url: Optional[str]) -> Optional["asyncio.Task"]:
+    """Upload the cover in the background, alongside matching; the task never raises."""
+    if not cover_url:
+        return None
+    task = asyncio.ensure_future(upload_playlist_cover(spotify, sp_pl_id, cover_url))
+    _cover_tasks.add(task)
+    task.add_done_callback(_cover_tasks.discard)
+    return task
+
+
+async def finish_cover_upload(job: TransferJob, cover_task: Optional["asyncio.Task"]) -> None:
+    if cover_task is not None:
+        if not cover_task.done():
+            job.set_phase("cover")
+        await cover_task
+
+
+async def create_spotify_playlist(spotify: SpotifyClient, user_id: str, name: str, description: Optional[str]) -> str:
+    """Create the destination playlist and return its id."""
     try:
-        create_resp = retry_request(
-            requests.post,
-            f"https://api.spotify.com/v1/users/{user_id}/playlists",
-            json={"name": playlist_name, "public": False, "description": payload.description or f"Imported on {date.today()}", "collaborative": False},
-            headers=spotify_headers(payload.spotify_token)
+        create_resp = await spotify.create_playlist(
+            user_id,
+            name,
+            description or f"Imported on {date.today()}",
         )
         if create_resp.status_code not in (200, 201):
             logger.error(f"Failed to create playlist: {create_resp.status_code} - {create_resp.text}")
             raise HTTPException(400, detail="Failed to create playlist")
         sp_pl_id = create_resp.json()["id"]
         logger.info(f"Created Spotify playlist: {sp_pl_id}")
+        return sp_pl_id
     except Exception as e:
         logger.error(f"Error creating Spotify playlist: {e}")
         raise HTTPException(400, detail="Failed to create Spotify playlist")
+
+
+async def run_transfer(payload: TransferBody, job: TransferJob,
+                       checkpoint: Optional[TransferCheckpoint] = None) -> Dict[str, Any]:
+    """Create the Spotify playlist once the first songs arrive, then stream NetEase pages through matching into it.
+
+    Fetching, matching and adding overlap: songs are queued for matching as
+    each NetEase page arrives, and every full chunk of matches is added to the
+    playlist, in playlist order, while later songs are still being searched.
+    """
+    job.set_phase("fetching")
+    try:
+        pid = extract_playlist_id(payload.url)
+        root, batches = await open_playlist(pid)
+    except Exception as exc:
+        logger.error(f"Error starting transfer: {exc}")
+        traceback.print_exc()
+        raise HTTPException(502, detail=str(exc))
+
+    # Get trackIds count for accurate reporting
+    track_ids_count = len(root.get("trackIds", []))
+    logger.info(f"Playlist {pid} has {track_ids_count} trackIds according to API")
+
+    expected_count = track_ids_count or root.get("trackCount") or len(root.get("tracks") or [])
+    if not expected_count:
+        logger.error("Transfer: No tracks available in the playlist")
+        raise HTTPException(404, detail="No tracks found in the playlist")
     
-    # Get all songs
-    songs = root.get("tracks", [])
-    logger.info(f"Processing {len(songs)} total songs from NetEase")
-    
-    # Limit to maximum playlist size supported by Spotify
-    if len(songs) > MAX_PLAYLIST_SIZE:
-        logger.warning(f"Playlist exceeds Spotify limit of {MAX_PLAYLIST_SIZE} tracks, truncating")
-        songs = songs[:MAX_PLAYLIST_SIZE]
+    # Nothing is created on Spotify until NetEase has delivered songs, so an empty fetch leaves no playlist behind
+    try:
+        first_batch = await _first_batch(batches)
+    except Exception as exc:
+        logger.error(f"Error fetching playlist tracks: {exc}")
+        raise HTTPException(502, detail=str(exc))
+    if not first_batch:
+        logger.error("Transfer: No tracks available in the playlist")
+        raise HTTPException(404, detail="No tracks found in the playlist")
+    batches = _prepend(first_batch, batches)
+
+    playlist_name = payload.custom_name or f"{root.get('name', 'NetEase Playlist')} (NetEase)"
     
-    # Process all tracks
-    all_uris = []
-    all_missing = []
+    job.set_phase("creating_playlist")
+    spotify = spotify_client(payload)
+
+    # Get Spotify user profile
+    user_id = await spotify_user_id(spotify)
+
+    if checkpoint and checkpoint.sp_pl_id:
+        # Resuming: keep filling the playlist the interrupted attempt created
+        sp_pl_id = checkpoint.sp_pl_id
+        logger.info(f"Resuming into Spotify playlist {sp_pl_id}, {len(checkpoint.results)} songs already resolved")
+    else:
+        sp_pl_id = await create_spotify_playlist(spotify, user_id, playlist_name, payload.description)
+        if checkpoint:
+            checkpoint.set_playlist(sp_pl_id)
+    # The cover goes up while the songs are matched
+    cover_task = start_cover_upload(spotify, sp_pl_id, payload.cover_url or root.get("coverImgUrl"))
     
     # Extract URIs for all tracks
-    logger.info(f"Beginning to search for {len(songs)} tracks on Spotify")
-    
-    # Use a smaller batch size for search to avoid overloading
-    search_batch_size = 50
-    song_batches = [songs[i:i+search_batch_size] for i in range(0, len(songs), search_batch_size)]
-    
-    for batch_idx, song_batch in enumerate(song_batches):
-        logger.info(f"Processing search batch {batch_idx+1}/{len(song_batches)} ({len(song_batch)} tracks)")
-        
-        for i, song in enumerate(song_batch):
+    logger.info(f"Beginning to search for about {expected_count} tracks on Spotify with concurrency {MATCH_CONCURRENCY}")
+
+    cache = get_match_cache()
+    cache_before = cache.stats() if cache else None
+
+    def on_chunk_added(index: int, positions: List[int]) -> None:
+        job.record_chunk(index, len(positions))
+        if checkpoint:
+            checkpoint.record_added(positions)
+
+    # Add tracks to the playlist in chunks of MAX_TRACKS_PER_REQUEST (100 tracks per request - Spotify limit)
+    writer = OrderedChunkWriter(
+        lambda chunk: spotify.add_tracks(sp_pl_id, chunk),
+        MAX_TRACKS_PER_REQUEST,
+        max_pending_chunks=PIPELINE_PENDING_CHUNKS,
+        on_added=on_chunk_added,
+    )
+    missing_by_index: Dict[int, str] = {}
+    synced: Dict[str, Optional[str]] = {}
+    found_count = 0
+    resumed_count = 0
+    search_errors = 0
+
+    async def match_and_report(i: int, song: Track) -> None:
+        nonlocal found_count, resumed_count, search_errors
+        song_id = song.id
+        saved = checkpoint.lookup(i, song_id) if checkpoint else None
+        failed = False
+        if saved:
+            # Resolved before the interruption: no search, and no re-add if its chunk landed
+            uri, missing, added = saved
+            resumed_count += 1
+        else:
             try:
-                if not song:
-                    logger.warning(f"Skipping invalid song in batch {batch_idx+1}, index {i}")
-                    continue
-                    
-                song_name = song.get("name", "")
-                all_artists = get_all_artists(song)
-                duration_ms = song.get("dt") or song.get("duration", 0)
-                
-                if not song_name or not all_artists:
-                    logger.warning(f"Skipping song with missing data: name='{song_name}', artists='{all_artists}'")
-                    all_missing.append(song_name or "Unknown track")
-                    continue
-                
-                # Only log every 10th track to reduce log spam
-                if i % 10 == 0:
-                    logger.info(f"Searching for track: '{song_name}' by '{', '.join(all_artists)}'")
-                
-                uri = await search_track_on_spotify(song_name, all_artists, duration_ms, payload.spotify_token)
-                
-                if uri:
-                    all_uris.append(uri)
-                    if i % 20 == 0:  # Log less frequently
-                        logger.info(f"Found match {batch_idx*search_batch_size+i+1}/{len(songs)}: {uri}")
-                else:
-                    all_missing.append(song_name)
-                    if i % 20 == 0:  # Log less frequently
-                        logger.info(f"No match found for: '{song_name}' by '{', '.join(all_artists)}'")
-                    
-            except Exception as e:
-                logger.error(f"Error searching for track {song.get('name', 'Unknown')}: {str(e)}")
-                all_missing.append(song.get('name', 'Unknown track'))
-        
-        # Add a delay between batches to avoid rate limiting
-        if batch_idx < len(song_batches) - 1:
-            await asyncio.sleep(1)
-    
-    logger.info(f"Found {len(all_uris)} matches for {len(songs)} tracks")
+                uri, missing = await deduper.match(dedup_keys(song), lambda: match_song(i, song, spotify, job.tracks_total, index))
+            except SearchFailed as exc:
+                # Reported as missing, but neither checkpointed nor mapped, so a resume or sync searches it again
+                uri, missing, failed = None, exc.song_name, True
+                search_errors += 1
+            added = False
+            if checkpoint and not failed:
+                checkpoint.record_track(i, song_id, uri, missing)
+        if uri:
+            found_count += 1
+        if missing:
+            missing_by_index[i] = missing
+        if song_id is not None and not failed:
+            synced[str(song_id)] = uri
+        job.record_track(i, song.name, uri)
+        await writer.resolve(i, uri, added=added)
+        job.chunks_total = writer.chunks_total
+
+    def wanted(i: int, song: Track) -> bool:
+        return not (checkpoint and checkpoint.lookup(i, song.id)) and needs_search(song)
+
+    # Search results and the catalogs of frequent artists are indexed, so later songs may skip the search
+    index = TrackIndex()
+    prefetcher = CatalogPrefetcher(spotify, index)
+    # Repeated songs, by id or by title, artists and length, are matched once and share the result
+    deduper = SongDeduper()
+
+    job.tracks_total = min(expected_count, MAX_PLAYLIST_SIZE)
+    job.set_phase("matching")
+    scheduler = MatchScheduler(MATCH_CONCURRENCY, rate=spotify_rate)
+    writer.start()
+    try:
+        # Limit to maximum playlist size supported by Spotify
+        songs = prefetch_stream(_take(batches, MAX_PLAYLIST_SIZE), prefetcher, wanted)
+        processed = await scheduler.run_stream(songs, match_and_report, PIPELINE_QUEUE_SIZE)
+        job.tracks_total = processed
+        job.set_phase("adding")
+        await writer.close()
+    except Exception as exc:
+        # Post what was already matched so the checkpoint records it as added
+        await writer.close()
+        logger.error(f"Transfer pipeline failed: {exc}")
+        raise HTTPException(502, detail=f"Transfer interrupted: {exc}")
+    job.chunks_total = writer.chunks_total
+    await finish_cover_upload(job, cover_task)
+
+    if not processed:
+        logger.error("Transfer: No tracks available in the playlist")
+        raise HTTPException(404, detail="No tracks found in the playlist")
+
+    if cache:
+        cache_after = cache.stats()
+        scheduler.stats["cache_hits"] = cache_after["hits"] - cache_before["hits"]
+        scheduler.stats["cache_misses"] = cache_after["misses"] - cache_before["misses"]
+    scheduler.stats["first_add_seconds"] = writer.first_add_seconds
+    scheduler.stats["resumed_tracks"] = resumed_count
+    scheduler.stats["search_errors"] = search_errors
+    scheduler.stats["catalog"] = prefetcher.stats()
+    scheduler.stats["candidate_index"] = index.stats()
+    scheduler.stats["dedup"] = deduper.stats()
+
+    # Keep playlist order for the missing names
+    all_missing = [missing_by_index[i] for i in sorted(missing_by_index)]
+    logger.info(f"Matching throughput: {scheduler.stats['tracks_per_second']} tracks/s "
+                f"({scheduler.stats['throttled_responses']} throttled responses)")
     
-    # Add all tracks to the playlist in chunks to avoid Spotify API limits
-    if all_uris:
-        logger.info(f"Adding {len(all_uris)} tracks to Spotify playlist in chunks of {MAX_TRACKS_PER_REQUEST}")
-        
-        # Split into chunks of MAX_TRACKS_PER_REQUEST (100 tracks per request - Spotify limit)
-        chunks = [all_uris[i:i+MAX_TRACKS_PER_REQUEST] for i in range(0, len(all_uris), MAX_TRACKS_PER_REQUEST)]
-        
-        chunk_failures = 0  # Track failures
-        for i, chunk in enumerate(chunks):
-            try:
-                # Add more retries for chunk addition with exponential backoff
-                max_chunk_retries = 3
-                chunk_retry = 0
-                chunk_added = False
-                
-                while not chunk_added and chunk_retry < max_chunk_retries:
-                    try:
-                        retry_request(
-                            requests.post,
-                            f"https://api.spotify.com/v1/playlists/{sp_pl_id}/tracks",
-                            json={"uris": chunk},
-                            headers=spotify_headers(payload.spotify_token)
-                        )
-                        logger.info(f"Added chunk {i+1}/{len(chunks)} ({len(chunk)} tracks)")
-                        chunk_added = True
-                    except Exception as chunk_error:
-                        chunk_retry += 1
-                        logger.warning(f"Error adding chunk {i+1}, retry {chunk_retry}/{max_chunk_retries}: {chunk_error}")
-                        # Backoff delay
-                        await asyncio.sleep(2 ** chunk_retry)
-                        
-                if not chunk_added:
-                    logger.error(f"Failed to add chunk {i+1} after {max_chunk_retries} retries")
-                    chunk_failures += 1
-                    
-                # Add a longer delay between chunks
-                if i < len(chunks) - 1:
-                    await asyncio.sleep(1)
-                    
-            except Exception as e:
-                logger.error(f"Error adding chunk {i+1}: {str(e)}")
-                chunk_failures += 1
-        
-        # Add a warning if some chunks failed
-        if chunk_failures > 0:
-            logger.warning(f"{chunk_failures}/{len(chunks)} chunks failed to add to playlist")
+    logger.info(f"Found {found_count} matches for {processed} tracks")
+
+    # Add a warning if some chunks failed
+    if writer.chunk_failures > 0:
+        logger.warning(f"{writer.chunk_failures}/{writer.chunks_total} chunks failed to add to playlist")
+    else:
+        # The playlist now holds exactly these matches, the baseline for a later incremental sync
+        await record_sync_mapping(sp_pl_id, pid, synced, replace=True)
+
+    # If we still don't have all tracks, use the trackIds count as the true count
+    if processed < track_ids_count:
+        logger.warning(f"Transfer: Could not fetch all tracks. Expected {track_ids_count}, got {processed}")
+        true_total_count = track_ids_count
+    else:
+        true_total_count = processed
     
     # Create a single batch result for reporting
     batch_result = {
         "batch_number": 1,
-        "total_tracks": len(songs),
-        "matched_tracks": len(all_uris),
-        "success_rate": round(len(all_uris) / len(songs) * 100) if songs else 0
+        "total_tracks": processed,
+        "matched_tracks": found_count,
+        "success_rate": round(found_count / processed * 100) if processed else 0
     }
     
-    # Add cover image
-    cover_url = payload.cover_url or root.get("coverImgUrl")
-    if cover_url:
-        try:
-            if cover_url.startswith("data:"):
-                encoded = cover_url.split(",",1)[1]
-            else:
-                img_resp = retry_request(requests.get, cover_url)
-                img_bytes = img_resp.content
-                encoded = base64.b64encode(img_bytes).decode()
-            
-            # Try multiple times to set the cover image
-            max_cover_retries = 3
-            cover_retry = 0
-            cover_set = False
-            
-            while not cover_set and cover_retry < max_cover_retries:
-                try:
-                    retry_request(
-                        requests.put,
-                        f"https://api.spotify.com/v1/playlists/{sp_pl_id}/images",
-                        data=encoded,
-                        headers={**spotify_headers(payload.spotify_token), "Content-Type":"image/jpeg"}
-                    )
-                    logger.info("Cover image set successfully")
-                    cover_set = True
-                except Exception as cover_error:
-                    cover_retry += 1
-                    logger.warning(f"Error setting cover image, retry {cover_retry}/{max_cover_retries}: {cover_error}")
-                    # Backoff delay
-                    await asyncio.sleep(2 ** cover_retry)
-            
-            if not cover_set:
-                logger.error(f"Failed to set cover image after {max_cover_retries} retries")
-                
-        except Exception as e:
-            logger.error(f"Error setting cover image: {str(e)}")
-
     # Calculate success rate and log final statistics
-    success_rate = round((len(all_uris) / true_total_count) * 100) if true_total_count > 0 else 0
-    logger.info(f"Transfer complete: {len(all_uris)}/{true_total_count} tracks transferred ({success_rate}% success rate)")
+    success_rate = round((found_count / true_total_count) * 100) if true_total_count > 0 else 0
+    logger.info(f"Transfer complete: {found_count}/{true_total_count} tracks transferred ({success_rate}% success rate)")
     
     return {
         "playlist_url": f"https://open.spotify.com/playlist/{sp_pl_id}",
         "missing": all_missing,
-        "total_transferred": len(all_uris),
+        "total_transferred": found_count,
         "total_tracks": true_total_count,  # Use the true total count here
         "processed_batches": 1,  # Single batch processing approach
         "batch_results": [batch_result],
-        "completed_batches": 1
+        "completed_batches": 1,
+        "match_stats": scheduler.stats
+    }
+
+
+async def execute_sync_job(job: TransferJob, payload: SyncBody) -> None:
+    await run_job(job, run_sync(payload, job), "sync")
+
+
+async def run_sync(payload: SyncBody, job: TransferJob) -> Dict[str, Any]:
+    """Apply only the NetEase changes since the last transfer or sync to an existing Spotify playlist.
+
+    The NetEase trackIds are diffed against the recorded song -> URI mapping:
+    only added songs are fetched and searched, and tracks whose songs left
+    the playlist are removed. Without a recorded mapping every song counts as
+    added, and URIs the Spotify playlist already holds are not added again;
+    a sync reclaimed from a dead worker re-reads the playlist the same way.
+    Songs are compared as a set, so a reorder on NetEase is not mirrored.
+    """
+    job.set_phase("fetching")
+    try:
+        pid = extract_playlist_id(payload.url)
+        sp_pl_id = extract_spotify_playlist_id(payload.spotify_playlist_id)
+        pdata = await get_playlist_data(pid)
+        root = pdata.get("playlist") or pdata.get("result") or {}
+    except Exception as exc:
+        logger.error(f"Error starting sync: {exc}")
+        raise HTTPException(502, detail=str(exc))
+
+    current_ids = [str(track_id(tid)) for tid in root.get("trackIds", [])][:MAX_PLAYLIST_SIZE]
+    if not current_ids:
+        raise HTTPException(404, detail="No tracks found in the playlist")
+
+    spotify = spotify_client(payload)
+    playlist_resp = await spotify.get_playlist(sp_pl_id)
+    if playlist_resp.status_code == 401:
+        raise HTTPException(401, detail="Spotify token invalid")
+    if playlist_resp.status_code != 200:
+        raise HTTPException(404, detail="Spotify playlist not found")
+
+    store = get_sync_store()
+    source_pid, previous = None, {}
+    if store:
+        try:
+            source_pid, previous = await asyncio.to_thread(store.load, sp_pl_id)
+        except sqlite3.Error as e:
+            # Without the mapping this runs as a first sync, which reads the playlist itself
+            logger.error(f"Could not load sync mapping for playlist {sp_pl_id}: {e}")
+    first_sync = source_pid != pid
+    if first_sync:
+        if source_pid is not None:
+            logger.warning(f"Spotify playlist {sp_pl_id} was last synced from NetEase playlist {source_pid}, starting over")
+        previous = {}
+
+    current = set(current_ids)
+    added_ids = [song_id for song_id in current_ids if song_id not in previous]
+    removed_ids = [song_id for song_id in previous if song_id not in current]
+    logger.info(f"Sync {pid} -> {sp_pl_id}: {len(added_ids)} songs added, {len(removed_ids)} removed, "
+                f"{len(current_ids) - len(added_ids)} unchanged")
+
+    # Only the new songs are fetched in full and searched
+    songs = await fetch_tracks_by_ids(added_ids) if added_ids else []
+    job.tracks_total = len(songs)
+    job.set_phase("matching")
+    index = TrackIndex()
+    prefetcher = CatalogPrefetcher(spotify, index)
+    await prefetcher.observe([song for song in songs if needs_search(song)])
+    deduper = SongDeduper()
+
+    failed_ids = set()
+
+    async def match_and_report(i: int, song: Track) -> Tuple[Optional[str], Optional[str]]:
+        try:
+            uri, missing = await deduper.match(dedup_keys(song), lambda: match_song(i, song, spotify, len(songs), index))
+        except SearchFailed as exc:
+            # Left out of the mapping, so the next sync searches it again
+            uri, missing = None, exc.song_name
+            failed_ids.add(str(song.id))
+        job.record_track(i, song.name, uri)
+        return uri, missing
+
+    scheduler = MatchScheduler(MATCH_CONCURRENCY, rate=spotify_rate)
+    match_results = await scheduler.run(songs, match_and_report)
+    scheduler.stats["catalog"] = prefetcher.stats()
+    scheduler.stats["candidate_index"] = index.stats()
+    scheduler.stats["dedup"] = deduper.stats()
+    scheduler.stats["search_errors"] = len(failed_ids)
+    matched = {str(song.id): uri for song, (uri, _) in zip(songs, match_results) if str(song.id) not in failed_ids}
+    new_uris = set(matched.values())
+    all_missing = [name for _, name in match_results if name]
+
+    # A URI leaves the playlist only if no remaining song maps to it, and enters only if it is not there yet
+    kept_uris = {uri for song_id, uri in previous.items() if uri and song_id in current}
+    present_uris = set(previous.values())
+    if first_sync or job.attempt > 1:
+        # A reclaimed sync may have added chunks before its worker died, which the mapping doesn't record yet
+        present_uris = set(await spotify.playlist_track_uris(sp_pl_id))
+    remove_uris = list(dict.fromkeys(
+        uri for uri in (previous[song_id] for song_id in removed_ids)
+        if uri and uri not in kept_uris and uri not in new_uris
+    ))
+    add_uris = list(dict.fromkeys(uri for uri in matched.values() if uri and uri not in present_uris))
+
+    remove_chunks = [remove_uris[i:i+MAX_TRACKS_PER_REQUEST] for i in range(0, len(remove_uris), MAX_TRACKS_PER_REQUEST)]
+    add_chunks = [add_uris[i:i+MAX_TRACKS_PER_REQUEST] for i in range(0, len(add_uris), MAX_TRACKS_PER_REQUEST)]
+    job.chunks_total = len(remove_chunks) + len(add_chunks)
+
+    failed_chunks = 0
+    if remove_chunks:
+        job.set_phase("removing")
+        failed_chunks += await apply_chunks(job, remove_chunks, lambda chunk: spotify.remove_tracks(sp_pl_id, chunk))
+    if add_chunks:
+        job.set_phase("adding")
+        failed_chunks += await apply_chunks(job, add_chunks, lambda chunk: spotify.add_tracks(sp_pl_id, chunk), offset=len(remove_chunks))
+
+    if failed_chunks:
+        # Neither mapping describes the playlist now; forget it so the next sync re-reads the playlist itself
+        logger.warning(f"{failed_chunks}/{job.chunks_total} sync chunks failed, dropping the recorded mapping")
+        if store:
+            try:
+                await asyncio.to_thread(store.forget, sp_pl_id)
+            except sqlite3.Error as e:
+                logger.error(f"Could not drop sync mapping for playlist {sp_pl_id}: {e}")
+    else:
+        await record_sync_mapping(sp_pl_id, pid, matched, removed_ids, replace=first_sync)
+
+    logger.info(f"Sync complete: +{len(add_uris)} / -{len(remove_uris)} tracks on playlist {sp_pl_id}")
+    return {
+        "playlist_url": f"https://open.spotify.com/playlist/{sp_pl_id}",
+        "missing": all_missing,
+        "songs_added": len(added_ids),
+        "songs_removed": len(removed_ids),
+        "songs_unchanged": len(current_ids) - len(added_ids),
+        "tracks_added": len(add_uris),
+        "tracks_removed": len(remove_uris),
+        "total_transferred": sum(1 for song_id in current_ids if matched.get(song_id) or previous.get(song_id)),
+        "total_tracks": len(current_ids),
+        "first_sync": first_sync,
+        "match_stats": scheduler.stats,
+    }
+
+
+async def apply_chunks(job: TransferJob, chunks: List[List[str]], send: Callable[[List[str]], Awaitable[httpx.Response]],
+                       offset: int = 0) -> int:
+    """Send add or remove chunks in order with backoff retries; returns how many failed.
+
+    Only transport errors, 429s and 5xx responses are retried, as in ``OrderedChunkWriter``.
+    """
+    failures = 0
+    for i, chunk in enumerate(chunks):
+        for attempt in range(1, 4):
+            try:
+                resp = await send(chunk)
+                resp.raise_for_status()
+            except Exception as chunk_error:
+                if isinstance(chunk_error, httpx.HTTPStatusError) and not retryable_status(chunk_error.response.status_code):
+                    logger.error(f"Spotify rejected chunk {i+1}, not retrying: {chunk_error}")
+                    failures += 1
+                    break
+                logger.warning(f"Error applying chunk {i+1}, retry {attempt}/3: {chunk_error}")
+                # Backoff delay
+                await pause(2 ** attempt)
+                continue
+            job.record_chunk(offset + i, len(chunk))
+            break
+        else:
+            failures += 1
+    return failures
+
+
+async def execute_album_job(job: TransferJob, payload: TransferBody) -> None:
+    await run_job(job, run_album_transfer(payload, job), "album", profile=payload.profile)
+
+
+async def run_album_transfer(payload: TransferBody, job: TransferJob) -> Dict[str, Any]:
+    """Transfer a NetEase album into a new playlist with album-level matching.
+
+    One album search finds the Spotify release and one album-tracks request
+    lists it, then songs are paired with its tracks locally. Only songs left
+    unpaired go through the per-song search strategies.
+    """
+    job.set_phase("fetching")
+    try:
+        album_id = extract_album_id(payload.url)
+        data = await fetch_album(album_id)
+    except Exception as exc:
+        logger.error(f"Error starting album transfer: {exc}")
+        raise HTTPException(502, detail=str(exc))
+
+    album = data["album"]
+    songs = data["songs"][:MAX_PLAYLIST_SIZE]
+    if not songs:
+        raise HTTPException(404, detail="No tracks found in the album")
+    album_name = album.get("name", "")
+    album_artists = get_all_artists(album) or [(album.get("artist") or {}).get("name", "")]
+
+    job.set_phase("creating_playlist")
+    spotify = spotify_client(payload)
+    user_id = await spotify_user_id(spotify)
+    sp_pl_id = await create_spotify_playlist(
+        spotify, user_id, payload.custom_name or f"{album_name or 'NetEase Album'} (NetEase)", payload.description
+    )
+    cover_task = start_cover_upload(spotify, sp_pl_id, payload.cover_url or album.get("picUrl"))
+
+    job.tracks_total = len(songs)
+    job.set_phase("matching")
+    uris: List[Optional[str]] = [None] * len(songs)
+    sp_album = None
+    try:
+        candidates = await spotify.search_albums(album_query(album_name, album_artists[0]), ALBUM_SEARCH_LIMIT)
+        sp_album = pick_album(candidates, album_name, album_artists, len(songs))
+        if sp_album:
+            uris = match_album_tracks(songs, await spotify.album_tracks(sp_album["id"]))
+    except httpx.HTTPStatusError as exc:
+        if exc.response.status_code == 401:
+            raise HTTPException(401, detail="Spotify token invalid")
+        logger.warning(f"Album lookup failed, matching every song individually: {exc}")
+    album_matched = sum(1 for uri in uris if uri)
+    MATCHES.inc("album", amount=album_matched)
+    logger.info(f"Album {album_id}: {album_matched}/{len(songs)} songs matched on Spotify album "
+                f"{sp_album['id'] if sp_album else None}")
+
+    # Remember album pairings so later transfers of these songs skip the search too
+    cache = get_match_cache()
+    if cache:
+        await cache.put_many([(song.id, match_cache_key(song.name, song.artists, song.duration_ms), uri)
+                              for song, uri in zip(songs, uris) if uri])
+
+    missing_by_index: Dict[int, str] = {}
+    for i, (song, uri) in enumerate(zip(songs, uris)):
+        if uri:
+            job.record_track(i, song.name, uri)
+
+    async def match_leftover(_: int, i: int) -> None:
+        try:
+            uri, missing = await match_song(i, songs[i], spotify, len(songs))
+        except SearchFailed as exc:
+            uri, missing = None, exc.song_name
+        uris[i] = uri
+        if missing:
+            missing_by_index[i] = missing
+        job.record_track(i, songs[i].name, uri)
+
+    leftovers = [i for i, uri in enumerate(uris) if not uri]
+    scheduler = MatchScheduler(MATCH_CONCURRENCY, rate=spotify_rate)
+    await scheduler.run(leftovers, match_leftover)
+
+    found = [uri for uri in uris if uri]
+    chunks = [found[i:i+MAX_TRACKS_PER_REQUEST] for i in range(0, len(found), MAX_TRACKS_PER_REQUEST)]
+    job.chunks_total = len(chunks)
+    job.set_phase("adding")
+    await apply_chunks(job, chunks, lambda chunk: spotify.add_tracks(sp_pl_id, chunk))
+
+    await finish_cover_upload(job, cover_task)
+
+    logger.info(f"Album transfer complete: {len(found)}/{len(songs)} tracks transferred")
+    return {
+        "playlist_url": f"https://open.spotify.com/playlist/{sp_pl_id}",
+        "missing": [missing_by_index[i] for i in sorted(missing_by_index)],
+        "total_transferred": len(found),
+        "total_tracks": len(songs),
+        "processed_batches": 1,
+        "batch_results": [{
+            "batch_number": 1,
+            "total_tracks": len(songs),
+            "matched_tracks": len(found),
+            "success_rate": round(len(found) / len(songs) * 100),
+        }],
+        "completed_batches": 1,
+        "match_stats": {
+            **scheduler.stats,
+            "spotify_album_id": sp_album["id"] if sp_album else None,
+            "album_matched": album_matched,
+            "searched_leftovers": len(leftovers),
+        },
     }
 
 
@@ -672,19 +1293,18 @@ async def read_root():
 async def get_spotify_token(code: str):
     """Exchange Spotify authorization code for an access token (used by the frontend)."""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://accounts.spotify.com/api/token",
-                data={
-                    "grant_type": "authorization_code",
-                    "code": code,
-                    "redirect_uri": os.getenv("SPOTIFY_REDIRECT_URI"),
-                    "client_id": os.getenv("SPOTIFY_CLIENT_ID"),
-                    "client_secret": os.getenv("SPOTIFY_CLIENT_SECRET"),
-                },
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await get_http_client().post(
+            f"{SPOTIFY_ACCOUNTS_URL}/api/token",
+            data={
+                "grant_type": "authorization_code",
+                "code": code,
+                "redirect_uri": os.getenv("SPOTIFY_REDIRECT_URI"),
+                "client_id": os.getenv("SPOTIFY_CLIENT_ID"),
+                "client_secret": os.getenv("SPOTIFY_CLIENT_SECRET"),
+            },
+        )
+        response.raise_for_status()
+        return response.json()
     except Exception as e:
         logger.error(f"Error exchanging code for token: {e}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -694,18 +1314,7 @@ async def get_spotify_token(code: str):
 async def refresh_spotify_token(refresh_token: str):
     """Refresh an expired Spotify access token."""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://accounts.spotify.com/api/token",
-                data={
-                    "grant_type": "refresh_token",
-                    "refresh_token": refresh_token,
-                    "client_id": os.getenv("SPOTIFY_CLIENT_ID"),
-                    "client_secret": os.getenv("SPOTIFY_CLIENT_SECRET"),
-                },
-            )
-            response.raise_for_status()
-            return response.json()
+        return await refresh_access_token(refresh_token)
     except Exception as e:
         logger.error(f"Error refreshing token: {e}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -736,284 +1345,20 @@ def extract_playlist_id(url: str) -> str:
     raise ValueError("No playlist id found in URL")
 
 
-# ---- extra helper to fetch full track list when necessary ------------------
-
-def fetch_full_tracks(pl_id: str):
-    """Return full track objects list from NetEase even for large playlists.
-    Handles pagination to ensure all tracks are retrieved."""
-    try:
-        logger.info(f"Fetching full tracks for playlist {pl_id}")
-        all_songs = []
-        
-        # STEP 1: First get the trackIds to understand the true playlist size
-        logger.info("Step 1: Getting all trackIds for the playlist")
-        try:
-            playlist_resp = requests.get(
-                "https://music.163.com/api/v6/playlist/detail",
-                params={"id": pl_id, "n": 10000},
-                headers={"User-Agent": "Mozilla/5.0", "Referer": "https://music.163.com/"},
-                timeout=60
-            )
-            playlist_resp.raise_for_status()
-            playlist_data = playlist_resp.json()
-            
-            playlist = playlist_data.get("playlist") or playlist_data.get("result", {})
-            track_ids = playlist.get("trackIds", [])
-            
-            if track_ids:
-                logger.info(f"Found {len(track_ids)} trackIds in the playlist")
-            else:
-                logger.warning("No trackIds found in playlist detail response")
-                # Try alternative endpoint for trackIds
-                alt_resp = requests.get(
-                    "https://music.163.com/api/v3/playlist/detail",
-                    params={"id": pl_id, "n": 10000},
-                    headers={"User-Agent": "Mozilla/5.0", "Referer": "https://music.163.com/"},
-                    timeout=60
-                )
-                alt_data = alt_resp.json()
-                playlist = alt_data.get("playlist") or alt_data.get("result", {})
-                track_ids = playlist.get("trackIds", [])
-                logger.info(f"Alternative endpoint found {len(track_ids)} trackIds")
-        except Exception as e:
-            logger.warning(f"Error getting trackIds: {e}")
-            track_ids = []
-        
-        # STEP 2: Fetch tracks in batches using track/all endpoint with pagination
-        logger.info("Step 2: Fetching tracks with pagination using track/all endpoint")
-        offset = 0
-        limit = 1000  # NetEase API generally accepts up to 1000 per request
-        
-        while True:
-            try:
-                logger.info(f"Fetching tracks batch with offset={offset}, limit={limit}")
-                
-                # Use the track/all endpoint which is specifically designed for paginated access
-                resp = requests.get(
-                    "https://music.163.com/api/v3/playlist/track/all",
-                    params={
-                        "id": pl_id,
-                        "limit": limit, 
-                        "offset": offset
-                    },
-                    headers={
-                        "User-Agent": "Mozilla/5.0",
-                        "Referer": "https://music.163.com/"
-                    },
-                    timeout=60
-                )
-                resp.raise_for_status()
-                data = resp.json()
-                
-                songs = data.get("songs", [])
-                
-                if songs:
-                    logger.info(f"Fetched {len(songs)} tracks at offset {offset}")
-                    all_songs.extend(songs)
-                    
-                    # If we have exactly 804 tracks and we know there are more (from trackIds),
-                    # this is likely the NetEase API limitation
-                    if len(all_songs) == 804 and track_ids and len(track_ids) > 804:
-                        logger.warning("Hit the 804 track limit in NetEase API - switching to trackIds approach")
-                        break
-                else:
-                    logger.warning(f"No songs returned at offset {offset}")
-                    break
-                
-                # Break the loop if:
-                # 1. We got fewer songs than requested (reached the end)
-                # 2. We've fetched all tracks according to trackIds count
-                if len(songs) < limit or (track_ids and len(all_songs) >= len(track_ids)):
-                    break
-                
-                # Move to next batch
-                offset += limit
-                time.sleep(0.5)  # Small delay to avoid rate limiting
-                
-            except Exception as batch_error:
-                logger.error(f"Error fetching batch at offset {offset}: {batch_error}")
-                break
-        
-        logger.info(f"After pagination: fetched {len(all_songs)} tracks")
-        
-        # STEP 3: If we got exactly 804 tracks or didn't get all tracks according to trackIds,
-        # use fetch_tracks_by_ids as a fallback to get the remaining tracks
-        if track_ids and ((len(all_songs) == 804 and len(track_ids) > 804) or len(all_songs) < len(track_ids)):
-            logger.info(f"Need to fetch additional tracks: have {len(all_songs)}, need {len(track_ids)}")
-            
-            # Create a set of IDs we already have to avoid duplicates
-            existing_ids = set()
-            for song in all_songs:
-                song_id = song.get("id")
-                if song_id:
-                    existing_ids.add(str(song_id))
-            
-            # Find missing track IDs
-            missing_ids = []
-            for tid in track_ids:
-                id_val = str(tid.get("id") if isinstance(tid, dict) else tid)
-                if id_val not in existing_ids:
-                    missing_ids.append(tid)
-            
-            logger.info(f"Fetching {len(missing_ids)} missing tracks by IDs")
-            missing_tracks = fetch_tracks_by_ids(missing_ids)
-            
-            if missing_tracks:
-                logger.info(f"Successfully fetched {len(missing_tracks)} additional tracks")
-                all_songs.extend(missing_tracks)
-            else:
-                logger.warning(f"Failed to fetch missing tracks by IDs")
-                
-                # If we have exactly 804 tracks, try an alternative approach:
-                # Use the song/detail endpoint to get remaining tracks in batches
-                if len(all_songs) == 804 and track_ids and len(track_ids) > 804:
-                    logger.info("Trying direct song/detail approach for remaining tracks")
-                    
-                    # Get track IDs from 804 onwards
-                    remaining_ids = track_ids[804:]
-                    remaining_tracks = []
-                    
-                    # Fetch remaining tracks in smaller batches
-                    batch_size = 200
-                    for i in range(0, len(remaining_ids), batch_size):
-                        batch_ids = remaining_ids[i:i+batch_size]
-                        logger.info(f"Fetching batch {i//batch_size + 1}/{(len(remaining_ids) + batch_size - 1)//batch_size} ({len(batch_ids)} tracks)")
-                        
-                        try:
-                            ids_str = ",".join([str(tid.get("id") if isinstance(tid, dict) else tid) for tid in batch_ids])
-                            detail_resp = requests.get(
-                                "https://music.163.com/api/song/detail",
-                                params={"ids": f"[{ids_str}]"},
-                                headers={"User-Agent": "Mozilla/5.0", "Referer": "https://music.163.com/"},
-                                timeout=60
-                            )
-                            detail_data = detail_resp.json()
-                            batch_tracks = detail_data.get("songs", [])
-                            
-                            if batch_tracks:
-                                logger.info(f"Got {len(batch_tracks)} tracks from song/detail")
-                                remaining_tracks.extend(batch_tracks)
-                            
-                            time.sleep(0.5)  # Small delay between batches
-                        except Exception as e:
-                            logger.error(f"Error fetching tracks batch using song/detail: {e}")
-                    
-                    if remaining_tracks:
-                        logger.info(f"Successfully fetched {len(remaining_tracks)} remaining tracks using song/detail")
-                        all_songs.extend(remaining_tracks)
-        
-        # Final log
-        logger.info(f"Total tracks fetched from NetEase API: {len(all_songs)}")
-        return all_songs
-    except Exception as e:
-        logger.error(f"Error fetching full tracks: {e}")
-        traceback.print_exc()
-        return []
-
-
-# ---- fallback helper: fetch by song ids -----------------------------------
+def extract_spotify_playlist_id(value: str) -> str:
+    """Return the playlist id from a Spotify playlist URL, URI or bare id."""
+    m = _SPOTIFY_PLAYLIST_RE.search(value)
+    if m:
+        return m.group(1)
+    if value.isalnum():
+        return value
+    raise ValueError("No Spotify playlist id found")
 
-def fetch_tracks_by_ids(track_ids):
-    """Fetch full track objects list given trackIds array from playlist api."""
-    if not track_ids:
-        logger.warning("No track IDs provided to fetch_tracks_by_ids")
-        return []
-        
-    try:
-        # Convert all IDs to consistent format
-        ids = [tid.get("id", tid) if isinstance(tid, dict) else tid for tid in track_ids]
-        headers = {
-            "User-Agent": "Mozilla/5.0", 
-            "Referer": "https://music.163.com/",
-            "Content-Type": "application/x-www-form-urlencoded"
-        }
-        tracks = []
-        max_retries = 3
-        
-        # Smaller chunk size for more reliable requests
-        chunk_size = 200  
-        logger.info(f"Fetching {len(ids)} tracks in chunks of {chunk_size}")
-        
-        for i in range(0, len(ids), chunk_size):
-            chunk_ids = ids[i:i+chunk_size]
-            logger.info(f"Fetching chunk {i//chunk_size + 1}/{(len(ids) + chunk_size - 1)//chunk_size} ({len(chunk_ids)} tracks)")
-            
-            retry_count = 0
-            success = False
-            
-            # Try multiple API endpoints with retries
-            while not success and retry_count < max_retries:
-                try:
-                    # First try the standard song/detail endpoint
-                    ids_param = "[" + ",".join([str(id) for id in chunk_ids]) + "]"
-                    
-                    resp = requests.get(
-                        "https://music.163.com/api/song/detail", 
-                        params={"ids": ids_param}, 
-                        headers=headers,
-                        timeout=60
-                    )
-                    resp.raise_for_status()
-                    chunk_data = resp.json()
-                    chunk_tracks = chunk_data.get("songs", [])
-                    
-                    # Verify we got a reasonable number of tracks back
-                    if chunk_tracks and len(chunk_tracks) > 0:
-                        success = True
-                        tracks.extend(chunk_tracks)
-                        logger.info(f"Successfully fetched {len(chunk_tracks)} tracks from chunk {i//chunk_size + 1}")
-                    else:
-                        # If no tracks returned, try alternative endpoint
-                        logger.warning(f"No tracks returned from song/detail endpoint, trying v2 endpoint")
-                        
-                        # Try alternative endpoint (v2)
-                        alt_resp = requests.post(
-                            "https://music.163.com/weapi/v2/song/detail",
-                            data={
-                                "ids": ids_param,
-                                "csrf_token": ""
-                            },
-                            headers=headers,
-                            timeout=60
-                        )
-                        alt_data = alt_resp.json()
-                        alt_tracks = alt_data.get("songs", [])
-                        
-                        if alt_tracks and len(alt_tracks) > 0:
-                            success = True
-                            tracks.extend(alt_tracks)
-                            logger.info(f"Successfully fetched {len(alt_tracks)} tracks from v2 endpoint")
-                        else:
-                            retry_count += 1
-                            logger.warning(f"Both endpoints failed, retry {retry_count}/{max_retries}")
-                            if retry_count < max_retries:
-                                # Exponential backoff
-                                backoff_time = (2 ** retry_count) + random.uniform(0, 1)
-                                logger.info(f"Retrying in {backoff_time:.2f} seconds...")
-                                time.sleep(backoff_time)
-                
-                except Exception as e:
-                    retry_count += 1
-                    logger.warning(f"Error fetching chunk {i//chunk_size + 1}, retry {retry_count}/{max_retries}: {e}")
-                    if retry_count < max_retries:
-                        # Exponential backoff
-                        backoff_time = (2 ** retry_count) + random.uniform(0, 1)
-                        logger.info(f"Retrying in {backoff_time:.2f} seconds...")
-                        time.sleep(backoff_time)
-            
-            if not success:
-                logger.error(f"Failed to fetch chunk {i//chunk_size + 1} after {max_retries} retries")
-            
-            # Add a small delay between chunks to avoid rate limiting
-            if i + chunk_size < len(ids):
-                time.sleep(1)
-        
-        logger.info(f"Total tracks fetched by IDs: {len(tracks)}")
-        return tracks
-    
-    except Exception as e:
-        logger.error(f"Error in fetch_tracks_by_ids: {e}")
-        traceback.print_exc()
-        return []
 
-# ------------------------------------------------------------- 
\ No newline at end of file
+def extract_album_id(url: str) -> str:
+    """Return the numeric album id from a NetEase album URL such as
+    https://music.163.com/#/album?id=123456 or https://music.163.com/album/123456."""
+    m = _ALBUM_ID_RE.search(url)
+    if m and "album" in url:
+        return m.group(1)
+    raise ValueError("No album id found in URL")
@@ -0,0 +1,169 @@
+# Persistent NetEase song -> Spotify URI match cache backed by SQLite.
+
+import os, asyncio, logging, sqlite3, tempfile, threading, time
+from typing import Callable, Dict, List, Optional, Any, Tuple
+
+logger = logging.getLogger(__name__)
+
+MATCH_CACHE_PATH = os.getenv("MATCH_CACHE_PATH", os.path.join(tempfile.gettempdir(), "netify_match_cache.sqlite3"))
+MATCH_CACHE_MAX_ENTRIES = int(os.getenv("MATCH_CACHE_MAX_ENTRIES", "200000"))
+MATCH_TTL = 90 * 24 * 3600    # Resolved URIs are trusted for 90 days
+NO_MATCH_TTL = 3 * 24 * 3600  # "No match" entries expire sooner, the catalog grows
+TOUCH_BATCH = 256             # Cache hits whose last_used refresh is buffered before it is written
+
+
+class MatchCache:
+    """LRU-bounded cache of search outcomes keyed by NetEase song id and by a
+    normalized title/artist/duration key, so the same song uploaded under
+    another id still hits.
+
+    A stored ``None`` URI records that every search strategy came up empty.
+    Worker processes share the file, so the coroutine methods run their
+    writes in a thread; lookups use a connection of their own, which in WAL
+    mode never waits for a writer, and hits refresh ``last_used`` in batches.
+    The cache is best effort: a database error reads as a miss and a failed
+    write is only logged.
+    """
+
+    def __init__(self, path: str, max_entries: int = MATCH_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # Writes from several worker processes queue up instead of failing
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._read_lock = threading.Lock()
+        self._reader = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._reader.execute("PRAGMA busy_timeout=200")
+        self._touched: Dict[str, float] = {}
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS matches ("
+            " key TEXT PRIMARY KEY, uri TEXT, expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS matches_last_used ON matches(last_used)")
+        self._size = self._conn.execute("SELECT COUNT(*) FROM matches").fetchone()[0]
+
+    @staticmethod
+    def _keys(song_id: Optional[Any], fallback_key: Optional[str]):
+        if song_id:
+            yield f"id:{song_id}"
+        if fallback_key:
+            yield f"name:{fallback_key}"
+
+    async def get(self, song_id: Optional[Any], fallback_key: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """Return ``(cached, uri)``; ``uri`` may be None for a cached "no match"."""
+        return await asyncio.to_thread(self._get, song_id, fallback_key)
+
+    async def put(self, song_id: Optional[Any], fallback_key: Optional[str], uri: Optional[str]) -> None:
+        await asyncio.to_thread(self._put_many, [(song_id, fallback_key, uri)])
+
+    async def put_many(self, entries: List[Tuple[Optional[Any], Optional[str], Optional[str]]]) -> None:
+        """Store several ``(song_id, fallback_key, uri)`` outcomes in one transaction."""
+        await asyncio.to_thread(self._put_many, entries)
+
+    def contains(self, song_id: Optional[Any], fallback_key: Optional[str]) -> bool:
+        """Whether ``get`` would answer, without counting a hit or refreshing the entry."""
+        now = time.time()
+        try:
+            with self._read_lock:
+                for key in self._keys(song_id, fallback_key):
+                    row = self._reader.execute("SELECT expires_at FROM matches WHERE key = ?", (key,)).fetchone()
+                    if row is not None and row[0] >= now:
+                        return True
+        except sqlite3.Error as e:
+            logger.warning(f"Match cache lookup failed, treating it as a miss: {e}")
+        return False
+
+    def _get(self, song_id: Optional[Any], fallback_key: Optional[str]) -> Tuple[bool, Optional[str]]:
+        now = time.time()
+        try:
+            with self._read_lock:
+                for key in self._keys(song_id, fallback_key):
+                    row = self._reader.execute("SELECT uri, expires_at FROM matches WHERE key = ?", (key,)).fetchone()
+                    # Expired rows are overwritten by the next put for the key or evicted with the oldest
+                    if row is None or row[1] < now:
+                        continue
+                    self.hits += 1
+                    self._touched[key] = now
+                    found = row[0]
+                    break
+                else:
+                    self.misses += 1
+                    return False, None
+        except sqlite3.Error as e:
+            logger.warning(f"Match cache lookup failed, treating it as a miss: {e}")
+            self.misses += 1
+            return False, None
+        if len(self._touched) >= TOUCH_BATCH:
+            self._write()
+        return True, found
+
+    def _put_many(self, entries: List[Tuple[Optional[Any], Optional[str], Optional[str]]]) -> None:
+        now = time.time()
+
+        def insert():
+            for song_id, fallback_key, uri in entries:
+                expires_at = now + (MATCH_TTL if uri else NO_MATCH_TTL)
+                for key in self._keys(song_id, fallback_key):
+                    cur = self._conn.execute(
+                        "INSERT OR REPLACE INTO matches (key, uri, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                        (key, uri, expires_at, now),
+                    )
+                    self._size += cur.rowcount if cur.rowcount > 0 else 0
+            if self._size > self.max_entries:
+                self._evict()
+
+        self._write(insert)
+
+    def _write(self, changes: Optional[Callable[[], None]] = None) -> None:
+        """Apply ``changes`` together with the buffered ``last_used`` refreshes in one transaction."""
+        with self._read_lock:
+            touched, self._touched = self._touched, {}
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self._conn.executemany("UPDATE matches SET last_used = ? WHERE key = ?",
+                                           [(used, key) for key, used in touched.items()])
+                    if changes:
+                        changes()
+                    self._conn.execute("COMMIT")
+                except sqlite3.Error:
+                    self._conn.execute("ROLLBACK")
+                    raise
+            except sqlite3.Error as e:
+                logger.warning(f"Match cache write failed: {e}")
+
+    def _evict(self) -> None:
+        # Drop the least recently used tenth in one statement rather than a row per insert
+        self._size = self._conn.execute("SELECT COUNT(*) FROM matches").fetchone()[0]
+        excess = self._size - self.max_entries + self.max_entries // 10
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM matches WHERE key IN (SELECT key FROM matches ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+            self._size -= excess
+            logger.info(f"Match cache evicted {excess} least recently used entries")
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": self._size}
+
+
+_match_cache: Optional[MatchCache] = None
+_match_cache_failed = False
+
+
+def get_match_cache() -> Optional[MatchCache]:
+    """Open the shared cache on first use; returns None if the database cannot be opened."""
+    global _match_cache, _match_cache_failed
+    if _match_cache is None and not _match_cache_failed:
+        try:
+            _match_cache = MatchCache(MATCH_CACHE_PATH)
+        except sqlite3.Error as e:
+            logger.error(f"Match cache disabled, could not open {MATCH_CACHE_PATH}: {e}")
+            _match_cache_failed = True
+    return _match_cache
@@ -0,0 +1,151 @@
+# Prometheus-style counters, gauges and histograms, rendered in the text exposition format at /metrics.
+
+import bisect, math
+from typing import List, Dict, Optional, Tuple, Sequence
+
+from .timings import record
+
+# Every update comes from the event loop thread, so metrics are plain dicts
+# without locks: an increment costs one dict lookup, never a lock handoff.
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def _labels(self, values: Tuple[str, ...], le: Optional[str] = None) -> str:
+        pairs = [f'{k}="{_escape(v)}"' for k, v in zip(self.labelnames, values)]
+        if le is not None:
+            pairs.append(f'le="{le}"')
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self.samples()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{self._labels(k)} {_number(v)}" for k, v in sorted(self._values.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+
+class Histogram(_Metric):
+    """Bucketed observations; counts are kept per bucket and made cumulative when rendered."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket..., count above the last bucket], sum
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1][0] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                cumulative += n
+                le = "+Inf" if bound == math.inf else _number(bound)
+                lines.append(f"{self.name}_bucket{self._labels(labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(labels)} {_number(total[0])}")
+            lines.append(f"{self.name}_count{self._labels(labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+registry = Registry()
+
+UPSTREAM_LATENCY = registry.register(Histogram(
+    "netify_upstream_request_seconds", "Upstream request latency, one observation per attempt.",
+    ("service", "method", "endpoint")))
+UPSTREAM_RETRIES = registry.register(Counter(
+    "netify_upstream_retries_total", "Upstream requests sent again after a transport error, throttle or failed chunk.",
+    ("service", "reason")))
+UPSTREAM_THROTTLED = registry.register(Counter(
+    "netify_upstream_throttled_total", "Upstream responses with status 429.", ("service", "endpoint")))
+UPSTREAM_FAILURES = registry.register(Counter(
+    "netify_upstream_failures_total", "Upstream attempts that ended in a transport error or a 5xx response.",
+    ("service", "endpoint")))
+TOKEN_REFRESHES = registry.register(Counter(
+    "netify_token_refreshes_total", "Spotify access tokens refreshed during a transfer, before expiry or after a 401.",
+    ("reason",)))
+ACTIVE_TRANSFERS = registry.register(Gauge(
+    "netify_active_transfers", "Transfer jobs currently running.", ("kind",)))
+MATCHES = registry.register(Counter(
+    "netify_matches_total", "Songs matched, by the cache, index or search strategy that found them.", ("strategy",)))
+TRANSFER_RATE = registry.register(Histogram(
+    "netify_transfer_tracks_per_second", "Tracks matched per second over a whole transfer.", ("kind",),
+    buckets=RATE_BUCKETS))
+
+
+def observe_upstream(service: str, method: str, endpoint: str, seconds: float, status: int = 0) -> None:
+    """Record one upstream attempt; ``status`` 0 means it never got a response."""
+    UPSTREAM_LATENCY.observe(seconds, service, method, endpoint)
+    # Also charged to the running request's timing breakdown
+    record(service, seconds)
+    if status == 429:
+        UPSTREAM_THROTTLED.inc(service, endpoint)
+    elif status == 0 or status >= 500:
+        UPSTREAM_FAILURES.inc(service, endpoint)
@@ -0,0 +1,404 @@
+# Async NetEase Cloud Music fetcher with bounded, paced, order-preserving chunk requests.
+
+import os, asyncio, logging, random, re, time
+from typing import List, Dict, Optional, Any, Tuple, AsyncIterator
+from urllib.parse import urlparse
+
+import httpx
+
+from .metrics import UPSTREAM_RETRIES, observe_upstream
+from .scheduler import RateController
+from .timings import pause
+from .spotify_client import get_http_client
+from .tracks import Track, tracks_from_netease
+
+logger = logging.getLogger(__name__)
+
+NETEASE_URL = os.getenv("NETEASE_BASE_URL", "https://music.163.com").rstrip("/")
+NETEASE_HEADERS = {"User-Agent": "Mozilla/5.0", "Referer": "https://music.163.com/"}
+NETEASE_CONCURRENCY = int(os.getenv("NETEASE_CONCURRENCY", "4"))         # Chunk requests in flight per fetch
+NETEASE_MIN_INTERVAL = float(os.getenv("NETEASE_MIN_INTERVAL", "0.2"))   # Seconds between request starts per host
+NETEASE_TIMEOUT = 60
+SONG_DETAIL_CHUNK = 200       # Song ids per song/detail request
+TRACK_PAGE_SIZE = 1000        # NetEase API generally accepts up to 1000 per track/all request
+CHUNK_RETRIES = 3             # Attempts per chunk before it is given up
+
+PLAYLIST_FIELDS = ("id", "name", "coverImgUrl", "description", "trackCount", "trackUpdateTime", "updateTime")
+
+# Streaming the playlist detail needs the optional "ijson" package; without it the whole body is decoded at once
+try:
+    import ijson
+    IJSON_AVAILABLE = True
+except ImportError:
+    IJSON_AVAILABLE = False
+
+_host_rates: Dict[str, RateController] = {}
+
+
+def _host_rate(url: str) -> RateController:
+    host = urlparse(url).netloc
+    rate = _host_rates.get(host)
+    if rate is None:
+        rate = _host_rates[host] = RateController(min_delay=NETEASE_MIN_INTERVAL, initial_delay=NETEASE_MIN_INTERVAL)
+    return rate
+
+
+def endpoint_name(path: str) -> str:
+    """Metrics label for an API path, versions and ids dropped: ``/api/v6/playlist/detail`` -> ``playlist/detail``."""
+    parts = [p for p in path.strip("/").split("/") if not re.fullmatch(r"v\d+|\d+", p)]
+    return "/".join(parts[1:] if parts and parts[0] == "api" else parts)
+
+
+def track_id(tid: Any) -> Any:
+    """trackIds entries are either bare ids or {"id": ...} objects."""
+    return tid.get("id", tid) if isinstance(tid, dict) else tid
+
+
+async def netease_request(method: str, path: str, **kwargs) -> Dict[str, Any]:
+    """Send one paced request to NetEase and return the decoded JSON body."""
+    url = f"{NETEASE_URL}{path}"
+    rate = _host_rate(url)
+    await rate.acquire()
+    start = time.perf_counter()
+    try:
+        resp = await get_http_client().request(method, url, headers=NETEASE_HEADERS, timeout=NETEASE_TIMEOUT, **kwargs)
+    except httpx.TransportError:
+        observe_upstream("netease", method, endpoint_name(path), time.perf_counter() - start)
+        raise
+    observe_upstream("netease", method, endpoint_name(path), time.perf_counter() - start, resp.status_code)
+    if resp.status_code == 429 or resp.status_code == 503:
+        rate.on_throttle(None)
+    resp.raise_for_status()
+    rate.on_success()
+    return resp.json()
+
+
+def _compact_playlist(playlist: Dict[str, Any]) -> Dict[str, Any]:
+    # Keep bare ids and track records instead of the raw per-entry objects
+    if playlist.get("trackIds"):
+        playlist["trackIds"] = [track_id(tid) for tid in playlist["trackIds"]]
+    if playlist.get("tracks"):
+        playlist["tracks"] = tracks_from_netease(playlist["tracks"])
+    return playlist
+
+
+class _DetailParser:
+    """Collect a playlist detail response from ijson events without building its object tree.
+
+    Only the playlist metadata in ``PLAYLIST_FIELDS``, the ``trackIds`` ids and
+    the ``tracks`` entries are kept; each track object is assembled on its own
+    and converted to a Track straight away. ``privileges`` and every other key
+    are skipped as the events go by.
+    """
+
+    def __init__(self):
+        self.data: Dict[str, Any] = {}
+        self._scalars: Dict[str, Tuple[Dict[str, Any], str]] = {"code": (self.data, "code")}
+        self._ids: Dict[str, List[Any]] = {}
+        self._tracks: Dict[str, List[Track]] = {}
+        self._builder = None
+        self._depth = 0
+
+    def feed(self, events: List[Tuple[str, str, Any]]) -> None:
+        for prefix, event, value in events:
+            if self._builder is not None:
+                self._builder.event(event, value)
+                if event == "start_map" or event == "start_array":
+                    self._depth += 1
+                elif event == "end_map" or event == "end_array":
+                    self._depth -= 1
+                    if not self._depth:
+                        self._tracks[prefix[:-len(".tracks.item")]].append(Track.from_netease(self._builder.value))
+                        self._builder = None
+                continue
+            ids = self._ids.get(prefix)
+            if ids is not None:
+                if event == "number":
+                    ids.append(value)
+            elif event == "start_map":
+                if prefix.endswith(".tracks.item") and prefix[:-len(".tracks.item")] in self._tracks:
+                    self._builder = ijson.ObjectBuilder()
+                    self._builder.event(event, value)
+                    self._depth = 1
+                elif prefix in ("playlist", "result"):
+                    self._add_root(prefix)
+            elif prefix in self._scalars:
+                target, key = self._scalars[prefix]
+                target[key] = value
+
+    def _add_root(self, root: str) -> None:
+        playlist: Dict[str, Any] = {"trackIds": [], "tracks": []}
+        self.data[root] = playlist
+        for field in PLAYLIST_FIELDS:
+            self._scalars[f"{root}.{field}"] = (playlist, field)
+        # trackIds entries are {"id": ...} objects in current responses and bare ids in old ones
+        self._ids[f"{root}.trackIds.item.id"] = self._ids[f"{root}.trackIds.item"] = playlist["trackIds"]
+        self._tracks[root] = playlist["tracks"]
+
+
+async def parse_playlist_detail(chunks: AsyncIterator[bytes]) -> Dict[str, Any]:
+    """Parse a playlist detail body chunk by chunk into the shape ``fetch_playlist`` returns."""
+    events = ijson.sendable_list()
+    coro = ijson.parse_coro(events, use_float=True)
+    parser = _DetailParser()
+    async for chunk in chunks:
+        coro.send(chunk)
+        parser.feed(events)
+        del events[:]
+    coro.close()
+    parser.feed(events)
+    return parser.data
+
+
+async def _fetch_detail(path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """GET a playlist detail endpoint, streaming the body through ijson when it is available."""
+    if not IJSON_AVAILABLE:
+        data = await netease_request("GET", path, params=params)
+        for key in ("playlist", "result"):
+            if data.get(key):
+                _compact_playlist(data[key])
+        return data
+
+    url = f"{NETEASE_URL}{path}"
+    rate = _host_rate(url)
+    await rate.acquire()
+    start = time.perf_counter()
+    status = 0
+    try:
+        async with get_http_client().stream("GET", url, headers=NETEASE_HEADERS, timeout=NETEASE_TIMEOUT, params=params) as resp:
+            status = resp.status_code
+            if resp.status_code == 429 or resp.status_code == 503:
+                rate.on_throttle(None)
+            resp.raise_for_status()
+            rate.on_success()
+            try:
+                return await parse_playlist_detail(resp.aiter_bytes())
+            except ijson.JSONError as e:
+                raise ValueError(f"invalid playlist detail response: {e}")
+    finally:
+        # Timed to the end of the body, like the non-streaming requests
+        observe_upstream("netease", "GET", endpoint_name(path), time.perf_counter() - start, status)
+
+
+async def fetch_playlist(pl_id: str) -> Dict[str, Any]:
+    data = await _fetch_detail("/api/v6/playlist/detail", {"id": pl_id})
+    if data.get("code") != 200:
+        raise ValueError("playlist api error")
+    return data
+
+
+async def fetch_album(album_id: str) -> Dict[str, Any]:
+    """Return ``{"album": ..., "songs": [Track, ...]}`` for a NetEase album, songs in album order."""
+    data = await netease_request("GET", f"/api/v1/album/{album_id}")
+    if data.get("code") != 200:
+        raise ValueError("album api error")
+    album = data.get("album") or {}
+    # Older responses nest the track list inside the album object
+    songs = tracks_from_netease(data.get("songs") or album.pop("songs", None) or [])
+    return {"album": album, "songs": songs}
+
+
+async def _with_retries(label: str, attempt) -> Optional[Any]:
+    """Run ``attempt`` up to CHUNK_RETRIES times with async backoff; None if every attempt fails.
+
+    ``attempt`` returns None to ask for a retry. Only the failing chunk waits,
+    other chunks keep their pool slots busy.
+    """
+    for retry_count in range(1, CHUNK_RETRIES + 1):
+        try:
+            result = await attempt()
+            if result is not None:
+                return result
+            logger.warning(f"{label}: empty response, retry {retry_count}/{CHUNK_RETRIES}")
+        except (httpx.HTTPError, ValueError) as e:
+            logger.warning(f"{label}: error, retry {retry_count}/{CHUNK_RETRIES}: {e}")
+        if retry_count < CHUNK_RETRIES:
+            UPSTREAM_RETRIES.inc("netease", "chunk")
+            # Exponential backoff
+            await pause((2 ** retry_count) + random.uniform(0, 1))
+    logger.error(f"{label}: failed after {CHUNK_RETRIES} retries")
+    return None
+
+
+def _spawn_bounded(coros: List[Any]) -> List["asyncio.Future"]:
+    """Schedule coroutines with at most NETEASE_CONCURRENCY in flight; tasks keep input order."""
+    semaphore = asyncio.Semaphore(NETEASE_CONCURRENCY)
+
+    async def bounded(coro):
+        async with semaphore:
+            return await coro
+
+    return [asyncio.ensure_future(bounded(c)) for c in coros]
+
+
+async def _gather_bounded(coros: List[Any]) -> List[Any]:
+    """Await coroutines with at most NETEASE_CONCURRENCY in flight, results in input order."""
+    return await asyncio.gather(*_spawn_bounded(coros))
+
+
+async def _fetch_detail_chunk(chunk_ids: List[Any], label: str) -> List[Track]:
+    ids_param = "[" + ",".join(str(i) for i in chunk_ids) + "]"
+
+    async def attempt():
+        # First try the standard song/detail endpoint
+        data = await netease_request("GET", "/api/song/detail", params={"ids": ids_param})
+        songs = tracks_from_netease(data.get("songs"))
+        if songs:
+            return songs
+        # If no tracks returned, try alternative endpoint (v2)
+        logger.warning(f"{label}: no tracks from song/detail endpoint, trying v2 endpoint")
+        alt = await netease_request("POST", "/weapi/v2/song/detail", data={"ids": ids_param, "csrf_token": ""})
+        return tracks_from_netease(alt.get("songs")) or None
+
+    songs = await _with_retries(label, attempt)
+    if songs:
+        logger.info(f"{label}: fetched {len(songs)} tracks")
+    return songs or []
+
+
+async def fetch_tracks_by_ids(track_ids: List[Any]) -> List[Track]:
+    """Fetch track records for a trackIds array, several chunks at a time, in input order."""
+    if not track_ids:
+        logger.warning("No track IDs provided to fetch_tracks_by_ids")
+        return []
+
+    ids = [track_id(tid) for tid in track_ids]
+    chunks = [ids[i:i+SONG_DETAIL_CHUNK] for i in range(0, len(ids), SONG_DETAIL_CHUNK)]
+    logger.info(f"Fetching {len(ids)} tracks in {len(chunks)} chunks of {SONG_DETAIL_CHUNK}")
+
+    results = await _gather_bounded([
+        _fetch_detail_chunk(chunk, f"Chunk {n+1}/{len(chunks)}") for n, chunk in enumerate(chunks)
+    ])
+    tracks = [song for chunk_songs in results for song in chunk_songs]
+    logger.info(f"Total tracks fetched by IDs: {len(tracks)}")
+    return tracks
+
+
+async def _fetch_track_ids(pl_id: str) -> Tuple[List[Any], int]:
+    """Return the playlist's trackIds and advertised trackCount."""
+    for version in ("v6", "v3"):
+        try:
+            data = await _fetch_detail(f"/api/{version}/playlist/detail", {"id": pl_id, "n": 10000})
+        except (httpx.HTTPError, ValueError) as e:
+            logger.warning(f"Error getting trackIds from {version} detail: {e}")
+            continue
+        playlist = data.get("playlist") or data.get("result") or {}
+        track_ids = playlist.get("trackIds", [])
+        if track_ids:
+            logger.info(f"Found {len(track_ids)} trackIds in the playlist")
+            return track_ids, playlist.get("trackCount") or len(track_ids)
+        logger.warning(f"No trackIds found in {version} playlist detail response")
+    return [], 0
+
+
+async def _fetch_track_page(pl_id: str, offset: int) -> List[Track]:
+    async def attempt():
+        data = await netease_request(
+            "GET", "/api/v3/playlist/track/all", params={"id": pl_id, "limit": TRACK_PAGE_SIZE, "offset": offset}
+        )
+        # An empty page is an answer, not a failure: NetEase caps track/all for some playlists
+        return tracks_from_netease(data.get("songs"))
+
+    songs = await _with_retries(f"track/all offset {offset}", attempt)
+    if songs:
+        logger.info(f"Fetched {len(songs)} tracks at offset {offset}")
+    return songs or []
+
+
+async def iter_full_tracks(pl_id: str) -> AsyncIterator[List[Track]]:
+    """Yield the playlist's track records in trackIds order, one batch at a time.
+
+    ``track/all`` pages are requested concurrently once the playlist size is
+    known and each batch is released as soon as every earlier track has
+    arrived, so callers can start on the first page while later ones are still
+    in flight. Ids the pages did not cover (NetEase caps some playlists around
+    804 tracks) are then fetched through song/detail chunks.
+    """
+    logger.info(f"Fetching full tracks for playlist {pl_id}")
+
+    # STEP 1: First get the trackIds to understand the true playlist size
+    track_ids, track_count = await _fetch_track_ids(pl_id)
+
+    if not track_count:
+        # Unknown size: page through track/all one request at a time
+        offset = 0
+        while True:
+            page = await _fetch_track_page(pl_id, offset)
+            if page:
+                yield page
+            if len(page) < TRACK_PAGE_SIZE:
+                return
+            offset += TRACK_PAGE_SIZE
+
+    order = [str(track_id(tid)) for tid in track_ids]
+    arrived: Dict[str, Track] = {}
+    given_up = set()
+    cursor = 0
+
+    def take_ready() -> List[Track]:
+        # Release the longest run of playlist positions that is now complete
+        nonlocal cursor
+        batch = []
+        while cursor < len(order) and (order[cursor] in arrived or order[cursor] in given_up):
+            # Kept in ``arrived``: the same id may fill a later position too
+            song = arrived.get(order[cursor])
+            if song is not None:
+                batch.append(song)
+            cursor += 1
+        return batch
+
+    def absorb(songs: List[Track]) -> None:
+        for song in songs:
+            arrived.setdefault(str(song.id), song)
+
+    # STEP 2: Fetch tracks in pages using track/all, all pages at once
+    offsets = list(range(0, track_count, TRACK_PAGE_SIZE))
+    pages = _spawn_bounded([_fetch_track_page(pl_id, offset) for offset in offsets])
+    try:
+        for page in pages:
+            absorb(await page)
+            batch = take_ready()
+            if batch:
+                yield batch
+    finally:
+        for page in pages:
+            page.cancel()
+
+    # STEP 3: Fetch whatever the pages missed by id
+    missing_ids = list(dict.fromkeys(tid for tid in order[cursor:] if tid not in arrived))
+    if missing_ids:
+        logger.info(f"Fetching {len(missing_ids)} missing tracks by IDs")
+        chunks = [missing_ids[i:i+SONG_DETAIL_CHUNK] for i in range(0, len(missing_ids), SONG_DETAIL_CHUNK)]
+        details = _spawn_bounded([
+            _fetch_detail_chunk(chunk, f"Chunk {n+1}/{len(chunks)}") for n, chunk in enumerate(chunks)
+        ])
+        try:
+            for chunk, detail in zip(chunks, details):
+                absorb(await detail)
+                given_up.update(tid for tid in chunk if tid not in arrived)
+                batch = take_ready()
+                if batch:
+                    yield batch
+        finally:
+            for detail in details:
+                detail.cancel()
+
+    # Anything NetEase returned outside trackIds goes last
+    given_up.update(order[cursor:])
+    listed = set(order)
+    batch = take_ready() + [song for tid, song in arrived.items() if tid not in listed]
+    if batch:
+        yield batch
+
+
+async def fetch_full_tracks(pl_id: str) -> List[Track]:
+    """Return the full list of track records from NetEase even for large playlists."""
+    try:
+        tracks: List[Track] = []
+        async for batch in iter_full_tracks(pl_id):
+            tracks.extend(batch)
+        logger.info(f"Total tracks fetched from NetEase API: {len(tracks)}")
+        return tracks
+    except Exception as e:
+        logger.error(f"Error fetching full tracks: {e}")
+        return []
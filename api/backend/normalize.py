@@ -0,0 +1,49 @@
+# Text normalization shared by track search, scoring and cache keys.
+
+import unicodedata
+import re as _re
+from functools import lru_cache
+from typing import List, Iterable
+
+NORMALIZE_CACHE_SIZE = 65536  # Distinct strings memoized per normalizer
+
+# Regex for patterns to remove, compiled once at import
+_PAREN_RE = _re.compile(r"[\[\(（【].*?[\]）】\)]")
+_FEAT_RE = _re.compile(r"\s+(ft\.|feat\.|featuring|with|和|與)\s+.*", _re.IGNORECASE)
+# Remove version markers with expanded patterns
+_VERSION_RE = _re.compile(r"\s+(- )?((Album|Single|Live|Acoustic|Remix|Remaster(ed)?|Version|Edit|Radio Edit|Extended|Original|Official Audio|MV|Cover|翻唱|混音|重制|现场|直播|纯音乐|纯音|伴奏)\s*).*$", _re.IGNORECASE)
+_PUNCT_RE = _re.compile(r"[^\w\s]")
+_SPACE_RE = _re.compile(r"\s+")
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def normalize_text(s: str) -> str:
+    """Normalize text for better matching between NetEase and Spotify tracks."""
+    if not s:
+        return ""
+    s = unicodedata.normalize("NFKD", s)
+    s = _PAREN_RE.sub("", s)
+    s = _FEAT_RE.sub("", s)
+    s = _VERSION_RE.sub("", s)
+    s = _PUNCT_RE.sub("", s)  # Remove punctuation
+    return _SPACE_RE.sub(" ", s).strip().lower()
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def clean_artist_name(name: str) -> str:
+    """Clean artist name for better matching."""
+    if not name:
+        return ""
+    name = unicodedata.normalize("NFKD", name)
+    name = _PUNCT_RE.sub("", name)  # Remove punctuation
+    return _SPACE_RE.sub(" ", name).strip().lower()
+
+
+def normalize_many(strings: Iterable[str]) -> List[str]:
+    """Normalize a batch of titles; repeats are served by the memo cache."""
+    return list(map(normalize_text, strings))
+
+
+def clean_artist_names(names: Iterable[str]) -> List[str]:
+    """Batch counterpart of ``clean_artist_name``."""
+    return list(map(clean_artist_name, names))
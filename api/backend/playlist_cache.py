@@ -0,0 +1,80 @@
+# In-process cache of fully fetched NetEase playlists, shared by playlist-info and transfer.
+
+import os, logging, time
+from collections import OrderedDict
+from typing import List, Dict, Optional, Any, Tuple
+
+from .tracks import Track
+
+logger = logging.getLogger(__name__)
+
+PLAYLIST_CACHE_MAX_TRACKS = int(os.getenv("PLAYLIST_CACHE_MAX_TRACKS", "50000"))
+PLAYLIST_CACHE_FRESH_SECONDS = int(os.getenv("PLAYLIST_CACHE_FRESH_SECONDS", "300"))
+
+
+def playlist_version(playlist: Dict) -> Tuple[Any, Any, Any]:
+    """Return the NetEase fields that change whenever the track list changes."""
+    return playlist.get("trackUpdateTime"), playlist.get("updateTime"), playlist.get("trackCount")
+
+
+class CachedPlaylist:
+    __slots__ = ("playlist", "tracks", "version", "fetched_at")
+
+    def __init__(self, playlist: Dict, tracks: List[Track], version: Tuple[Any, Any, Any]):
+        self.playlist = playlist
+        self.tracks = tracks
+        self.version = version
+        self.fetched_at = time.monotonic()
+
+
+class PlaylistCache:
+    """LRU cache bounded by the total number of tracks held.
+
+    Entries younger than ``fresh_seconds`` are served without contacting NetEase
+    at all; older entries are reused only while the playlist's update markers
+    are unchanged.
+    """
+
+    def __init__(self, max_tracks: int = PLAYLIST_CACHE_MAX_TRACKS, fresh_seconds: int = PLAYLIST_CACHE_FRESH_SECONDS):
+        self.max_tracks = max_tracks
+        self.fresh_seconds = fresh_seconds
+        self._entries: "OrderedDict[str, CachedPlaylist]" = OrderedDict()
+        self._total_tracks = 0
+
+    def get_fresh(self, pid: str) -> Optional[CachedPlaylist]:
+        entry = self._entries.get(pid)
+        if entry is None or time.monotonic() - entry.fetched_at > self.fresh_seconds:
+            return None
+        self._entries.move_to_end(pid)
+        return entry
+
+    def get_valid(self, pid: str, version: Tuple[Any, Any, Any]) -> Optional[CachedPlaylist]:
+        """Return the entry if NetEase reports the same version; revalidation restarts its freshness window."""
+        entry = self._entries.get(pid)
+        if entry is None:
+            return None
+        if entry.version != version or not any(version):
+            self._remove(pid)
+            return None
+        entry.fetched_at = time.monotonic()
+        self._entries.move_to_end(pid)
+        return entry
+
+    def put(self, pid: str, playlist: Dict, tracks: List[Track]) -> None:
+        if len(tracks) > self.max_tracks:
+            return
+        self._remove(pid)
+        self._entries[pid] = CachedPlaylist(playlist, tracks, playlist_version(playlist))
+        self._total_tracks += len(tracks)
+        while self._total_tracks > self.max_tracks:
+            old_pid, _ = next(iter(self._entries.items()))
+            logger.info(f"Playlist cache evicting playlist {old_pid}")
+            self._remove(old_pid)
+
+    def _remove(self, pid: str) -> None:
+        entry = self._entries.pop(pid, None)
+        if entry is not None:
+            self._total_tracks -= len(entry.tracks)
+
+
+playlist_cache = PlaylistCache()
@@ -0,0 +1,124 @@
+# Ordered, chunked insertion of matched tracks into a Spotify playlist while matching is still running.
+
+import asyncio, logging, time
+from collections import deque
+from typing import List, Dict, Optional, Callable, Awaitable, Tuple
+
+import httpx
+
+from .spotify_client import retryable_status
+from .timings import pause, timed
+
+logger = logging.getLogger(__name__)
+
+CHUNK_RETRIES = 3             # Attempts per chunk before it is counted as failed
+
+
+class OrderedChunkWriter:
+    """Collect per-position match results and add them to the playlist in playlist order.
+
+    Results may resolve in any order. A URI is released only once every earlier
+    position is resolved, and each full chunk goes to a single background adder,
+    so chunks are posted in order while later songs are still being matched.
+    ``resolve`` waits while ``max_pending_chunks`` chunks are queued, which keeps
+    matching from running arbitrarily far ahead of a slow playlist endpoint.
+    ``on_added`` receives the chunk number and the playlist positions it held,
+    once Spotify has accepted the chunk. Transport errors, 429s and 5xx responses
+    are retried; any other error response fails the chunk at once.
+    """
+
+    def __init__(self, add: Callable[[List[str]], Awaitable[httpx.Response]], chunk_size: int,
+                 max_pending_chunks: int = 4, on_added: Optional[Callable[[int, List[int]], None]] = None):
+        self._add = add
+        self.chunk_size = chunk_size
+        self.max_pending_chunks = max(1, max_pending_chunks)
+        self._on_added = on_added
+        self._results: Dict[int, Tuple[Optional[str], bool]] = {}
+        self._cursor = 0
+        self._buffer: List[Tuple[int, str]] = []
+        self._chunks: "deque[List[Tuple[int, str]]]" = deque()
+        self._ready = asyncio.Event()
+        self._room = asyncio.Event()
+        self._closed = False
+        self._task: Optional["asyncio.Future"] = None
+        self._started = time.monotonic()
+        self.chunks_total = 0
+        self.chunks_added = 0
+        self.chunk_failures = 0
+        self.uris_added = 0
+        self.first_add_seconds: Optional[float] = None
+
+    def start(self) -> None:
+        self._started = time.monotonic()
+        self._task = asyncio.ensure_future(self._run())
+
+    async def resolve(self, index: int, uri: Optional[str], added: bool = False) -> None:
+        """Record the outcome for one playlist position; ``uri`` is None for a miss.
+
+        ``added`` marks a URI already in the playlist from an earlier attempt; it
+        keeps its place in the order but is not posted again.
+        """
+        self._results[index] = (uri, added)
+        while self._cursor in self._results:
+            found, already_added = self._results.pop(self._cursor)
+            if found and not already_added:
+                self._buffer.append((self._cursor, found))
+            self._cursor += 1
+            if len(self._buffer) >= self.chunk_size:
+                self._queue_chunk()
+        while len(self._chunks) >= self.max_pending_chunks and not self._task.done():
+            self._room.clear()
+            await self._room.wait()
+
+    async def close(self) -> None:
+        """Queue the final partial chunk and wait until every chunk has been posted."""
+        if self._buffer:
+            self._queue_chunk()
+        self._closed = True
+        self._ready.set()
+        await self._task
+
+    def _queue_chunk(self) -> None:
+        self._chunks.append(self._buffer[:self.chunk_size])
+        self._buffer = self._buffer[self.chunk_size:]
+        self.chunks_total += 1
+        self._ready.set()
+
+    async def _run(self) -> None:
+        index = 0
+        while True:
+            while not self._chunks:
+                if self._closed:
+                    return
+                await self._ready.wait()
+                self._ready.clear()
+            chunk = self._chunks.popleft()
+            self._room.set()
+            with timed("add"):
+                await self._post(index, chunk)
+            index += 1
+
+    async def _post(self, index: int, chunk: List[Tuple[int, str]]) -> None:
+        for attempt in range(1, CHUNK_RETRIES + 1):
+            try:
+                resp = await self._add([uri for _, uri in chunk])
+                resp.raise_for_status()
+            except Exception as chunk_error:
+                if isinstance(chunk_error, httpx.HTTPStatusError) and not retryable_status(chunk_error.response.status_code):
+                    logger.error(f"Spotify rejected chunk {index+1}, not retrying: {chunk_error}")
+                    self.chunk_failures += 1
+                    return
+                logger.warning(f"Error adding chunk {index+1}, retry {attempt}/{CHUNK_RETRIES}: {chunk_error}")
+                # Backoff delay
+                await pause(2 ** attempt)
+                continue
+            self.chunks_added += 1
+            self.uris_added += len(chunk)
+            if self.first_add_seconds is None:
+                self.first_add_seconds = round(time.monotonic() - self._started, 2)
+            logger.info(f"Added chunk {index+1} ({len(chunk)} tracks)")
+            if self._on_added:
+                self._on_added(index, [position for position, _ in chunk])
+            return
+        logger.error(f"Failed to add chunk {index+1} after {CHUNK_RETRIES} retries")
+        self.chunk_failures += 1
@@ -0,0 +1,66 @@
+# Opt-in cProfile capture of single requests, kept in memory for download.
+
+import os, cProfile, logging, marshal, threading, uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ALLOW_PROFILING = os.getenv("ALLOW_PROFILING", "0").lower() in ("1", "true", "yes")  # Admin switch for ?profile requests
+MAX_PROFILES = int(os.getenv("MAX_PROFILES", "20"))                                  # Captured profiles kept for download
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profile is requested while another one is being captured."""
+
+
+class ProfileStore:
+    """Capture one profile at a time and keep the most recent ones.
+
+    cProfile follows the event loop thread, so a capture also sees whatever
+    other requests run while it is enabled; profile on a quiet worker. Each
+    profile is stored in the marshalled ``pstats`` format, readable with
+    ``python -m pstats`` or snakeviz.
+    """
+
+    def __init__(self, max_profiles: int = MAX_PROFILES):
+        self.max_profiles = max(1, max_profiles)
+        self._profiles: "OrderedDict[str, Tuple[str, bytes]]" = OrderedDict()
+        self._capturing = threading.Lock()
+
+    @property
+    def busy(self) -> bool:
+        return self._capturing.locked()
+
+    @contextmanager
+    def capture(self, label: str) -> Iterator[str]:
+        """Profile the block and yield the id its profile will be stored under."""
+        if not self._capturing.acquire(blocking=False):
+            raise ProfilerBusy("another request is being profiled")
+        profile_id = uuid.uuid4().hex
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            try:
+                yield profile_id
+            finally:
+                profiler.disable()
+        finally:
+            self._capturing.release()
+            profiler.create_stats()
+            self._profiles[profile_id] = (label, marshal.dumps(profiler.stats))
+            while len(self._profiles) > self.max_profiles:
+                self._profiles.popitem(last=False)
+            logger.info(f"Captured profile {profile_id} for {label}")
+
+    def get(self, profile_id: str) -> Optional[Tuple[str, bytes]]:
+        """Return ``(label, pstats bytes)`` for a stored profile."""
+        return self._profiles.get(profile_id)
+
+
+profile_store = ProfileStore()
+
+
+def profile_url(profile_id: str) -> str:
+    return f"/api/profiles/{profile_id}"
@@ -0,0 +1,165 @@
+# Search query planning: build, deduplicate and order the per-song Spotify searches.
+
+import os, asyncio, logging
+from typing import List, Dict, Optional, Any, Callable, Awaitable
+
+from .metrics import MATCHES
+from .normalize import normalize_text, clean_artist_name
+from .scoring import find_best_match, find_best_artist_match, find_best_match_by_duration
+
+logger = logging.getLogger(__name__)
+
+# Leading planned searches issued at once; 1 keeps the cheapest one-request-at-a-time behaviour
+SEARCH_PARALLELISM = max(1, int(os.getenv("SEARCH_PARALLELISM", "1")))
+STRATEGY_PRIOR_WEIGHT = 20    # Pseudo-attempts backing each strategy's default rank
+
+# Default rank of each strategy, expressed as a prior hit rate; observed hits take over as they accumulate
+STRATEGY_PRIORS = {
+    "exact": 0.60,            # Strategy 1: track:"name" artist:"primary"
+    "normalized": 0.50,       # Strategy 2: normalized title and primary artist
+    "title_only": 0.40,       # Strategy 3: track:"name", choose by artist similarity
+    "other_artist": 0.30,     # Strategy 4: track:"name" with each secondary artist
+    "general": 0.20,          # Strategy 5: free-text title and primary artist
+}
+
+
+class SearchStep:
+    __slots__ = ("strategy", "query", "limit", "selector")
+
+    def __init__(self, strategy: str, query: str, limit: int, selector: str):
+        self.strategy = strategy
+        self.query = query
+        self.limit = limit
+        self.selector = selector
+
+
+def plan_searches(track_name: str, artists: List[str]) -> List[SearchStep]:
+    """Build the candidate searches for one song, dropping any that repeat an earlier one.
+
+    Spotify search is case-insensitive, so queries are compared case-folded; a
+    secondary artist that cleans to an artist already searched adds nothing.
+    """
+    primary_artist = artists[0]
+    steps = [SearchStep("exact", f'track:"{track_name}" artist:"{primary_artist}"', 5, "duration")]
+
+    normalized_track = normalize_text(track_name)
+    normalized_artist = clean_artist_name(primary_artist)
+    if normalized_track and normalized_artist:
+        steps.append(SearchStep("normalized", f'track:"{normalized_track}" artist:"{normalized_artist}"', 5, "duration"))
+
+    steps.append(SearchStep("title_only", f'track:"{track_name}"', 20, "artist"))
+
+    searched_artists = {normalized_artist}
+    for artist in artists[1:]:
+        cleaned = clean_artist_name(artist)
+        if cleaned in searched_artists:
+            continue
+        searched_artists.add(cleaned)
+        steps.append(SearchStep("other_artist", f'track:"{track_name}" artist:"{artist}"', 5, "duration"))
+
+    steps.append(SearchStep("general", f'{track_name} {primary_artist}', 20, "fuzzy"))
+
+    unique = []
+    seen = set()
+    for step in steps:
+        key = (step.query.casefold(), step.selector)
+        if key in seen:
+            search_stats.deduplicated += 1
+            continue
+        seen.add(key)
+        unique.append(step)
+    return unique
+
+
+class StrategyStats:
+    """Runtime hit rates per strategy, used to put the most productive searches first."""
+
+    def __init__(self):
+        self.attempts: Dict[str, int] = {name: 0 for name in STRATEGY_PRIORS}
+        self.hits: Dict[str, int] = {name: 0 for name in STRATEGY_PRIORS}
+        self.deduplicated = 0
+
+    def hit_rate(self, strategy: str) -> float:
+        prior = STRATEGY_PRIORS[strategy]
+        return (self.hits[strategy] + prior * STRATEGY_PRIOR_WEIGHT) / (self.attempts[strategy] + STRATEGY_PRIOR_WEIGHT)
+
+    def order(self, steps: List[SearchStep]) -> List[SearchStep]:
+        # Stable sort keeps planning order among steps of the same strategy
+        return sorted(steps, key=lambda step: -self.hit_rate(step.strategy))
+
+    def record(self, strategy: str, hit: bool) -> None:
+        self.attempts[strategy] += 1
+        if hit:
+            self.hits[strategy] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "strategies": {
+                name: {
+                    "attempts": self.attempts[name],
+                    "hits": self.hits[name],
+                    "hit_rate": round(self.hit_rate(name), 3),
+                }
+                for name in STRATEGY_PRIORS
+            },
+            "order": sorted(STRATEGY_PRIORS, key=lambda name: -self.hit_rate(name)),
+            "deduplicated_queries": self.deduplicated,
+            "parallelism": SEARCH_PARALLELISM,
+        }
+
+
+search_stats = StrategyStats()
+
+
+def select_match(step: SearchStep, items: List[Dict[str, Any]], track_name: str, artists: List[str],
+                 duration_ms: int) -> Optional[Dict[str, Any]]:
+    if not items:
+        return None
+    if step.selector == "duration":
+        # Sort results by most similar duration and confidence
+        return find_best_match_by_duration(items, duration_ms)
+    if step.selector == "artist":
+        # Find the track with most similar artist name
+        return find_best_artist_match(items, artists, track_name)
+    # Use advanced fuzzy matching to find the best match
+    return find_best_match(items, track_name, artists)
+
+
+async def execute_plan(steps: List[SearchStep], search: Callable[[str, int], Awaitable[List[Dict[str, Any]]]],
+                       track_name: str, artists: List[str], duration_ms: int) -> Optional[str]:
+    """Run planned searches best-first and return the first acceptable URI.
+
+    The first ``SEARCH_PARALLELISM`` steps are issued together and whichever
+    acceptable match arrives first wins; the rest run one at a time.
+    """
+
+    async def run(step: SearchStep) -> Optional[str]:
+        items = await search(step.query, step.limit)
+        best = select_match(step, items, track_name, artists, duration_ms)
+        search_stats.record(step.strategy, best is not None)
+        if not best:
+            return None
+        MATCHES.inc(step.strategy)
+        return best["uri"]
+
+    ordered = search_stats.order(steps)
+    lead, rest = ordered[:SEARCH_PARALLELISM], ordered[SEARCH_PARALLELISM:]
+
+    if len(lead) > 1:
+        tasks = [asyncio.ensure_future(run(step)) for step in lead]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                uri = await next_done
+                if uri:
+                    return uri
+        finally:
+            for task in tasks:
+                task.cancel()
+    else:
+        rest = ordered
+
+    for step in rest:
+        uri = await run(step)
+        if uri:
+            return uri
+    return None
@@ -0,0 +1,156 @@
+# Bounded-concurrency scheduling and adaptive pacing for Spotify API calls.
+
+import asyncio, logging, time
+from typing import List, Dict, Optional, Any, Callable, Awaitable, Sequence, Tuple, TypeVar, AsyncIterator
+
+from .timings import pause
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class RateController:
+    """Shared pacing state for one upstream API.
+
+    Spacing between request starts shrinks multiplicatively while calls succeed
+    and doubles when the upstream throttles us. A 429 with ``Retry-After`` also
+    pauses every caller until the advertised time has passed.
+    """
+
+    def __init__(self, min_delay: float = 0.0, max_delay: float = 2.0, initial_delay: float = 0.05):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.delay = initial_delay
+        self._next_slot = 0.0
+        self._paused_until = 0.0
+        self.throttled = 0
+        self.paused_seconds = 0.0
+
+    async def acquire(self) -> None:
+        """Wait for a global pause to end and for this caller's pacing slot."""
+        now = time.monotonic()
+        if self._paused_until > now:
+            await pause(self._paused_until - now)
+            now = time.monotonic()
+
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self.delay
+        if slot > now:
+            await pause(slot - now)
+
+    def on_success(self) -> None:
+        self.delay = max(self.min_delay, self.delay * 0.9)
+        if self.delay < 0.001:
+            self.delay = self.min_delay
+
+    def on_throttle(self, retry_after: Optional[float]) -> float:
+        """Record a 429 and return how long the caller should wait before retrying."""
+        self.throttled += 1
+        self.delay = min(self.max_delay, max(self.delay * 2, 0.05))
+
+        wait = retry_after if retry_after and retry_after > 0 else 1.0
+        resume_at = time.monotonic() + wait
+        if resume_at > self._paused_until:
+            self.paused_seconds += resume_at - max(self._paused_until, time.monotonic())
+            self._paused_until = resume_at
+        logger.warning(f"Throttled by upstream, pausing all requests for {wait:.1f}s (pacing delay now {self.delay:.3f}s)")
+        return wait
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given in seconds; HTTP-date values are ignored."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+class MatchScheduler:
+    """Run an async worker over a sequence with at most ``concurrency`` calls in flight.
+
+    Results are returned in input order together with throughput statistics.
+    """
+
+    def __init__(self, concurrency: int, rate: Optional[RateController] = None):
+        self.concurrency = max(1, concurrency)
+        self.rate = rate
+        self.stats: Dict[str, Any] = {}
+
+    async def run(self, items: Sequence[T], worker: Callable[[int, T], Awaitable[R]]) -> List[R]:
+        results: List[Any] = [None] * len(items)
+        next_index = 0
+        throttled_before = self.rate.throttled if self.rate else 0
+        started = time.monotonic()
+
+        async def drain():
+            nonlocal next_index
+            while next_index < len(items):
+                idx = next_index
+                next_index += 1
+                results[idx] = await worker(idx, items[idx])
+
+        await asyncio.gather(*(drain() for _ in range(min(self.concurrency, len(items)))))
+        self._record_stats(len(items), started, throttled_before)
+        return results
+
+    async def run_stream(self, batches: AsyncIterator[Sequence[T]], worker: Callable[[int, T], Awaitable[Any]],
+                         queue_size: int) -> int:
+        """Run ``worker`` over items arriving from an async source of batches.
+
+        Workers start on the first batch instead of waiting for the whole input.
+        Items pass through a bounded queue, so a fast producer waits for the
+        workers rather than buffering everything. Results are left to the
+        worker; returns the number of items processed. If the source fails,
+        items already queued are still processed before its error is raised.
+        """
+        queue: "asyncio.Queue[Optional[Tuple[int, T]]]" = asyncio.Queue(maxsize=max(1, queue_size))
+        count = 0
+        throttled_before = self.rate.throttled if self.rate else 0
+        started = time.monotonic()
+
+        source_error: Optional[BaseException] = None
+
+        async def produce():
+            nonlocal count, source_error
+            try:
+                async for batch in batches:
+                    for item in batch:
+                        await queue.put((count, item))
+                        count += 1
+            except Exception as exc:
+                # Stop intake but let the items already queued finish; the error is raised afterwards
+                source_error = exc
+            for _ in range(self.concurrency):
+                await queue.put(None)
+
+        async def drain():
+            while True:
+                entry = await queue.get()
+                if entry is None:
+                    return
+                await worker(*entry)
+
+        tasks = [asyncio.ensure_future(produce())] + [asyncio.ensure_future(drain()) for _ in range(self.concurrency)]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        self._record_stats(count, started, throttled_before)
+        if source_error is not None:
+            raise source_error
+        return count
+
+    def _record_stats(self, count: int, started: float, throttled_before: int) -> None:
+        elapsed = time.monotonic() - started
+        self.stats = {
+            "concurrency": self.concurrency,
+            "tracks": count,
+            "elapsed_seconds": round(elapsed, 2),
+            "tracks_per_second": round(count / elapsed, 2) if elapsed > 0 else float(count),
+            "throttled_responses": (self.rate.throttled if self.rate else 0) - throttled_before,
+        }
@@ -0,0 +1,112 @@
+# Batched candidate scoring for Spotify search results.
+
+from typing import List, Dict, Optional, Any, Tuple
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+from .normalize import normalize_text, normalize_many, clean_artist_names
+
+MATCH_THRESHOLD = 65          # Threshold for fuzzy matching percentage
+DURATION_TOLERANCE_MS = 10000 # Duration difference still accepted as the same recording
+
+
+def _similarity(queries: List[str], choices: List[str]) -> np.ndarray:
+    # float64 keeps the scores bit-identical to scalar fuzz.ratio calls
+    return process.cdist(queries, choices, scorer=fuzz.ratio, dtype=np.float64)
+
+
+def _candidate_artists(items: List[Dict[str, Any]]) -> Tuple[List[str], np.ndarray]:
+    """Every candidate's cleaned artist names flattened into one list, plus per-candidate counts."""
+    artist_lists = [item.get("artists") or () for item in items]
+    counts = np.fromiter(map(len, artist_lists), np.intp, len(items))
+    return clean_artist_names([a.get("name", "") for artists in artist_lists for a in artists]), counts
+
+
+def _fold_artist_scores(block: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Reduce a (query artists x flattened candidate artists) block to one best score per candidate.
+
+    Candidates without artists score 0; skipping their empty segments lets each
+    remaining start run up to the next one in ``reduceat``.
+    """
+    scores = np.zeros(len(counts))
+    present = counts > 0
+    starts = np.cumsum(counts) - counts
+    scores[present] = np.maximum.reduceat(block.max(axis=0), starts[present])
+    return scores
+
+
+def _pick(combined: np.ndarray, eligible: np.ndarray, items: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    # argmax returns the first maximum, matching the original "strictly better" loop on ties
+    best = int(np.where(eligible, combined, -np.inf).argmax())
+    return items[best] if eligible[best] else None
+
+
+def find_best_match_by_duration(items, target_duration):
+    """Find the best match from items based on duration similarity.
+
+    Result sets hold at most 20 items, where one scalar pass is cheaper than
+    building arrays, so this ranking deliberately stays a plain loop.
+    """
+    best_item = None
+    best_diff = float('inf')
+
+    for item in items:
+        if item.get("duration_ms"):
+            diff = abs(item["duration_ms"] - target_duration)
+            if diff < best_diff:
+                best_diff = diff
+                best_item = item
+
+    # If the best match has duration difference less than 10 seconds
+    if best_item and best_diff < DURATION_TOLERANCE_MS:
+        return best_item
+
+    # Otherwise return the first item
+    return items[0] if items else None
+
+
+def find_best_artist_match(items, artists, track_name):
+    """Find the item with the best artist match for given artists."""
+    if not items:
+        return None
+
+    names = normalize_many([item.get("name", "") for item in items])
+    name_scores = _similarity([normalize_text(track_name)], names)[0]
+
+    # Only consider if track name is reasonably similar
+    close = np.flatnonzero(name_scores >= 80)
+    if not len(close):
+        return None
+
+    candidates = [items[i] for i in close]
+    combined = name_scores[close] * 0.8
+    flat, counts = _candidate_artists(candidates)
+    query_artists = clean_artist_names(artists)
+    if query_artists and flat:
+        # Calculate combined score, heavily favoring track name match
+        combined += _fold_artist_scores(_similarity(query_artists, flat), counts) * 0.2
+
+    return _pick(combined, combined > MATCH_THRESHOLD, candidates)
+
+
+def find_best_match(items, track_name, artists):
+    """Find the best match using fuzzy matching on both track name and artists."""
+    if not items:
+        return None
+
+    n = len(items)
+    names = [item.get("name", "") for item in items]
+    flat, counts = _candidate_artists(items)
+    query_artists = clean_artist_names(artists)
+
+    # One cdist call scores the title row and the artist block together
+    matrix = _similarity([normalize_text(track_name)] + query_artists, normalize_many(names) + flat)
+
+    # Weight name more heavily than artist for matching
+    combined = matrix[0, :n] * 0.7
+    if query_artists and flat:
+        combined += _fold_artist_scores(matrix[1:, n:], counts) * 0.3
+
+    eligible = np.fromiter(map(bool, names), bool, n) & (combined > MATCH_THRESHOLD)
+    return _pick(combined, eligible, items)
@@ -0,0 +1,316 @@
+# Async Spotify Web API client shared by every transfer running in this worker.
+
+import os, asyncio, logging, random, time
+from typing import List, Dict, Optional, Any
+
+import httpx
+
+from .metrics import TOKEN_REFRESHES, UPSTREAM_RETRIES, observe_upstream
+from .scheduler import RateController, parse_retry_after
+from .timings import pause
+
+logger = logging.getLogger(__name__)
+
+SPOTIFY_API_URL = os.getenv("SPOTIFY_API_BASE_URL", "https://api.spotify.com/v1").rstrip("/")
+SPOTIFY_ACCOUNTS_URL = os.getenv("SPOTIFY_ACCOUNTS_BASE_URL", "https://accounts.spotify.com").rstrip("/")
+MAX_RETRIES = 5               # Maximum number of retries for API requests
+MAX_THROTTLE_RETRIES = 10     # Maximum number of 429 responses tolerated for one request
+TOKEN_REFRESH_MARGIN = int(os.getenv("TOKEN_REFRESH_MARGIN", "120"))  # Seconds before expiry an access token is renewed
+
+# Spotify rate-limits per application, so every transfer in this worker shares one controller
+spotify_rate = RateController()
+
+# HTTP/2 needs the optional "h2" package; fall back to pooled HTTP/1.1 keep-alive without it
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the process-wide pooled AsyncClient, creating it on first use."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            timeout=httpx.Timeout(30.0, connect=10.0),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30.0),
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    global _http_client
+    if _http_client is not None and not _http_client.is_closed:
+        await _http_client.aclose()
+    _http_client = None
+
+
+def retryable_status(status: int) -> bool:
+    """Whether a failed response may succeed if sent again: throttling or a server error, not a rejection."""
+    return status == 429 or status >= 500
+
+
+async def retry_request(method: str, url: str, rate: Optional[RateController] = None,
+                        service: str = "spotify", endpoint: str = "other", **kwargs) -> httpx.Response:
+    """Send a request on the shared client, retrying transport errors with async exponential backoff.
+
+    When a rate controller is given, every attempt waits for its pacing slot and
+    429 responses pause all of its callers for the ``Retry-After`` period.
+    ``service`` and ``endpoint`` label the attempt in the upstream metrics.
+    """
+    retries = 0
+    throttles = 0
+    while True:
+        if rate:
+            await rate.acquire()
+        start = time.perf_counter()
+        try:
+            resp = await get_http_client().request(method, url, **kwargs)
+        except httpx.TransportError as e:
+            observe_upstream(service, method, endpoint, time.perf_counter() - start)
+            retries += 1
+            if retries == MAX_RETRIES:
+                logger.error(f"Max retries reached for request: {e}")
+                raise
+            UPSTREAM_RETRIES.inc(service, "transport")
+
+            # Calculate backoff time: 2^retries + random jitter
+            backoff_time = (2 ** retries) + random.uniform(0, 1)
+            logger.info(f"Request failed, retrying in {backoff_time:.2f} seconds...")
+            await pause(backoff_time)
+            continue
+        observe_upstream(service, method, endpoint, time.perf_counter() - start, resp.status_code)
+
+        if rate is None:
+            return resp
+        if resp.status_code == 429 and throttles < MAX_THROTTLE_RETRIES:
+            throttles += 1
+            UPSTREAM_RETRIES.inc(service, "throttled")
+            await pause(rate.on_throttle(parse_retry_after(resp.headers.get("Retry-After"))))
+            continue
+        # Throttled or failing responses must not speed up the shared pacing
+        if resp.status_code < 400:
+            rate.on_success()
+        return resp
+
+
+def spotify_headers(token: str) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {token}"}
+
+
+def endpoint_name(path: str) -> str:
+    """Metrics label for a Web API path, ids dropped: ``/playlists/{id}/tracks`` -> ``playlists/tracks``."""
+    return "/".join(path.strip("/").split("/")[::2])
+
+
+async def refresh_access_token(refresh_token: str) -> Dict[str, Any]:
+    """Exchange a refresh token for a new access token, as ``/spotify/refresh`` does for the frontend.
+
+    Returns Spotify's token response; raises ``httpx.HTTPStatusError`` when the
+    refresh token is refused.
+    """
+    resp = await retry_request(
+        "POST",
+        f"{SPOTIFY_ACCOUNTS_URL}/api/token",
+        endpoint="token",
+        data={
+            "grant_type": "refresh_token",
+            "refresh_token": refresh_token,
+            "client_id": os.getenv("SPOTIFY_CLIENT_ID"),
+            "client_secret": os.getenv("SPOTIFY_CLIENT_SECRET"),
+        },
+    )
+    resp.raise_for_status()
+    return resp.json()
+
+
+class TokenManager:
+    """The access token of one transfer, renewed in place when a refresh token is known.
+
+    The token is refreshed ahead of ``expires_at`` (Unix time), and once more
+    whenever Spotify answers 401, so an expiry in the middle of a long transfer
+    costs one token request instead of failed searches and chunk retries.
+    """
+
+    def __init__(self, access_token: str, refresh_token: Optional[str] = None, expires_at: Optional[float] = None):
+        self.access_token = access_token
+        self.refresh_token = refresh_token
+        self.expires_at = expires_at
+        self.refreshes = 0
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def token(self) -> str:
+        """The current access token, refreshed first if it is about to expire."""
+        if self.refresh_token and self.expires_at and time.time() >= self.expires_at - TOKEN_REFRESH_MARGIN:
+            await self.refresh(self.access_token, "expiry")
+        return self.access_token
+
+    async def refresh(self, stale_token: str, reason: str = "unauthorized") -> bool:
+        """Replace ``stale_token``; return whether a newer token is now available.
+
+        Callers that saw the same stale token share one refresh request.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self.access_token != stale_token:
+                return True
+            if not self.refresh_token:
+                return False
+            try:
+                data = await refresh_access_token(self.refresh_token)
+            except httpx.HTTPError as e:
+                logger.error(f"Could not refresh the Spotify access token: {e}")
+                # Don't try again before the next 401, which then fails like any other
+                self.expires_at = None
+                return False
+            self.access_token = data["access_token"]
+            self.refresh_token = data.get("refresh_token") or self.refresh_token
+            self.expires_at = time.time() + data["expires_in"] if data.get("expires_in") else None
+            self.refreshes += 1
+            TOKEN_REFRESHES.inc(reason)
+            logger.info(f"Refreshed the Spotify access token ({reason})")
+            return True
+
+
+class SpotifyClient:
+    """Thin per-token wrapper around the shared connection pool.
+
+    Creating one is cheap; every instance reuses the same keep-alive connections,
+    so concurrent transfers in one worker never block each other. Given a
+    refresh token, the client keeps its access token valid on its own.
+    """
+
+    def __init__(self, token: str, refresh_token: Optional[str] = None, expires_at: Optional[float] = None):
+        self.auth = TokenManager(token, refresh_token, expires_at)
+
+    @property
+    def token(self) -> str:
+        return self.auth.access_token
+
+    def _headers(self, token: str, extra: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        headers = spotify_headers(token)
+        if extra:
+            headers.update(extra)
+        return headers
+
+    async def request(self, method: str, path: str, headers: Optional[Dict[str, str]] = None, **kwargs) -> httpx.Response:
+        url = f"{SPOTIFY_API_URL}{path}"
+        token = await self.auth.token()
+        resp = await retry_request(method, url, rate=spotify_rate, endpoint=endpoint_name(path),
+                                   headers=self._headers(token, headers), **kwargs)
+        # An expired token is refreshed once and the call replayed, instead of failing up to the caller
+        if resp.status_code == 401 and await self.auth.refresh(token):
+            resp = await retry_request(method, url, rate=spotify_rate, endpoint=endpoint_name(path),
+                                       headers=self._headers(self.auth.access_token, headers), **kwargs)
+        return resp
+
+    async def me(self) -> httpx.Response:
+        return await self.request("GET", "/me")
+
+    async def create_playlist(self, user_id: str, name: str, description: str, public: bool = False) -> httpx.Response:
+        return await self.request(
+            "POST",
+            f"/users/{user_id}/playlists",
+            json={"name": name, "public": public, "description": description, "collaborative": False},
+        )
+
+    async def search_tracks(self, query: str, limit: int) -> List[Dict[str, Any]]:
+        """Run a track search and return the raw result items.
+
+        Auth, throttling and server errors raise so that an expired token, a rate
+        limit or an outage is never mistaken for "no match"; a rejected query
+        simply yields no items.
+        """
+        return await self._search(query, "track", limit)
+
+    async def search_albums(self, query: str, limit: int) -> List[Dict[str, Any]]:
+        """Album counterpart of ``search_tracks``, with the same error handling."""
+        return await self._search(query, "album", limit)
+
+    async def _search(self, query: str, kind: str, limit: int) -> List[Dict[str, Any]]:
+        resp = await self.request("GET", "/search", params={"q": query, "type": kind, "limit": limit})
+        if resp.status_code in (401, 403, 429) or resp.status_code >= 500:
+            resp.raise_for_status()
+        return resp.json().get(f"{kind}s", {}).get("items", [])
+
+    async def album_tracks(self, album_id: str) -> List[Dict[str, Any]]:
+        """Return every track of an album; one request covers albums of up to 50 tracks."""
+        tracks: List[Dict[str, Any]] = []
+        params = {"limit": 50, "offset": 0}
+        while True:
+            resp = await self.request("GET", f"/albums/{album_id}/tracks", params=params)
+            resp.raise_for_status()
+            data = resp.json()
+            tracks.extend(data.get("items", []))
+            if not data.get("next"):
+                return tracks
+            params["offset"] += 50
+
+    async def search_artists(self, query: str, limit: int) -> List[Dict[str, Any]]:
+        return await self._search(query, "artist", limit)
+
+    async def artist_album_ids(self, artist_id: str, max_albums: int) -> List[str]:
+        """Return up to ``max_albums`` ids of an artist's albums, singles and compilations."""
+        ids: List[str] = []
+        params = {"include_groups": "album,single,compilation", "market": "from_token", "limit": 50, "offset": 0}
+        while len(ids) < max_albums:
+            resp = await self.request("GET", f"/artists/{artist_id}/albums", params=params)
+            resp.raise_for_status()
+            data = resp.json()
+            ids.extend(item["id"] for item in data.get("items", []) if item.get("id"))
+            if not data.get("next"):
+                break
+            params["offset"] += 50
+        return ids[:max_albums]
+
+    async def albums(self, album_ids: List[str]) -> List[Dict[str, Any]]:
+        """Fetch full albums, their first 50 tracks included, 20 per request."""
+        albums: List[Dict[str, Any]] = []
+        for i in range(0, len(album_ids), 20):
+            resp = await self.request("GET", "/albums", params={"ids": ",".join(album_ids[i:i+20]), "market": "from_token"})
+            resp.raise_for_status()
+            albums.extend(album for album in resp.json().get("albums", []) if album)
+        return albums
+
+    async def add_tracks(self, playlist_id: str, uris: List[str]) -> httpx.Response:
+        return await self.request("POST", f"/playlists/{playlist_id}/tracks", json={"uris": uris})
+
+    async def remove_tracks(self, playlist_id: str, uris: List[str]) -> httpx.Response:
+        """Remove every occurrence of the given URIs (at most 100 per call) from a playlist."""
+        return await self.request("DELETE", f"/playlists/{playlist_id}/tracks", json={"tracks": [{"uri": uri} for uri in uris]})
+
+    async def get_playlist(self, playlist_id: str) -> httpx.Response:
+        return await self.request("GET", f"/playlists/{playlist_id}", params={"fields": "id,name"})
+
+    async def playlist_track_uris(self, playlist_id: str) -> List[str]:
+        """Return the URIs currently in a playlist, following pagination."""
+        uris: List[str] = []
+        params = {"fields": "items(track(uri)),next", "limit": 100, "offset": 0}
+        while True:
+            resp = await self.request("GET", f"/playlists/{playlist_id}/tracks", params=params)
+            resp.raise_for_status()
+            data = resp.json()
+            uris.extend(item["track"]["uri"] for item in data.get("items", []) if (item.get("track") or {}).get("uri"))
+            if not data.get("next"):
+                return uris
+            params["offset"] += 100
+
+    async def upload_cover(self, playlist_id: str, encoded_jpeg: str) -> httpx.Response:
+        return await self.request(
+            "PUT",
+            f"/playlists/{playlist_id}/images",
+            content=encoded_jpeg,
+            headers={"Content-Type": "image/jpeg"},
+        )
+
+
+async def fetch_bytes(url: str) -> bytes:
+    """Download an arbitrary resource (e.g. a cover image) through the shared pool; error statuses raise."""
+    resp = await retry_request("GET", url, service="cover", endpoint="image", follow_redirects=True)
+    resp.raise_for_status()
+    return resp.content
@@ -0,0 +1,93 @@
+# Recorded NetEase song -> Spotify URI mapping of every synced playlist, the baseline for incremental syncs.
+
+import os, logging, sqlite3, tempfile, threading, time
+from typing import Dict, Optional, Iterable, Tuple
+
+logger = logging.getLogger(__name__)
+
+SYNC_STORE_PATH = os.getenv("SYNC_STORE_PATH", os.path.join(tempfile.gettempdir(), "netify_sync.sqlite3"))
+
+
+class SyncStore:
+    """One row per (Spotify playlist, NetEase song) as of the last transfer or sync.
+
+    A stored ``None`` URI records a song that had no Spotify match, so a later
+    sync does not search for it again while it stays in the playlist.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # Worker processes share the file; callers run these methods in a thread, so waiting is safe
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS synced_playlists ("
+            " sp_pl_id TEXT PRIMARY KEY, source_pid TEXT NOT NULL, synced_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sync_mappings ("
+            " sp_pl_id TEXT NOT NULL, song_id TEXT NOT NULL, uri TEXT,"
+            " PRIMARY KEY (sp_pl_id, song_id)) WITHOUT ROWID"
+        )
+
+    def load(self, sp_pl_id: str) -> Tuple[Optional[str], Dict[str, Optional[str]]]:
+        """Return ``(source_pid, {song_id: uri})`` recorded for a Spotify playlist."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT source_pid FROM synced_playlists WHERE sp_pl_id = ?", (sp_pl_id,)
+            ).fetchone()
+            if row is None:
+                return None, {}
+            mapping = dict(self._conn.execute(
+                "SELECT song_id, uri FROM sync_mappings WHERE sp_pl_id = ?", (sp_pl_id,)
+            ).fetchall())
+        return row[0], mapping
+
+    def apply(self, sp_pl_id: str, source_pid: str, added: Dict[str, Optional[str]],
+              removed: Iterable[str], replace: bool = False) -> None:
+        """Record a diff; ``replace`` drops any previous mapping first (a full transfer or first sync)."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO synced_playlists (sp_pl_id, source_pid, synced_at) VALUES (?, ?, ?)",
+                    (sp_pl_id, source_pid, time.time()),
+                )
+                if replace:
+                    self._conn.execute("DELETE FROM sync_mappings WHERE sp_pl_id = ?", (sp_pl_id,))
+                else:
+                    self._conn.executemany(
+                        "DELETE FROM sync_mappings WHERE sp_pl_id = ? AND song_id = ?",
+                        [(sp_pl_id, song_id) for song_id in removed],
+                    )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO sync_mappings (sp_pl_id, song_id, uri) VALUES (?, ?, ?)",
+                    [(sp_pl_id, song_id, uri) for song_id, uri in added.items()],
+                )
+                self._conn.execute("COMMIT")
+            except sqlite3.Error:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def forget(self, sp_pl_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM sync_mappings WHERE sp_pl_id = ?", (sp_pl_id,))
+            self._conn.execute("DELETE FROM synced_playlists WHERE sp_pl_id = ?", (sp_pl_id,))
+
+
+_sync_store: Optional[SyncStore] = None
+_sync_store_failed = False
+
+
+def get_sync_store() -> Optional[SyncStore]:
+    """Open the shared store on first use; returns None if the database cannot be opened."""
+    global _sync_store, _sync_store_failed
+    if _sync_store is None and not _sync_store_failed:
+        try:
+            _sync_store = SyncStore(SYNC_STORE_PATH)
+        except sqlite3.Error as e:
+            logger.error(f"Sync mappings disabled, could not open {SYNC_STORE_PATH}: {e}")
+            _sync_store_failed = True
+    return _sync_store
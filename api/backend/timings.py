@@ -0,0 +1,108 @@
+# Per-request timing breakdown: sequential phases plus time spent in overlapping activities.
+
+import asyncio, time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+
+_current: "ContextVar[Optional[PhaseTimer]]" = ContextVar("netify_phase_timer", default=None)
+
+
+class PhaseTimer:
+    """Wall-clock phase durations and cumulative activity times for one request or job.
+
+    Phases are sequential, each one ends when the next starts. Activities
+    (upstream requests, searches, chunk adds, sleeps) overlap with each other
+    and with the phases, so their totals can add up to more than the wall time.
+    """
+
+    def __init__(self):
+        self._started = time.perf_counter()
+        self._phase: Optional[str] = None
+        self._phase_started = self._started
+        self._finished: Optional[float] = None
+        self.phases: Dict[str, float] = {}
+        self.activities: Dict[str, float] = {}
+
+    def phase(self, name: str) -> None:
+        now = time.perf_counter()
+        self._close_phase(now)
+        self._phase = name
+        self._phase_started = now
+
+    def add(self, activity: str, seconds: float) -> None:
+        self.activities[activity] = self.activities.get(activity, 0.0) + seconds
+
+    def finish(self) -> None:
+        if self._finished is None:
+            self._finished = time.perf_counter()
+            self._close_phase(self._finished)
+            self._phase = None
+
+    def _close_phase(self, now: float) -> None:
+        if self._phase is not None:
+            self.phases[self._phase] = self.phases.get(self._phase, 0.0) + now - self._phase_started
+
+    def total(self) -> float:
+        return (self._finished or time.perf_counter()) - self._started
+
+    def to_dict(self) -> Dict[str, Dict[str, float]]:
+        """Milliseconds per phase and per activity, with the total wall time."""
+        phases = dict(self.phases)
+        if self._phase is not None:
+            phases[self._phase] = phases.get(self._phase, 0.0) + time.perf_counter() - self._phase_started
+        return {
+            "phases_ms": {k: round(v * 1000, 1) for k, v in phases.items()},
+            "activities_ms": {k: round(v * 1000, 1) for k, v in sorted(self.activities.items())},
+            "total_ms": round(self.total() * 1000, 1),
+        }
+
+    def server_timing(self) -> str:
+        """The breakdown as a ``Server-Timing`` header value."""
+        return server_timing_header(self.to_dict())
+
+
+def server_timing_header(timings: Dict[str, Any]) -> str:
+    """Format a ``PhaseTimer.to_dict()`` breakdown as a ``Server-Timing`` header value."""
+    entries = [f"{name};dur={ms}" for name, ms in timings.get("phases_ms", {}).items()]
+    entries += [f'{name}_total;dur={ms};desc="cumulative"' for name, ms in timings.get("activities_ms", {}).items()]
+    if "total_ms" in timings:
+        entries.append(f"total;dur={timings['total_ms']}")
+    return ", ".join(entries)
+
+
+def current_timer() -> Optional[PhaseTimer]:
+    return _current.get()
+
+
+@contextmanager
+def use_timer(timer: PhaseTimer) -> Iterator[PhaseTimer]:
+    """Charge activities in this context, and in tasks started from it, to ``timer``."""
+    token = _current.set(timer)
+    try:
+        yield timer
+    finally:
+        _current.reset(token)
+
+
+def record(activity: str, seconds: float) -> None:
+    timer = _current.get()
+    if timer is not None:
+        timer.add(activity, seconds)
+
+
+@contextmanager
+def timed(activity: str) -> Iterator[None]:
+    """Charge the wall time of the block, awaits included, to the current timer."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(activity, time.perf_counter() - start)
+
+
+async def pause(seconds: float) -> None:
+    """``asyncio.sleep`` that counts towards the current request's sleep total."""
+    await asyncio.sleep(seconds)
+    if seconds > 0:
+        record("sleep", seconds)
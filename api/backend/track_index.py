@@ -0,0 +1,87 @@
+# In-memory index of Spotify tracks already fetched during a transfer, matched without any search.
+
+import os
+from collections import OrderedDict
+from typing import List, Dict, Optional, Any
+
+from rapidfuzz import fuzz
+
+from .normalize import normalize_text, clean_artist_names
+from .scoring import DURATION_TOLERANCE_MS
+
+TRACK_INDEX_MAX_TRACKS = int(os.getenv("TRACK_INDEX_MAX_TRACKS", "50000"))  # Tracks held per transfer
+INDEX_ARTIST_THRESHOLD = 80   # Artist similarity that counts as the same artist
+
+
+class TrackIndex:
+    """Spotify track objects grouped by normalized title.
+
+    It is filled from prefetched artist catalogs and from every item of every
+    search response, not just the chosen one, so a later song that was
+    already among earlier results (another track of the same album, say)
+    needs no request of its own.
+
+    A song is answered from the index only when a track has the same
+    normalized title, shares an artist and, when both durations are known,
+    lies within the duration tolerance; anything less falls through to the
+    search strategies. Titles are evicted oldest first once ``max_tracks``
+    tracks are held.
+    """
+
+    def __init__(self, max_tracks: int = TRACK_INDEX_MAX_TRACKS):
+        self.max_tracks = max_tracks
+        self._by_title: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        self._uris = set()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._uris)
+
+    def add(self, items: List[Dict[str, Any]]) -> None:
+        for item in items:
+            uri = item.get("uri")
+            title = normalize_text(item.get("name", ""))
+            if not uri or not title or uri in self._uris:
+                continue
+            self._uris.add(uri)
+            self._by_title.setdefault(title, []).append({
+                "uri": uri,
+                "artists": clean_artist_names([a.get("name", "") for a in item.get("artists") or ()]),
+                "duration_ms": item.get("duration_ms") or 0,
+            })
+        while len(self._uris) > self.max_tracks and self._by_title:
+            _, evicted = self._by_title.popitem(last=False)
+            self._uris.difference_update(entry["uri"] for entry in evicted)
+            self.evicted += len(evicted)
+
+    def lookup(self, track_name: str, artists: List[str], duration_ms: int) -> Optional[str]:
+        """Return the URI of the indexed track that is this song, or None."""
+        entries = self._by_title.get(normalize_text(track_name))
+        best_uri = None
+        best_diff = float("inf")
+        if entries:
+            query_artists = clean_artist_names(artists)
+            for entry in entries:
+                if not any(fuzz.ratio(a, b) >= INDEX_ARTIST_THRESHOLD for a in query_artists for b in entry["artists"]):
+                    continue
+                diff = abs(entry["duration_ms"] - duration_ms) if entry["duration_ms"] and duration_ms else 0
+                if diff < best_diff and diff < DURATION_TOLERANCE_MS:
+                    best_diff = diff
+                    best_uri = entry["uri"]
+        if best_uri:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return best_uri
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "tracks": len(self._uris),
+            "evicted": self.evicted,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
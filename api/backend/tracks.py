@@ -0,0 +1,48 @@
+# Compact track records that replace raw NetEase song JSON as soon as a response is parsed.
+
+import sys
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+
+
+class Track:
+    """One NetEase song reduced to the fields matching and reporting use.
+
+    A raw song object carries album, privilege and quality sub-objects that
+    are never read; a slotted record is a small fraction of that, and artist
+    names are interned so a playlist full of the same artists shares them.
+    ``disc`` and ``number`` are only meaningful for album tracks.
+    """
+
+    __slots__ = ("id", "name", "artists", "duration_ms", "album", "disc", "number")
+
+    def __init__(self, id: Any, name: str, artists: Tuple[str, ...], duration_ms: int = 0, album: str = "",
+                 disc: Optional[Any] = None, number: Optional[Any] = None):
+        self.id = id
+        self.name = name
+        self.artists = artists
+        self.duration_ms = duration_ms
+        self.album = album
+        self.disc = disc
+        self.number = number
+
+    @classmethod
+    def from_netease(cls, song: Dict[str, Any]) -> "Track":
+        artists = song.get("ar") or song.get("artists") or ()
+        album = song.get("al") or song.get("album") or {}
+        return cls(
+            song.get("id"),
+            song.get("name") or "",
+            tuple(sys.intern(a["name"]) for a in artists if a.get("name")),
+            song.get("dt") or song.get("duration") or 0,
+            sys.intern(album.get("name") or ""),
+            song.get("cd"),
+            song.get("no"),
+        )
+
+    def __repr__(self) -> str:
+        return f"Track({self.id!r}, {self.name!r})"
+
+
+def tracks_from_netease(songs: Iterable[Any]) -> List[Track]:
+    """Convert a list of raw NetEase songs, dropping anything that is not a song object."""
+    return [Track.from_netease(song) for song in songs or () if isinstance(song, dict)]
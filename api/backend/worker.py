@@ -0,0 +1,127 @@
+# Transfer worker processes: claim jobs from the shared queue and run them, several per process.
+
+"""Run from the ``api`` directory, next to API workers started with ``JOB_QUEUE=1``:
+
+    JOB_QUEUE=1 python -m backend.worker [--processes 4] [--jobs-per-process 4]
+
+Each process runs its own event loop and connection pool and claims jobs
+under a lease it renews while alive. A process that dies is restarted, and
+its jobs return to the queue once their leases expire; playlist transfers
+then continue from their checkpoints.
+"""
+
+import argparse, asyncio, logging, multiprocessing, os, signal, socket, time, uuid
+from typing import Dict
+
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+WORKER_JOB_CONCURRENCY = int(os.getenv("WORKER_JOB_CONCURRENCY", "4"))  # Jobs one worker process runs at once
+
+
+async def _run_worker(jobs_per_process: int) -> None:
+    # Imported here so each process loads the app, and reads its settings, on its own
+    from .job_queue import JOB_LEASE_SECONDS, JOB_POLL_SECONDS, get_job_queue
+    from .main import execute_job
+    from .spotify_client import close_http_client
+
+    queue = get_job_queue()
+    if queue is None:
+        raise SystemExit("The job queue is not available, set JOB_QUEUE=1 and check JOB_QUEUE_PATH")
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    running: Dict[str, "asyncio.Task"] = {}
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stopping.set)
+
+    async def renew_leases() -> None:
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            held = set(await queue.renew(owner, list(running)))
+            for job_id, task in list(running.items()):
+                if job_id not in held:
+                    logger.warning(f"Worker {owner}: lease on job {job_id} lost, stopping it")
+                    task.cancel()
+
+    async def run(job, kind: str, payload: Dict) -> None:
+        await execute_job(job, kind, payload)
+        # Keep the lease until the outcome is in the queue
+        await job.saved()
+
+    renewer = asyncio.ensure_future(renew_leases())
+    logger.info(f"Worker {owner} started, up to {jobs_per_process} jobs at once")
+    try:
+        while not stopping.is_set():
+            claimed = await queue.claim(owner) if len(running) < jobs_per_process else None
+            if claimed is None:
+                try:
+                    await asyncio.wait_for(stopping.wait(), JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            job, kind, payload = claimed
+            logger.info(f"Worker {owner}: running {kind} job {job.id}")
+            task = asyncio.ensure_future(run(job, kind, payload))
+            running[job.id] = task
+            task.add_done_callback(lambda _, job_id=job.id: running.pop(job_id, None))
+    finally:
+        renewer.cancel()
+        for task in running.values():
+            task.cancel()
+        await asyncio.gather(*running.values(), return_exceptions=True)
+        released = await queue.release(owner)
+        if released:
+            logger.info(f"Worker {owner}: returned {released} unfinished jobs to the queue")
+        await close_http_client()
+
+
+def _worker_main(jobs_per_process: int) -> None:
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    asyncio.run(_run_worker(jobs_per_process))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run transfer worker processes for the shared job queue.")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="worker processes (default: one per core)")
+    parser.add_argument("--jobs-per-process", type=int, default=WORKER_JOB_CONCURRENCY, help="jobs each process runs at once")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.processes <= 1:
+        _worker_main(args.jobs_per_process)
+        return
+
+    ctx = multiprocessing.get_context("spawn")
+    stopping = False
+
+    def start() -> multiprocessing.Process:
+        proc = ctx.Process(target=_worker_main, args=(args.jobs_per_process,), daemon=False)
+        proc.start()
+        return proc
+
+    def stop(*_):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    workers = [start() for _ in range(args.processes)]
+    logger.info(f"Started {len(workers)} worker processes")
+    while not stopping:
+        time.sleep(1)
+        for n, proc in enumerate(workers):
+            if not proc.is_alive() and not stopping:
+                logger.warning(f"Worker process {proc.pid} exited with {proc.exitcode}, restarting it")
+                workers[n] = start()
+    for proc in workers:
+        if proc.is_alive():
+            proc.terminate()
+    for proc in workers:
+        proc.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Micro-benchmark for the title/artist normalization engine.
+
+Run from the ``api`` directory:
+
+    python -m benchmarks.bench_normalize [--titles 20000] [--repeat 5]
+
+Reports normalizations per second for the original per-call-compiling
+implementation, a cold memoized pass, the repeated-lookup pattern of the
+match scorers, and the batch ``normalize_many`` API.
+"""
+
+import argparse, random, time
+import unicodedata
+import re as _re
+
+from backend.normalize import normalize_text, clean_artist_name, normalize_many
+
+_CJK_WORDS = ["爱", "夜空", "晴天", "告白气球", "稻香", "后来", "月亮代表我的心", "起风了", "光年之外", "红豆",
+              "海阔天空", "小幸运", "说散就散", "平凡之路", "演员", "青花瓷", "夜曲", "匆匆那年", "漂洋过海来看你"]
+_LATIN_WORDS = ["Love", "Night", "Dream", "Summer", "Heart", "Fire", "Rain", "Stay", "Forever", "Shape",
+                "Blinding", "Lights", "Yellow", "Someone", "Like", "You", "Hello", "Bad", "Guy", "Closer"]
+_SUFFIXES = ["", "", "", " (Live)", " - Remastered 2011", " (feat. Ed Sheeran)", " [Radio Edit]", " (伴奏)",
+             "（现场版）", " - Single Version", " feat. 林俊杰", " 【Official Audio】", " (Acoustic)"]
+_ARTISTS = ["周杰伦", "陈奕迅", "林俊杰", "邓紫棋", "Taylor Swift", "Ed Sheeran", "Coldplay", "Beyoncé", "王菲",
+            "薛之谦", "The Weeknd", "Billie Eilish", "毛不易", "Sigur Rós", "Mötley Crüe"]
+
+
+def _legacy_normalize_text(s: str) -> str:
+    """The original implementation, recompiling its patterns on every call."""
+    if not s:
+        return ""
+    _PAREN_RE = _re.compile(r"[\[\(（【].*?[\]）】\)]")
+    _FEAT_RE = _re.compile(r"\s+(ft\.|feat\.|featuring|with|和|與)\s+.*", _re.IGNORECASE)
+    _VERSION_RE = _re.compile(r"\s+(- )?((Album|Single|Live|Acoustic|Remix|Remaster(ed)?|Version|Edit|Radio Edit|Extended|Original|Official Audio|MV|Cover|翻唱|混音|重制|现场|直播|纯音乐|纯音|伴奏)\s*).*$", _re.IGNORECASE)
+    s = unicodedata.normalize("NFKD", s)
+    s = _PAREN_RE.sub("", s)
+    s = _FEAT_RE.sub("", s)
+    s = _VERSION_RE.sub("", s)
+    s = _re.sub(r"[^\w\s]", "", s)
+    return _re.sub(r"\s+", " ", s).strip().lower()
+
+
+def build_corpus(n: int, seed: int = 7):
+    """Mixed CJK/Latin titles with the decorations NetEase and Spotify add."""
+    rng = random.Random(seed)
+    titles = []
+    for _ in range(n):
+        if rng.random() < 0.5:
+            base = "".join(rng.sample(_CJK_WORDS, rng.randint(1, 2)))
+        else:
+            base = " ".join(rng.sample(_LATIN_WORDS, rng.randint(1, 4)))
+        titles.append(base + rng.choice(_SUFFIXES))
+    artists = [rng.choice(_ARTISTS) for _ in range(n)]
+    return titles, artists
+
+
+def _rate(count: int, seconds: float) -> str:
+    return f"{count / seconds:>14,.0f} normalizations/s  ({seconds * 1000:8.1f} ms for {count:,})"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--titles", type=int, default=20000, help="distinct corpus size")
+    parser.add_argument("--repeat", type=int, default=5, help="lookups per title in the scorer pattern")
+    args = parser.parse_args()
+
+    titles, artists = build_corpus(args.titles)
+
+    mismatches = sum(1 for t in titles if _legacy_normalize_text(t) != normalize_text(t))
+    if mismatches:
+        raise SystemExit(f"normalize_text diverges from the original on {mismatches} titles")
+
+    start = time.perf_counter()
+    for t in titles:
+        _legacy_normalize_text(t)
+    print("legacy (compile per call)  ", _rate(len(titles), time.perf_counter() - start))
+
+    normalize_text.cache_clear()
+    start = time.perf_counter()
+    for t in titles:
+        normalize_text(t)
+    print("precompiled, cold cache    ", _rate(len(titles), time.perf_counter() - start))
+
+    # Scorers normalize the same query and candidate names once per candidate per strategy
+    lookups = titles * args.repeat
+    clean_artist_name.cache_clear()
+    start = time.perf_counter()
+    for t, a in zip(lookups, artists * args.repeat):
+        normalize_text(t)
+        clean_artist_name(a)
+    print("scorer pattern, memoized   ", _rate(2 * len(lookups), time.perf_counter() - start))
+
+    normalize_text.cache_clear()
+    start = time.perf_counter()
+    normalize_many(lookups)
+    print("normalize_many, cold cache ", _rate(len(lookups), time.perf_counter() - start))
+
+    info = normalize_text.cache_info()
+    print(f"cache: {info.currsize:,}/{info.maxsize:,} entries, {info.hits:,} hits, {info.misses:,} misses")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Benchmark for parsing a large NetEase playlist detail response.
+
+Run from the ``api`` directory:
+
+    python -m benchmarks.bench_playlist_parse [--tracks 10000] [--chunk 65536]
+
+Builds a synthetic ``v6/playlist/detail?n=10000`` body (trackIds, full track
+objects and privileges), then parses it in a fresh process per method so
+that peak RSS is measured for that method alone: the original decode of the
+whole body followed by conversion to track records, and the incremental
+ijson parser fed in network-sized chunks. Both must yield the same ids and
+tracks. The streaming method needs the optional ``ijson`` package.
+"""
+
+import argparse, asyncio, json, os, random, resource, subprocess, sys, tempfile, time
+
+from backend.netease_client import IJSON_AVAILABLE, _compact_playlist, parse_playlist_detail
+from benchmarks.bench_normalize import build_corpus, _ARTISTS
+
+
+def build_body(n: int, seed: int = 5) -> bytes:
+    """A detail response shaped like NetEase's, with every per-song field it sends."""
+    rng = random.Random(seed)
+    titles, artists = build_corpus(n, seed)
+    quality = lambda br: {"br": br, "fid": 0, "size": rng.randint(10 ** 6, 10 ** 7), "vd": -20000.0, "sr": 44100}
+    tracks = [{
+        "name": title, "id": 100000 + i, "pst": 0, "t": 0,
+        "ar": [{"id": rng.randint(1, 10 ** 6), "name": artist, "tns": [], "alias": []}]
+              + ([{"id": 7, "name": rng.choice(_ARTISTS), "tns": [], "alias": []}] if i % 5 == 0 else []),
+        "alia": [], "pop": 100.0, "st": 0, "rt": "", "fee": 8, "v": 42, "crbt": None, "cf": "",
+        "al": {"id": 2000 + i % 400, "name": f"Album {i % 400}", "tns": [], "pic_str": "109951163",
+               "picUrl": f"https://p1.music.126.net/{'x' * 22}==/1099511630{i % 400:05d}.jpg", "pic": 109951163000000},
+        "dt": rng.randint(120000, 360000), "h": quality(320000), "m": quality(192000), "l": quality(128000),
+        "sq": quality(999000), "hr": None, "a": None, "cd": "01", "no": i % 12 + 1, "rtUrl": None, "ftype": 0,
+        "rtUrls": [], "djId": 0, "copyright": 1, "s_id": 0, "mark": 8192, "originCoverType": 1,
+        "originSongSimpleData": None, "tagPicList": None, "resourceState": True, "version": 12,
+        "songJumpInfo": None, "entertainmentTags": None, "awardTags": None, "single": 0, "noCopyrightRcmd": None,
+        "rtype": 0, "rurl": None, "mst": 9, "cp": 7003, "mv": 0, "publishTime": 1262275200000,
+    } for i, (title, artist) in enumerate(zip(titles, artists))]
+    track_ids = [{"id": 100000 + i, "v": 42, "t": 0, "at": 1600000000000 + i, "alg": None, "uid": 1,
+                  "rcmdReason": "", "sc": None, "f": None, "sr": None, "dpr": None} for i in range(n)]
+    privileges = [{"id": 100000 + i, "fee": 8, "payed": 0, "st": 0, "pl": 128000, "dl": 0, "sp": 7, "cp": 1,
+                   "subp": 1, "cs": False, "maxbr": 999000, "fl": 128000, "toast": False, "flag": 4,
+                   "preSell": False, "playMaxbr": 999000, "downloadMaxbr": 999000, "maxBrLevel": "lossless",
+                   "chargeInfoList": [{"rate": br, "chargeUrl": None, "chargeMessage": None, "chargeType": 0}
+                                      for br in (128000, 192000, 320000, 999000)]} for i in range(n)]
+    body = {
+        "code": 200, "relatedVideos": None, "urls": None, "privileges": privileges,
+        "playlist": {
+            "id": 1, "name": "Benchmark", "coverImgUrl": "https://p1.music.126.net/cover.jpg",
+            "description": "synthetic", "trackCount": n, "trackUpdateTime": 1700000000000,
+            "updateTime": 1700000000000, "creator": {"userId": 1, "nickname": "bench"},
+            "tracks": tracks, "trackIds": track_ids,
+        },
+    }
+    return json.dumps(body, ensure_ascii=False).encode()
+
+
+async def _chunks(path: str, size: int):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(size)
+            if not chunk:
+                return
+            yield chunk
+
+
+async def _parse_full(path: str, size: int):
+    # What the client did before: collect the body, decode it whole, then convert
+    body = b"".join([chunk async for chunk in _chunks(path, size)])
+    data = json.loads(body)
+    del body
+    _compact_playlist(data["playlist"])
+    return data
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _child(method: str, path: str, size: int) -> None:
+    if method == "build":
+        body = build_body(size)
+        with open(path, "wb") as f:
+            f.write(body)
+        print(json.dumps({"bytes": len(body)}))
+        return
+    baseline = _peak_rss_mb()
+    start = time.perf_counter()
+    parse = _parse_full if method == "full" else lambda p, s: parse_playlist_detail(_chunks(p, s))
+    data = asyncio.run(parse(path, size))
+    elapsed = time.perf_counter() - start
+    playlist = data["playlist"]
+    print(json.dumps({
+        "seconds": elapsed,
+        "peak_rss_mb": _peak_rss_mb() - baseline,
+        "ids": len(playlist["trackIds"]),
+        "tracks": len(playlist["tracks"]),
+        "checksum": sum(playlist["trackIds"]) + sum(t.duration_ms for t in playlist["tracks"]),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tracks", type=int, default=10000, help="songs in the synthetic playlist")
+    parser.add_argument("--chunk", type=int, default=65536, help="bytes per streamed chunk")
+    parser.add_argument("--child", choices=("build", "full", "stream"), help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.child, args.path, args.tracks if args.child == "build" else args.chunk)
+        return
+
+    def run_child(method: str, path: str) -> dict:
+        # A child starts with its parent's RSS high-water mark, so even the body is built in one
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_playlist_parse", "--child", method, "--path", path,
+             "--tracks", str(args.tracks), "--chunk", str(args.chunk)],
+            check=True, capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+        return json.loads(out.stdout.strip().splitlines()[-1])
+
+    fd, path = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    results = {}
+    try:
+        size = run_child("build", path)["bytes"]
+        print(f"synthetic detail response: {args.tracks:,} tracks, {size / 1e6:.1f} MB")
+        for method in ["full"] + (["stream"] if IJSON_AVAILABLE else []):
+            results[method] = run_child(method, path)
+    finally:
+        os.unlink(path)
+
+    if len({(r["ids"], r["tracks"], r["checksum"]) for r in results.values()}) > 1:
+        raise SystemExit(f"parsers disagree: {results}")
+    for method, r in results.items():
+        label = "json.loads whole body" if method == "full" else "ijson streaming      "
+        print(f"{label}  {r['seconds'] * 1000:8.1f} ms  peak RSS +{r['peak_rss_mb']:7.1f} MB  "
+              f"({r['ids']:,} ids, {r['tracks']:,} tracks)")
+    if not IJSON_AVAILABLE:
+        print("ijson is not installed, streaming parser skipped (pip install ijson)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Benchmark for the batched candidate scorers against the original loops.
+
+Run from the ``api`` directory:
+
+    python -m benchmarks.bench_scoring [--sets 2000] [--candidates 20]
+
+Every synthetic search result set is scored by both implementations; the
+run aborts if any selection differs, then reports scorings per second.
+``find_best_artist_match`` only ever sees strategy 3 results, a title-only
+search, so it is measured on sets where most candidates share the title.
+"""
+
+import argparse, random, time
+
+from rapidfuzz import fuzz
+
+from backend.normalize import normalize_text, clean_artist_name
+from backend.scoring import MATCH_THRESHOLD, find_best_match, find_best_artist_match, find_best_match_by_duration
+from benchmarks.bench_normalize import build_corpus, _ARTISTS
+
+
+def legacy_find_best_match_by_duration(items, target_duration):
+    best_item = None
+    best_diff = float('inf')
+    for item in items:
+        if item.get("duration_ms"):
+            diff = abs(item["duration_ms"] - target_duration)
+            if diff < best_diff:
+                best_diff = diff
+                best_item = item
+    if best_item and best_diff < 10000:
+        return best_item
+    return items[0] if items else None
+
+
+def legacy_find_best_artist_match(items, artists, track_name):
+    best_score = 0
+    best_match = None
+    normalized_track = normalize_text(track_name)
+    artists_lower = [clean_artist_name(a) for a in artists]
+    for item in items:
+        name_score = fuzz.ratio(normalized_track, normalize_text(item.get("name", "")))
+        if name_score < 80:
+            continue
+        spotify_artists_lower = [clean_artist_name(a.get("name", "")) for a in item.get("artists", [])]
+        artist_score = 0
+        for a1 in artists_lower:
+            for a2 in spotify_artists_lower:
+                artist_score = max(artist_score, fuzz.ratio(a1, a2))
+        combined_score = (name_score * 0.8) + (artist_score * 0.2)
+        if combined_score > best_score and combined_score > MATCH_THRESHOLD:
+            best_score = combined_score
+            best_match = item
+    return best_match
+
+
+def legacy_find_best_match(items, track_name, artists):
+    best_score = 0
+    best_match = None
+    normalized_track = normalize_text(track_name)
+    artists_lower = [clean_artist_name(a) for a in artists]
+    for item in items:
+        item_name = item.get("name", "")
+        if not item_name:
+            continue
+        name_score = fuzz.ratio(normalized_track, normalize_text(item_name))
+        spotify_artists_lower = [clean_artist_name(a.get("name", "")) for a in item.get("artists", [])]
+        best_artist_score = 0
+        for a1 in artists_lower:
+            for a2 in spotify_artists_lower:
+                best_artist_score = max(best_artist_score, fuzz.ratio(a1, a2))
+        combined_score = (name_score * 0.7) + (best_artist_score * 0.3)
+        if combined_score > best_score and combined_score > MATCH_THRESHOLD:
+            best_score = combined_score
+            best_match = item
+    return best_match
+
+
+def build_result_sets(n_sets: int, n_candidates: int, title_hit_rate: float = 0.3, seed: int = 11):
+    """Synthetic (query, candidates) pairs where some candidates are near-duplicates of the query."""
+    rng = random.Random(seed)
+    titles, artists = build_corpus(n_sets * 4, seed)
+    sets = []
+    for i in range(n_sets):
+        query_title = titles[i]
+        query_artists = rng.sample(_ARTISTS, rng.randint(1, 3))
+        duration = rng.randint(120000, 360000)
+        items = []
+        for j in range(n_candidates):
+            if rng.random() < title_hit_rate:
+                name = query_title if rng.random() < 0.5 else query_title + " (Live)"
+            else:
+                name = rng.choice(titles)
+            items.append({
+                "uri": f"spotify:track:{i}-{j}",
+                "name": name if rng.random() > 0.02 else "",
+                "duration_ms": duration + rng.randint(-20000, 20000) if rng.random() > 0.05 else 0,
+                "artists": [{"name": a} for a in rng.sample(_ARTISTS, rng.randint(1, 3))],
+            })
+        sets.append((query_title, query_artists, duration, items))
+    return sets
+
+
+def _time(fn, sets, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for args in sets:
+            fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sets", type=int, default=2000, help="search result sets to score")
+    parser.add_argument("--candidates", type=int, default=20, help="candidates per result set")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    sets = build_result_sets(args.sets, args.candidates)
+    title_sets = build_result_sets(args.sets, args.candidates, title_hit_rate=0.8)
+    pairs = [
+        ("find_best_match", legacy_find_best_match, find_best_match, [(items, t, a) for t, a, d, items in sets]),
+        ("find_best_artist_match", legacy_find_best_artist_match, find_best_artist_match, [(items, a, t) for t, a, d, items in title_sets]),
+        ("find_best_match_by_duration", legacy_find_best_match_by_duration, find_best_match_by_duration, [(items, d) for t, a, d, items in sets]),
+    ]
+
+    for name, legacy, batched, calls in pairs:
+        diverged = sum(1 for c in calls if legacy(*c) is not batched(*c))
+        if diverged:
+            raise SystemExit(f"{name}: batched scorer picked a different candidate in {diverged} sets")
+
+        # Warm the normalization caches so both sides measure scoring only
+        _time(legacy, calls, 1)
+        old = _time(legacy, calls, args.rounds)
+        new = _time(batched, calls, args.rounds)
+        total = len(calls) * args.rounds
+        print(f"{name:<28} legacy {total / old:>10,.0f}/s   batched {total / new:>10,.0f}/s   speedup x{old / new:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""End-to-end transfer benchmark against the local mock upstream.
+
+Run from the ``api`` directory:
+
+    python -m benchmarks.bench_transfer [--sizes 100,1000,10000] [--latency-ms 20] [--throttle-rate 0] [--error-rate 0]
+
+Starts ``benchmarks.mock_upstream`` on a free port, then for every playlist
+size runs a fresh backend process pointed at it (empty match cache and
+checkpoints) that loads ``/api/playlist-info`` and drives ``/api/transfer``
+to completion. Reports wall time, upstream calls per endpoint and per track,
+matched songs and peak RSS, with no network access or Spotify account needed.
+"""
+
+import argparse, asyncio, json, os, resource, socket, subprocess, sys, tempfile, time
+
+import httpx
+
+_API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+async def _drive(size: int, mock_url: str) -> dict:
+    # Imported here so the child's environment decides the upstream URLs and store paths
+    from backend.main import app
+    from backend.spotify_client import close_http_client
+
+    baseline = _peak_rss_mb()
+    url = f"https://music.163.com/playlist?id={size}"
+    api = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://netify", timeout=None)
+    async with api, httpx.AsyncClient(base_url=mock_url) as upstream:
+        async def phase(run) -> dict:
+            await upstream.post("/__reset")
+            start = time.perf_counter()
+            out = await run()
+            seconds = time.perf_counter() - start
+            return {"seconds": seconds, "out": out, **(await upstream.get("/__stats")).json()}
+
+        async def info():
+            resp = await api.get("/api/playlist-info", params={"url": url})
+            resp.raise_for_status()
+            return resp.json()["total_tracks_count"]
+
+        async def transfer():
+            resp = await api.post("/api/transfer", json={"url": url, "spotify_token": "mock-access"})
+            resp.raise_for_status()
+            job_id = resp.json()["job_id"]
+            while True:
+                job = (await api.get(f"/api/transfer/{job_id}")).json()
+                if job["status"] in ("succeeded", "failed"):
+                    return job
+                await asyncio.sleep(0.05)
+
+        info_run = await phase(info)
+        transfer_run = await phase(transfer)
+    await close_http_client()
+
+    job = transfer_run.pop("out")
+    result = job.get("result") or {}
+    return {
+        "size": size,
+        "info": {**info_run, "out": None},
+        "transfer": transfer_run,
+        "status": job["status"],
+        "error": job.get("error"),
+        "matched": result.get("total_transferred"),
+        "peak_rss_mb": _peak_rss_mb(),
+        "rss_growth_mb": _peak_rss_mb() - baseline,
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url: str, proc: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit("mock upstream exited during startup")
+        try:
+            httpx.get(f"{url}/__stats", timeout=1).raise_for_status()
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise SystemExit("mock upstream did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="100,1000,10000", help="comma-separated playlist sizes")
+    parser.add_argument("--latency-ms", type=float, default=20, help="mean upstream latency")
+    parser.add_argument("--throttle-rate", type=float, default=0, help="fraction of upstream requests answered with 429")
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of upstream requests answered with 500")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--mock", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(_drive(args.child, args.mock))))
+        return
+
+    port = _free_port()
+    mock_url = f"http://127.0.0.1:{port}"
+    mock = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.mock_upstream", "--port", str(port), "--latency-ms", str(args.latency_ms),
+         "--throttle-rate", str(args.throttle_rate), "--error-rate", str(args.error_rate)],
+        cwd=_API_DIR,
+    )
+    results = []
+    try:
+        _wait_ready(mock_url, mock)
+        for size in [int(s) for s in args.sizes.split(",")]:
+            with tempfile.TemporaryDirectory() as tmp:
+                env = {
+                    **os.environ,
+                    "NETEASE_BASE_URL": mock_url,
+                    "SPOTIFY_API_BASE_URL": f"{mock_url}/v1",
+                    "SPOTIFY_ACCOUNTS_BASE_URL": mock_url,
+                    "MATCH_CACHE_PATH": os.path.join(tmp, "match_cache.sqlite3"),
+                    "CHECKPOINT_PATH": os.path.join(tmp, "checkpoints.sqlite3"),
+                    "SYNC_STORE_PATH": os.path.join(tmp, "sync.sqlite3"),
+                }
+                out = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_transfer", "--child", str(size), "--mock", mock_url],
+                    check=True, capture_output=True, text=True, cwd=_API_DIR, env=env,
+                )
+                results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    finally:
+        mock.terminate()
+        mock.wait()
+
+    print(f"mock upstream: {args.latency_ms:g} ms latency, {args.throttle_rate:g} throttled, {args.error_rate:g} errors")
+    print(f"{'tracks':>7} {'info s':>7} {'calls':>6} {'transfer s':>11} {'calls':>6} {'calls/track':>12} "
+          f"{'matched':>8} {'peak RSS':>9}")
+    for r in results:
+        info, transfer = r["info"], r["transfer"]
+        print(f"{r['size']:>7,} {info['seconds']:>7.2f} {info['total']:>6,} {transfer['seconds']:>11.2f} "
+              f"{transfer['total']:>6,} {transfer['total'] / r['size']:>12.3f} {r['matched'] or 0:>8,} "
+              f"{r['peak_rss_mb']:>7.1f} MB")
+        if r["status"] != "succeeded":
+            print(f"        transfer {r['status']}: {r['error']}")
+    for r in results:
+        calls = ", ".join(f"{label} {n:,}" for label, n in sorted(r["transfer"]["calls"].items(), key=lambda kv: -kv[1]))
+        print(f"\n{r['size']:,} tracks, transfer calls: {calls}")
+        if r["transfer"]["faults"]:
+            print(f"  injected faults: {r['transfer']['faults']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+"""Local stand-in for the NetEase and Spotify APIs, for offline benchmarks.
+
+Run from the ``api`` directory:
+
+    python -m benchmarks.mock_upstream [--port 8765] [--latency-ms 20] [--throttle-rate 0.01] [--error-rate 0.005]
+
+and point the backend at it:
+
+    NETEASE_BASE_URL=http://127.0.0.1:8765
+    SPOTIFY_API_BASE_URL=http://127.0.0.1:8765/v1
+    SPOTIFY_ACCOUNTS_BASE_URL=http://127.0.0.1:8765
+
+Every NetEase playlist id is its own size: playlist ``1000`` holds the first
+1,000 songs of a deterministic synthetic catalog, and the Spotify side serves
+matching tracks, artists and albums for the same catalog (one song in twenty
+has no Spotify counterpart). Each request sleeps ``--latency-ms`` (±50%) and
+fails with a 429 or a 500 at the given rates. ``--fixtures DIR`` replays
+recorded responses instead: a request for ``/api/v6/playlist/detail`` is
+answered from ``DIR/api_v6_playlist_detail.json`` when that file exists.
+``--token-ttl SECONDS`` makes Spotify access tokens expire that long after
+their first use, with a 401, and ``/api/token`` hand out fresh ones.
+``GET /__stats`` returns per-endpoint call counts, ``POST /__reset`` clears them.
+"""
+
+import argparse, asyncio, json, os, random, re, time
+from collections import Counter
+from typing import List, Dict, Optional, Any
+from urllib.parse import parse_qs
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+from backend.normalize import normalize_text, clean_artist_name
+from benchmarks.bench_normalize import _CJK_WORDS, _LATIN_WORDS, _SUFFIXES, _ARTISTS
+
+CATALOG_SIZE = 20000          # Songs in the synthetic catalog, the largest playlist that can be requested
+ALBUM_SIZE = 12               # Songs per synthetic album
+MISSING_EVERY = 20            # One song in this many has no Spotify counterpart
+PLAYLIST_DETAIL_TRACKS = 1000  # Full track objects in a playlist detail response, like NetEase's own cap
+
+_FIELD_RE = re.compile(r'(track|artist|album):"([^"]*)"')
+_COVER = b"\xff\xd8\xff\xe0" + b"\x00" * 2048 + b"\xff\xd9"
+
+
+class Catalog:
+    """Deterministic songs, artists and albums shared by both mock APIs."""
+
+    def __init__(self, size: int = CATALOG_SIZE, seed: int = 11):
+        rng = random.Random(seed)
+        # A few very frequent artists and a long tail, as in real playlists
+        pool = _ARTISTS + [f"Artist {k}" for k in range(2000)]
+        weights = [1 / (k + 1) for k in range(len(pool))]
+        self.songs: List[Dict[str, Any]] = []
+        for i in range(size):
+            if rng.random() < 0.5:
+                base = "".join(rng.sample(_CJK_WORDS, rng.randint(1, 2))) + f" {i}"
+            else:
+                base = " ".join(rng.sample(_LATIN_WORDS, rng.randint(1, 3))) + f" {i}"
+            artists = [rng.choices(pool, weights)[0]]
+            if rng.random() < 0.15:
+                artists.append(rng.choice(pool))
+            self.songs.append({
+                "i": i, "base": base, "title": base + rng.choice(_SUFFIXES), "artists": artists,
+                "dt": rng.randint(120000, 360000), "on_spotify": i % MISSING_EVERY != MISSING_EVERY - 1,
+            })
+
+        # Albums group each primary artist's songs in catalog order
+        by_artist: Dict[str, List[int]] = {}
+        for song in self.songs:
+            by_artist.setdefault(song["artists"][0], []).append(song["i"])
+        self.artist_ids = {name: f"ar{k}" for k, name in enumerate(pool)}
+        self.artist_names = {v: k for k, v in self.artist_ids.items()}
+        self.albums: List[List[int]] = []
+        self.artist_albums: Dict[str, List[int]] = {}
+        for artist, indexes in by_artist.items():
+            for start in range(0, len(indexes), ALBUM_SIZE):
+                self.artist_albums.setdefault(artist, []).append(len(self.albums))
+                for no, i in enumerate(indexes[start:start + ALBUM_SIZE], 1):
+                    self.songs[i]["album"] = len(self.albums)
+                    self.songs[i]["no"] = no
+                self.albums.append(indexes[start:start + ALBUM_SIZE])
+
+        self.by_title: Dict[str, List[int]] = {}
+        for song in self.songs:
+            for title in {normalize_text(song["base"]), normalize_text(song["title"])}:
+                self.by_title.setdefault(title, []).append(song["i"])
+        self.by_album_name = {normalize_text(f"Album {k}"): k for k in range(len(self.albums))}
+
+    # --- NetEase shapes ---
+
+    def netease_song(self, i: int) -> Dict[str, Any]:
+        song = self.songs[i]
+        return {
+            "id": 100000 + i, "name": song["title"], "dt": song["dt"], "cd": "01", "no": song["no"],
+            "ar": [{"id": 0, "name": a} for a in song["artists"]],
+            "al": {"id": 500000 + song["album"], "name": f"Album {song['album']}", "picUrl": ""},
+            "pop": 100.0, "fee": 8, "mv": 0,
+        }
+
+    def song_index(self, netease_id: Any) -> Optional[int]:
+        try:
+            i = int(netease_id) - 100000
+        except (TypeError, ValueError):
+            return None
+        return i if 0 <= i < len(self.songs) else None
+
+    # --- Spotify shapes ---
+
+    def spotify_track(self, i: int, with_album: bool = True) -> Dict[str, Any]:
+        song = self.songs[i]
+        track = {
+            "id": f"tr{i}", "uri": f"spotify:track:tr{i}", "name": song["base"],
+            # Spotify's duration rarely equals NetEase's exactly
+            "duration_ms": song["dt"] + (i % 7 - 3) * 300, "disc_number": 1, "track_number": song["no"],
+            "artists": [{"id": self.artist_ids.get(a, ""), "name": a} for a in song["artists"]],
+        }
+        if with_album:
+            track["album"] = self.spotify_album(song["album"], with_tracks=False)
+        return track
+
+    def spotify_album(self, k: int, with_tracks: bool = True) -> Dict[str, Any]:
+        songs = [i for i in self.albums[k] if self.songs[i]["on_spotify"]]
+        artist = self.songs[self.albums[k][0]]["artists"][0]
+        album = {
+            "id": f"al{k}", "name": f"Album {k}", "total_tracks": len(songs), "album_type": "album",
+            "artists": [{"id": self.artist_ids[artist], "name": artist}],
+        }
+        if with_tracks:
+            album["tracks"] = {"items": [self.spotify_track(i, with_album=False) for i in songs], "next": None}
+        return album
+
+    def search_tracks(self, query: str, limit: int) -> List[Dict[str, Any]]:
+        fields = dict(_FIELD_RE.findall(query))
+        if "track" not in fields:
+            return []  # Free-text queries only reach songs that are not on Spotify anyway
+        hits = [i for i in self.by_title.get(normalize_text(fields["track"]), []) if self.songs[i]["on_spotify"]]
+        if "artist" in fields:
+            wanted = clean_artist_name(fields["artist"])
+            hits = [i for i in hits if any(clean_artist_name(a) == wanted for a in self.songs[i]["artists"])]
+        return [self.spotify_track(i) for i in hits[:limit]]
+
+
+def _label(method: str, path: str) -> str:
+    """Group request paths into the endpoints reported by ``/__stats``."""
+    if path.startswith("/v1/"):
+        path = re.sub(r"/(tr|al|ar|pl)\d+(?=/|$)", r"/{\1}", path[3:])
+        return f"spotify {method} {path}"
+    if path.startswith("/api/v1/album/"):
+        return "netease album"
+    return {
+        "/api/v6/playlist/detail": "netease playlist/detail",
+        "/api/v3/playlist/detail": "netease playlist/detail",
+        "/api/v3/playlist/track/all": "netease track/all",
+        "/api/song/detail": "netease song/detail",
+        "/weapi/v2/song/detail": "netease weapi song/detail",
+        "/api/token": "spotify accounts token",
+        "/img/cover.jpg": "cover image",
+    }.get(path, f"other {method} {path}")
+
+
+def create_app(latency_ms: float = 0, throttle_rate: float = 0, error_rate: float = 0,
+               retry_after: int = 1, track_all_cap: int = 0, fixtures: Optional[str] = None,
+               token_ttl: float = 0, seed: int = 3) -> FastAPI:
+    catalog = Catalog()
+    rng = random.Random(seed)
+    calls: Counter = Counter()
+    faults: Counter = Counter()
+    playlists: Dict[str, List[str]] = {}
+    # With token_ttl, every access token expires that long after it is first seen
+    token_expiry: Dict[str, float] = {}
+    app = FastAPI()
+
+    @app.middleware("http")
+    async def upstream(request: Request, call_next):
+        path = request.url.path
+        if path.startswith("/__"):
+            return await call_next(request)
+        label = _label(request.method, path)
+        calls[label] += 1
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000 * rng.uniform(0.5, 1.5))
+        roll = rng.random()
+        if roll < throttle_rate:
+            faults[f"429 {label}"] += 1
+            return JSONResponse({"error": {"status": 429}}, status_code=429, headers={"Retry-After": str(retry_after)})
+        if roll < throttle_rate + error_rate:
+            faults[f"500 {label}"] += 1
+            return JSONResponse({"error": {"status": 500}}, status_code=500)
+        if token_ttl and path.startswith("/v1/"):
+            token = request.headers.get("Authorization", "")
+            if time.monotonic() > token_expiry.setdefault(token, time.monotonic() + token_ttl):
+                faults[f"401 {label}"] += 1
+                return JSONResponse({"error": {"status": 401, "message": "The access token expired"}}, status_code=401)
+        if fixtures:
+            recorded = os.path.join(fixtures, path.strip("/").replace("/", "_") + ".json")
+            if os.path.exists(recorded):
+                with open(recorded, "rb") as f:
+                    return Response(f.read(), media_type="application/json")
+        return await call_next(request)
+
+    @app.get("/__stats")
+    async def stats():
+        return {"calls": dict(calls), "total": sum(calls.values()), "faults": dict(faults)}
+
+    @app.post("/__reset")
+    async def reset():
+        calls.clear()
+        faults.clear()
+        return {"ok": True}
+
+    # --- NetEase ---
+
+    def playlist_songs(pl_id: str) -> List[int]:
+        size = int(pl_id) if str(pl_id).isdigit() else 0
+        return list(range(min(size, len(catalog.songs))))
+
+    @app.get("/api/{version}/playlist/detail")
+    async def playlist_detail(request: Request, version: str, id: str):
+        songs = playlist_songs(id)
+        base = str(request.base_url).rstrip("/")
+        return {"code": 200, "playlist": {
+            "id": int(id), "name": f"Mock playlist {id}", "coverImgUrl": f"{base}/img/cover.jpg",
+            "description": "synthetic", "trackCount": len(songs),
+            "trackUpdateTime": 1700000000000, "updateTime": 1700000000000,
+            "trackIds": [{"id": 100000 + i, "v": 1, "at": 0} for i in songs],
+            "tracks": [catalog.netease_song(i) for i in songs[:PLAYLIST_DETAIL_TRACKS]],
+        }}
+
+    @app.get("/api/v3/playlist/track/all")
+    async def track_all(id: str, limit: int = 1000, offset: int = 0):
+        songs = playlist_songs(id)
+        end = min(offset + limit, track_all_cap or len(songs))
+        return {"code": 200, "songs": [catalog.netease_song(i) for i in songs[offset:end]]}
+
+    def songs_by_ids(ids: str) -> Dict[str, Any]:
+        indexes = [catalog.song_index(x) for x in json.loads(ids or "[]")]
+        return {"code": 200, "songs": [catalog.netease_song(i) for i in indexes if i is not None]}
+
+    @app.get("/api/song/detail")
+    async def song_detail(ids: str = ""):
+        return songs_by_ids(ids)
+
+    @app.post("/weapi/v2/song/detail")
+    async def weapi_song_detail(request: Request):
+        form = parse_qs((await request.body()).decode())
+        return songs_by_ids(form.get("ids", [""])[0])
+
+    @app.get("/api/v1/album/{album_id}")
+    async def netease_album(album_id: int):
+        k = album_id - 500000
+        if not 0 <= k < len(catalog.albums):
+            return {"code": 404}
+        artist = catalog.songs[catalog.albums[k][0]]["artists"][0]
+        return {"code": 200, "songs": [catalog.netease_song(i) for i in catalog.albums[k]],
+                "album": {"id": album_id, "name": f"Album {k}", "picUrl": "", "artist": {"name": artist},
+                          "artists": [{"name": artist}], "size": len(catalog.albums[k])}}
+
+    @app.get("/img/cover.jpg")
+    async def cover():
+        return Response(_COVER, media_type="image/jpeg")
+
+    # --- Spotify ---
+
+    @app.post("/api/token")
+    async def token():
+        return {"access_token": f"mock-access-{os.urandom(6).hex()}", "token_type": "Bearer", "expires_in": token_ttl or 3600,
+                "refresh_token": "mock-refresh", "scope": "playlist-modify-private"}
+
+    @app.get("/v1/me")
+    async def me():
+        return {"id": "mock-user", "display_name": "Mock User"}
+
+    @app.post("/v1/users/{user_id}/playlists", status_code=201)
+    async def create_playlist(user_id: str):
+        pl_id = f"pl{len(playlists)}"
+        playlists[pl_id] = []
+        return {"id": pl_id, "name": "mock", "uri": f"spotify:playlist:{pl_id}",
+                "external_urls": {"spotify": f"https://open.spotify.com/playlist/{pl_id}"}}
+
+    @app.get("/v1/playlists/{pl_id}")
+    async def get_playlist(pl_id: str):
+        if pl_id not in playlists:
+            return JSONResponse({"error": {"status": 404}}, status_code=404)
+        return {"id": pl_id, "name": "mock"}
+
+    @app.post("/v1/playlists/{pl_id}/tracks", status_code=201)
+    async def add_tracks(request: Request, pl_id: str):
+        playlists.setdefault(pl_id, []).extend((await request.json()).get("uris", []))
+        return {"snapshot_id": str(len(playlists[pl_id]))}
+
+    @app.delete("/v1/playlists/{pl_id}/tracks")
+    async def remove_tracks(request: Request, pl_id: str):
+        drop = {t["uri"] for t in (await request.json()).get("tracks", [])}
+        playlists[pl_id] = [uri for uri in playlists.get(pl_id, []) if uri not in drop]
+        return {"snapshot_id": str(len(playlists[pl_id]))}
+
+    @app.get("/v1/playlists/{pl_id}/tracks")
+    async def playlist_tracks(pl_id: str, limit: int = 100, offset: int = 0):
+        uris = playlists.get(pl_id, [])
+        return {"items": [{"track": {"uri": uri}} for uri in uris[offset:offset + limit]],
+                "next": "more" if offset + limit < len(uris) else None}
+
+    @app.put("/v1/playlists/{pl_id}/images", status_code=202)
+    async def upload_image(request: Request, pl_id: str):
+        if len(await request.body()) > 256 * 1024:
+            return JSONResponse({"error": {"status": 413, "message": "Payload too large"}}, status_code=413)
+        return Response(status_code=202)
+
+    @app.get("/v1/search")
+    async def search(q: str, type: str, limit: int = 20):
+        if type == "track":
+            items = catalog.search_tracks(q, limit)
+        elif type == "artist":
+            fields = dict(_FIELD_RE.findall(q))
+            wanted = clean_artist_name(fields.get("artist", q))
+            items = [{"id": artist_id, "name": name} for name, artist_id in catalog.artist_ids.items()
+                     if clean_artist_name(name) == wanted][:limit]
+        else:
+            fields = dict(_FIELD_RE.findall(q))
+            k = catalog.by_album_name.get(normalize_text(fields.get("album", q)))
+            items = [] if k is None else [catalog.spotify_album(k, with_tracks=False)]
+        return {f"{type}s": {"items": items, "next": None}}
+
+    @app.get("/v1/artists/{artist_id}/albums")
+    async def artist_albums(artist_id: str, limit: int = 50, offset: int = 0):
+        albums = catalog.artist_albums.get(catalog.artist_names.get(artist_id, ""), [])
+        return {"items": [catalog.spotify_album(k, with_tracks=False) for k in albums[offset:offset + limit]],
+                "next": "more" if offset + limit < len(albums) else None}
+
+    @app.get("/v1/albums")
+    async def albums(ids: str = ""):
+        def one(album_id: str):
+            k = int(album_id[2:]) if album_id[2:].isdigit() else -1
+            return catalog.spotify_album(k) if 0 <= k < len(catalog.albums) else None
+        return {"albums": [one(x) for x in ids.split(",") if x]}
+
+    @app.get("/v1/albums/{album_id}/tracks")
+    async def album_tracks(album_id: str, limit: int = 50, offset: int = 0):
+        k = int(album_id[2:]) if album_id[2:].isdigit() else -1
+        if not 0 <= k < len(catalog.albums):
+            return JSONResponse({"error": {"status": 404}}, status_code=404)
+        items = catalog.spotify_album(k)["tracks"]["items"]
+        return {"items": items[offset:offset + limit], "next": "more" if offset + limit < len(items) else None}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0, help="mean latency added to every request")
+    parser.add_argument("--throttle-rate", type=float, default=0, help="fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with a 429")
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of requests answered with 500")
+    parser.add_argument("--track-all-cap", type=int, default=0, help="songs track/all serves before going empty, like NetEase (0 = no cap)")
+    parser.add_argument("--fixtures", help="directory of recorded JSON responses to replay")
+    parser.add_argument("--token-ttl", type=float, default=0, help="seconds an access token is accepted after its first use (0 = forever)")
+    args = parser.parse_args()
+
+    app = create_app(args.latency_ms, args.throttle_rate, args.error_rate, args.retry_after,
+                     args.track_all_cap, args.fixtures, args.token_ttl)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+# Tests for MatchCache: batched last_used refreshes, and database errors read as misses.
+# Run from the api directory: python -m pytest tests
+
+import asyncio
+
+from backend import match_cache
+from backend.match_cache import MatchCache
+
+
+def _last_used(cache: MatchCache, key: str) -> float:
+    return cache._conn.execute("SELECT last_used FROM matches WHERE key = ?", (key,)).fetchone()[0]
+
+
+def test_hits_refresh_last_used_in_batches(monkeypatch, tmp_path):
+    monkeypatch.setattr(match_cache, "TOUCH_BATCH", 2)
+    cache = MatchCache(str(tmp_path / "cache.sqlite3"))
+    asyncio.run(cache.put(1, "song|artist", "u1"))
+    cache._conn.execute("UPDATE matches SET last_used = 0")
+
+    assert asyncio.run(cache.get(1, "song|artist")) == (True, "u1")
+    assert _last_used(cache, "id:1") == 0
+    assert asyncio.run(cache.get(None, "song|artist")) == (True, "u1")
+    assert _last_used(cache, "id:1") > 0
+    assert _last_used(cache, "name:song|artist") > 0
+    assert cache.stats() == {"hits": 2, "misses": 0, "entries": 2}
+
+
+def test_database_errors_read_as_misses(tmp_path):
+    cache = MatchCache(str(tmp_path / "cache.sqlite3"))
+    asyncio.run(cache.put(1, None, "u1"))
+    cache._reader.close()
+
+    assert asyncio.run(cache.get(1, None)) == (False, None)
+    assert not cache.contains(1, None)
+    assert cache.stats()["misses"] == 1
+
+
+def test_fallback_key_keeps_other_recordings_apart():
+    from backend.main import match_cache_key
+
+    studio = match_cache_key("Song", ["Artist"], 200000)
+    assert match_cache_key("Song (Live)", ["Artist"], 245000) != studio
+    assert match_cache_key("Song - Remix", ["Artist"], 320000) != studio
+    assert match_cache_key("Song", ["Artist"], 200400) == studio
+    assert match_cache_key("Song", ["Artist"], 0) is None
@@ -0,0 +1,51 @@
+# Tests for iter_full_tracks: batches released in trackIds order as track/all pages arrive.
+# Run from the api directory: python -m pytest tests
+
+import asyncio
+from typing import Dict, List
+
+from backend import netease_client
+from backend.tracks import Track
+
+
+def _song(song_id: int) -> Track:
+    return Track(song_id, f"Song {song_id}", ("Artist",))
+
+
+def _collect(monkeypatch, track_ids: List[int], pages: Dict[int, List[int]], details: Dict[str, int]) -> List[List[int]]:
+    monkeypatch.setattr(netease_client, "TRACK_PAGE_SIZE", 3)
+
+    async def fetch_track_ids(pl_id):
+        return [{"id": tid} for tid in track_ids], len(track_ids)
+
+    async def fetch_track_page(pl_id, offset):
+        return [_song(tid) for tid in pages.get(offset, [])]
+
+    async def fetch_detail_chunk(chunk_ids, label):
+        for tid in chunk_ids:
+            details[tid] = details.get(tid, 0) + 1
+        return [_song(int(tid)) for tid in chunk_ids]
+
+    monkeypatch.setattr(netease_client, "_fetch_track_ids", fetch_track_ids)
+    monkeypatch.setattr(netease_client, "_fetch_track_page", fetch_track_page)
+    monkeypatch.setattr(netease_client, "_fetch_detail_chunk", fetch_detail_chunk)
+
+    async def go():
+        return [[song.id for song in batch] async for batch in netease_client.iter_full_tracks("1")]
+    return asyncio.run(go())
+
+
+def test_repeated_ids_are_released_with_their_page(monkeypatch):
+    details: Dict[str, int] = {}
+    batches = _collect(monkeypatch, [1, 2, 3, 1, 4, 5, 6], {0: [1, 2, 3], 3: [1, 4, 5], 6: [6]}, details)
+
+    assert batches == [[1, 2, 3, 1], [4, 5], [6]]
+    assert details == {}
+
+
+def test_ids_missing_from_the_pages_are_fetched_once(monkeypatch):
+    details: Dict[str, int] = {}
+    batches = _collect(monkeypatch, [1, 2, 3, 7, 4, 7], {0: [1, 2, 3], 3: [4]}, details)
+
+    assert [tid for batch in batches for tid in batch] == [1, 2, 3, 7, 4, 7]
+    assert details == {"7": 1}
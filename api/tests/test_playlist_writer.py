@@ -0,0 +1,61 @@
+# Tests for OrderedChunkWriter: playlist order, which errors are retried, and failures never counted as added.
+# Run from the api directory: python -m pytest tests
+
+import asyncio
+from typing import List
+
+import httpx
+
+from backend import playlist_writer
+from backend.playlist_writer import OrderedChunkWriter
+
+
+async def _no_pause(seconds: float) -> None:
+    pass
+
+
+def _response(status: int) -> httpx.Response:
+    return httpx.Response(status, request=httpx.Request("POST", "https://api.spotify.com/v1/playlists/p/tracks"))
+
+
+def _run(writer: OrderedChunkWriter, results) -> None:
+    async def go():
+        writer.start()
+        for index, uri in results:
+            await writer.resolve(index, uri)
+        await writer.close()
+    asyncio.run(go())
+
+
+def test_out_of_order_results_are_added_in_playlist_order():
+    posted: List[List[str]] = []
+    added: List[List[int]] = []
+
+    async def add(uris):
+        posted.append(uris)
+        return _response(201)
+
+    writer = OrderedChunkWriter(add, 2, on_added=lambda index, positions: added.append(positions))
+    _run(writer, [(3, "u3"), (1, "u1"), (4, None), (0, "u0"), (2, "u2")])
+
+    assert posted == [["u0", "u1"], ["u2", "u3"]]
+    assert added == [[0, 1], [2, 3]]
+    assert (writer.chunks_total, writer.chunks_added, writer.chunk_failures, writer.uris_added) == (2, 2, 0, 4)
+
+
+def test_server_errors_are_retried_and_rejections_never_reported_as_added(monkeypatch):
+    monkeypatch.setattr(playlist_writer, "pause", _no_pause)
+    statuses = {"u0": [500, 429, 201], "u2": [401]}
+    calls: List[str] = []
+    added: List[List[int]] = []
+
+    async def add(uris):
+        calls.append(uris[0])
+        return _response(statuses[uris[0]].pop(0))
+
+    writer = OrderedChunkWriter(add, 2, on_added=lambda index, positions: added.append(positions))
+    _run(writer, [(1, "u1"), (2, "u2"), (0, "u0")])
+
+    assert calls == ["u0", "u0", "u0", "u2"]
+    assert added == [[0, 1]]
+    assert (writer.chunks_added, writer.chunk_failures, writer.uris_added) == (1, 1, 2)
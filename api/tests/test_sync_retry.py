@@ -0,0 +1,79 @@
+# Tests for run_sync: a sync reclaimed from a dead worker never adds a track twice.
+# Run from the api directory: python -m pytest tests
+
+import asyncio
+from typing import List
+
+import httpx
+
+from backend import main
+from backend.jobs import TransferJob
+from backend.sync_store import SyncStore
+from backend.tracks import Track
+
+
+class FakeSpotify:
+    def __init__(self, uris: List[str]):
+        self.uris = uris
+        self.added: List[List[str]] = []
+        self.reads = 0
+
+    async def get_playlist(self, playlist_id):
+        return httpx.Response(200, json={"id": playlist_id})
+
+    async def playlist_track_uris(self, playlist_id):
+        self.reads += 1
+        return list(self.uris)
+
+    async def add_tracks(self, playlist_id, uris):
+        self.added.append(uris)
+        self.uris.extend(uris)
+        return httpx.Response(201, request=httpx.Request("POST", "https://api.spotify.com/v1/playlists/sp/tracks"))
+
+    async def remove_tracks(self, playlist_id, uris):
+        return httpx.Response(200, request=httpx.Request("DELETE", "https://api.spotify.com/v1/playlists/sp/tracks"))
+
+
+def _sync(monkeypatch, tmp_path, spotify: FakeSpotify, attempt: int) -> None:
+    store = SyncStore(str(tmp_path / "sync.sqlite3"))
+    store.apply("sp", "1", {"1": "u1"}, [], replace=True)
+
+    async def get_playlist_data(pid):
+        return {"playlist": {"trackIds": [{"id": 1}, {"id": 2}, {"id": 3}]}}
+
+    async def fetch_tracks_by_ids(ids):
+        return [Track(int(song_id), f"Song {song_id}", ("Artist",)) for song_id in ids]
+
+    async def match_song(i, song, client, total, index=None):
+        return f"u{song.id}", None
+
+    monkeypatch.setattr(main, "get_sync_store", lambda: store)
+    monkeypatch.setattr(main, "get_match_cache", lambda: None)
+    monkeypatch.setattr(main, "get_playlist_data", get_playlist_data)
+    monkeypatch.setattr(main, "fetch_tracks_by_ids", fetch_tracks_by_ids)
+    monkeypatch.setattr(main, "match_song", match_song)
+    monkeypatch.setattr(main, "spotify_client", lambda credentials: spotify)
+
+    job = TransferJob("j")
+    job.attempt = attempt
+    body = main.SyncBody(url="https://music.163.com/playlist?id=1", spotify_playlist_id="sp", spotify_token="t")
+    asyncio.run(main.run_sync(body, job))
+    assert store.load("sp") == ("1", {"1": "u1", "2": "u2", "3": "u3"})
+
+
+def test_reclaimed_sync_reads_the_playlist_before_adding(monkeypatch, tmp_path):
+    # The dead worker had already added u2 before it could record the mapping
+    spotify = FakeSpotify(["u1", "u2"])
+    _sync(monkeypatch, tmp_path, spotify, attempt=2)
+
+    assert spotify.reads == 1
+    assert spotify.added == [["u3"]]
+    assert spotify.uris == ["u1", "u2", "u3"]
+
+
+def test_later_sync_diffs_against_the_recorded_mapping(monkeypatch, tmp_path):
+    spotify = FakeSpotify(["u1"])
+    _sync(monkeypatch, tmp_path, spotify, attempt=1)
+
+    assert spotify.reads == 0
+    assert spotify.added == [["u2", "u3"]]
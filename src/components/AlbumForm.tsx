@@ -5,6 +5,29 @@ import { useTransfer } from '@/contexts/TransferContext';
 // Update this to use the Fly.io API URL
 const BACKEND_URL = process.env.NEXT_PUBLIC_BACKEND_URL || 'http://localhost:8080';
 const TRANSFER_TIMEOUT = 1800000; // 30 minutes timeout for large playlists
+const JOB_POLL_INTERVAL = 2000; // How often to poll the transfer job status
+
+interface TransferJobStatus {
+  job_id: string;
+  status: 'queued' | 'running' | 'succeeded' | 'failed';
+  phase: string;
+  tracks_total: number;
+  tracks_matched: number;
+  chunks_total: number;
+  chunks_added: number;
+  eta_seconds: number | null;
+  result: any;
+  error: string | null;
+  error_status: number | null;
+}
+
+interface StreamedTrack {
+  index: number;
+  name: string;
+  uri: string | null;
+}
+
+const sleep = (ms: number) => new Promise(resolve => setTimeout(resolve, ms));
 
 interface BatchResult {
   batch_number: number;
@@ -25,13 +48,14 @@ const AlbumForm = () => {
     setProgress, 
     setPreview, 
     setCurrentBatch, 
-    setTotalBatches 
+    setTotalBatches,
+    addRecentTracks,
+    clearRecentTracks
   } = useTransfer();
   const [transferMessage, setTransferMessage] = useState<string | null>(null);
   const [showRecoveryPrompt, setShowRecoveryPrompt] = useState(false);
   const abortControllerRef = useRef<AbortController | null>(null);
   const timeoutIdRef = useRef<number | null>(null);
-  const progressIntervalRef = useRef<number | null>(null);
 
   // Clean up any running timers when component unmounts
   useEffect(() => {
@@ -39,15 +63,93 @@ const AlbumForm = () => {
       if (timeoutIdRef.current !== null) {
         window.clearTimeout(timeoutIdRef.current);
       }
-      if (progressIntervalRef.current !== null) {
-        window.clearInterval(progressIntervalRef.current);
-      }
       if (abortControllerRef.current) {
         abortControllerRef.current.abort();
       }
     };
   }, []);
 
+  const showJobProgress = (job: Pick<TransferJobStatus, 'phase' | 'tracks_total' | 'tracks_matched' | 'chunks_total' | 'chunks_added' | 'eta_seconds'>) => {
+    if (job.phase === 'matching' && job.tracks_total > 0) {
+      setProgress(10 + Math.round((job.tracks_matched / job.tracks_total) * 70));
+      const eta = job.eta_seconds !== null ? ` (about ${Math.ceil(job.eta_seconds / 60)} min left)` : '';
+      setTransferMessage(`Matched ${job.tracks_matched.toLocaleString()} of ${job.tracks_total.toLocaleString()} tracks${eta}`);
+    } else if (job.phase === 'adding' && job.chunks_total > 0) {
+      setProgress(80 + Math.round((job.chunks_added / job.chunks_total) * 10));
+      setTransferMessage(`Adding tracks to your Spotify playlist (${job.chunks_added}/${job.chunks_total})`);
+    }
+  };
+
+  // Poll the job status endpoint; used when the event stream is unavailable
+  const pollJob = async (jobId: string, signal: AbortSignal): Promise<TransferJobStatus> => {
+    while (true) {
+      await sleep(JOB_POLL_INTERVAL);
+      const statusRes = await fetch(`${BACKEND_URL}/api/transfer/${jobId}`, { signal });
+      if (!statusRes.ok) {
+        throw new Error('Lost track of the transfer job. Please try again.');
+      }
+      const job: TransferJobStatus = await statusRes.json();
+      if (job.status === 'succeeded' || job.status === 'failed') {
+        return job;
+      }
+      showJobProgress(job);
+    }
+  };
+
+  // Subscribe to the job's Server-Sent Events, falling back to polling if the stream fails
+  const followJob = (jobId: string, signal: AbortSignal): Promise<TransferJobStatus> => {
+    if (typeof EventSource === 'undefined') {
+      return pollJob(jobId, signal);
+    }
+
+    return new Promise((resolve, reject) => {
+      const source = new EventSource(`${BACKEND_URL}/api/transfer/${jobId}/events`);
+      const missing: string[] = [];
+      let finished = false;
+
+      const finish = (settle: () => void) => {
+        finished = true;
+        source.close();
+        settle();
+      };
+
+      signal.addEventListener('abort', () => finish(() => reject(new DOMException('Aborted', 'AbortError'))));
+
+      const onProgress = (e: MessageEvent) => {
+        const data = JSON.parse(e.data);
+        showJobProgress({ phase: data.phase ?? 'matching', ...data.progress });
+      };
+      source.addEventListener('phase', onProgress);
+      source.addEventListener('chunk', (e) => {
+        const data = JSON.parse((e as MessageEvent).data);
+        // Chunks are added while matching is still running; only the final flush is its own phase
+        showJobProgress({ phase: data.phase ?? 'adding', ...data.progress });
+      });
+      source.addEventListener('tracks', (e) => {
+        const data = JSON.parse((e as MessageEvent).data);
+        const tracks = data.tracks as StreamedTrack[];
+        tracks.forEach((t) => { if (!t.uri) missing.push(t.name); });
+        addRecentTracks(tracks.map((t) => ({ name: t.name, status: t.uri ? ('success' as const) : ('failed' as const) })));
+        showJobProgress({ phase: 'matching', ...data.progress });
+      });
+      source.addEventListener('done', (e) => {
+        const data = JSON.parse((e as MessageEvent).data);
+        finish(() => resolve({ status: 'succeeded', result: { ...data.result, missing } } as TransferJobStatus));
+      });
+      source.addEventListener('failed', (e) => {
+        const data = JSON.parse((e as MessageEvent).data);
+        finish(() => resolve({ status: 'failed', error: data.error, error_status: data.error_status } as TransferJobStatus));
+      });
+      source.onerror = () => {
+        if (finished) return;
+        // Let the browser retry while the server is reachable; give up on the stream once it closes
+        if (source.readyState === EventSource.CLOSED) {
+          finish(() => pollJob(jobId, signal).then(resolve, reject));
+        }
+      };
+    });
+  };
+
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault();
     if (!isAuthenticated || !accessToken) {
@@ -61,17 +163,22 @@ const AlbumForm = () => {
     setCurrentBatch(0);
     setTotalBatches(0);
     setShowRecoveryPrompt(false);
+    clearRecentTracks();
 
     try {
       // Clean the URL - extract the id parameter if present
       let cleanUrl = albumUrl.trim();
+      // Album links go to the album endpoints, which match the whole album at once
+      const isAlbum = /\/album/.test(cleanUrl);
       // Use URL API to properly parse and extract id if possible
       try {
         const urlObj = new URL(cleanUrl);
-        const id = urlObj.searchParams.get('id');
+        const id = urlObj.searchParams.get('id') ?? cleanUrl.match(/\/album\/(\d+)/)?.[1];
         if (id) {
           // Just use the ID directly to avoid encoding issues
-          cleanUrl = `https://y.music.163.com/m/playlist?id=${id}`;
+          cleanUrl = isAlbum
+            ? `https://music.163.com/album?id=${id}`
+            : `https://y.music.163.com/m/playlist?id=${id}`;
         }
       } catch (e) {
         // If URL parsing fails, just use the original URL
@@ -83,7 +190,7 @@ const AlbumForm = () => {
       // 1️⃣ Get playlist details from backend
       setTransferMessage("Fetching playlist information...");
       const infoRes = await fetch(
-        `${BACKEND_URL}/api/playlist-info?url=${encodeURIComponent(cleanUrl)}`
+        `${BACKEND_URL}/api/${isAlbum ? 'album-info' : 'playlist-info'}?url=${encodeURIComponent(cleanUrl)}`
       );
       if (!infoRes.ok) {
         throw new Error('Failed to fetch playlist info');
@@ -144,53 +251,46 @@ const AlbumForm = () => {
       try {
         setTransferMessage("Processing all tracks. This may take several minutes for large playlists...");
         
-        // For large playlists, update progress periodically to show it's still working
-        if (totalTracksCount > 500) {
-          let progressValue = 10;
-          
-          progressIntervalRef.current = window.setInterval(() => {
-            // Increment progress slowly to show the request is still processing
-            progressValue = Math.min(progressValue + 2, 85);
-            setProgress(progressValue);
-            
-            // Update the message occasionally with a track count update
-            if (progressValue % 10 === 0) {
-              setTransferMessage(`Processing ${totalTracksCount.toLocaleString()} tracks (${progressValue}% progress)`);
-            }
-          }, totalTracksCount > 1500 ? 5000 : 3000);
-        }
-
-        const transferRes = await fetch(`${BACKEND_URL}/api/transfer`, {
+        const transferRes = await fetch(`${BACKEND_URL}/api/${isAlbum ? 'album-transfer' : 'transfer'}`, {
           method: 'POST',
           headers: { 'Content-Type': 'application/json' },
           body: JSON.stringify({ url: cleanUrl, spotify_token: accessToken, custom_name: customName || undefined, cover_url: coverPayload }),
           signal: abortControllerRef.current.signal
         });
 
-        // Clear the timeout and interval
+        if (!transferRes.ok) {
+          throw new Error(
+            transferRes.status === 503
+              ? 'The server is busy with other transfers. Please try again in a moment.'
+              : 'Transfer failed'
+          );
+        }
+
+        const { job_id: jobId } = await transferRes.json();
+
+        // Follow the background job until it finishes, showing real progress
+        const job = await followJob(jobId, abortControllerRef.current.signal);
+
+        // Clear the timeout
         if (timeoutIdRef.current !== null) {
           window.clearTimeout(timeoutIdRef.current);
           timeoutIdRef.current = null;
         }
-        if (progressIntervalRef.current !== null) {
-          window.clearInterval(progressIntervalRef.current);
-          progressIntervalRef.current = null;
-        }
 
-        if (!transferRes.ok) {
+        if (job.status === 'failed') {
           // If the backend says Spotify token invalid, ask user to log in again
-          if (transferRes.status === 401) {
+          if (job.error_status === 401) {
             logout();
             throw new Error('Spotify session expired. Please log in again.');
           }
           throw new Error(
-            transferRes.status === 502 
+            job.error_status === 502 
               ? 'Server error while processing your request. The playlist might be too large or the server is under high load.'
-              : 'Transfer failed'
+              : job.error || 'Transfer failed'
           );
         }
 
-        const transferData = await transferRes.json();
+        const transferData = job.result;
 
         // Progress to 90% - waiting for cover image upload
         setProgress(90);
@@ -268,10 +368,6 @@ const AlbumForm = () => {
         window.clearTimeout(timeoutIdRef.current);
         timeoutIdRef.current = null;
       }
-      if (progressIntervalRef.current !== null) {
-        window.clearInterval(progressIntervalRef.current);
-        progressIntervalRef.current = null;
-      }
     }
   };
 
@@ -1,7 +1,7 @@
 import { useTransfer } from '@/contexts/TransferContext';
 
 const ProgressBar = () => {
-  const { progress } = useTransfer();
+  const { progress, recentTracks } = useTransfer();
 
   if (progress === null) return null;
 
@@ -42,6 +42,17 @@ const ProgressBar = () => {
           </div>
         )}
         
+        {/* Latest per-track results streamed from the backend */}
+        {progress < 100 && recentTracks.length > 0 && (
+          <ul className="mt-4 space-y-1 text-xs">
+            {recentTracks.map((track, i) => (
+              <li key={`${track.name}-${i}`} className={track.status === 'success' ? 'text-indigo-300' : 'text-gray-500'}>
+                {track.status === 'success' ? '✓' : '✗'} {track.name}
+              </li>
+            ))}
+          </ul>
+        )}
+
         {/* Success sparkles when complete */}
         {progress === 100 && (
           <div className="flex justify-center gap-2 mt-1">
@@ -1,4 +1,4 @@
-import { createContext, useContext, useState, ReactNode } from 'react';
+import { createContext, useCallback, useContext, useState, ReactNode } from 'react';
 
 interface Track {
   name: string;
@@ -26,6 +26,13 @@ interface PreviewData {
   totalTracksCount?: number;
 }
 
+interface RecentTrack {
+  name: string;
+  status: 'success' | 'failed';
+}
+
+const MAX_RECENT_TRACKS = 5;
+
 interface TransferContextType {
   result: TransferResult | null;
   setResult: (result: TransferResult | null) => void;
@@ -37,6 +44,9 @@ interface TransferContextType {
   setCurrentBatch: (batch: number) => void;
   totalBatches: number;
   setTotalBatches: (batches: number) => void;
+  recentTracks: RecentTrack[];
+  addRecentTracks: (tracks: RecentTrack[]) => void;
+  clearRecentTracks: () => void;
 }
 
 const TransferContext = createContext<TransferContextType | undefined>(undefined);
@@ -47,6 +57,12 @@ export function TransferProvider({ children }: { children: ReactNode }) {
   const [preview, setPreview] = useState<PreviewData | null>(null);
   const [currentBatch, setCurrentBatch] = useState<number>(0);
   const [totalBatches, setTotalBatches] = useState<number>(0);
+  const [recentTracks, setRecentTracks] = useState<RecentTrack[]>([]);
+
+  const addRecentTracks = useCallback((tracks: RecentTrack[]) => {
+    setRecentTracks((prev) => [...prev, ...tracks].slice(-MAX_RECENT_TRACKS));
+  }, []);
+  const clearRecentTracks = useCallback(() => setRecentTracks([]), []);
 
   return (
     <TransferContext.Provider value={{ 
@@ -59,7 +75,10 @@ export function TransferProvider({ children }: { children: ReactNode }) {
       currentBatch,
       setCurrentBatch,
       totalBatches,
-      setTotalBatches
+      setTotalBatches,
+      recentTracks,
+      addRecentTracks,
+      clearRecentTracks
     }}>
       {children}
     </TransferContext.Provider>